@@ -0,0 +1,373 @@
+# Fi.Co? S.Vi.To.! A Fishing Company Simulation and Visualization Tool - Ver. 1.0"- archivio_colonnare.py
+
+import os
+import json
+import mmap
+import shutil
+import tempfile
+import numpy as np
+
+# Ordine canonico dei campi di un record (lo stesso usato dal generatore e dall'input manuale, con la posizione GPS facoltativa, seguito dai campi calcolati)
+ORDINE_CAMPI = (
+    "data", "zona", "kg", "tipo", "prezzo_medio", "stress", "eta_coltura", "omogeneita",
+    "allevamento_selvatico", "meteo", "scarto", "netto", "lat", "lon", "qualita", "utile", "prezzo_finale", "costo"
+)
+# Campi numerici: il valore mancante è NaN
+CAMPI_FLOAT = ("kg", "prezzo_medio", "meteo", "scarto", "netto", "lat", "lon", "qualita", "utile", "prezzo_finale", "costo")
+# Campi interi (livelli di stress e omogeneità): il valore mancante è MANCANTE
+CAMPI_INTERI = ("stress", "omogeneita")
+# Campi testuali codificati come categorie: il codice mancante è MANCANTE
+CAMPI_CATEGORICI = ("zona", "tipo", "eta_coltura", "allevamento_selvatico")
+MANCANTE = -1
+# Formato binario su disco: firma, lunghezza dell'intestazione JSON, intestazione e colonne allineate a 64 byte
+FIRMA_FILE = b"FICOARC1"
+ALLINEAMENTO = 64
+
+
+def allinea(posizione):
+    ''' Arrotonda una posizione in byte al multiplo successivo di ALLINEAMENTO. '''
+    return -(-posizione // ALLINEAMENTO) * ALLINEAMENTO
+
+
+def arrotonda(valori, decimali=2):
+    ''' Arrotonda un array (di qualsiasi forma) con lo stesso risultato di round() di Python (half-even sul valore decimale esatto), senza cicli sui singoli elementi. '''
+    valori = np.asarray(valori, dtype=np.float64)
+    scala = 10.0 ** decimali
+    scarti = valori * scala
+    risultato = np.rint(scarti)
+    np.subtract(scarti, risultato, out=scarti)
+    # CHECK: se il prodotto cade esattamente a metà, il lato giusto lo decide l'errore di arrotondamento del prodotto
+    meta = np.flatnonzero(np.abs(scarti, out=scarti) == 0.5)
+    if meta.size:
+        # indici piatti: valgono per array di qualsiasi forma
+        x = valori.ravel()[meta]
+        prodotto = x * scala
+        # scomposizione di Dekker: x * scala == prodotto + errore, in modo esatto
+        diviso = 134217729.0 * x
+        alto = diviso - (diviso - x)
+        errore = (alto * scala - prodotto) + (x - alto) * scala
+        risultato.ravel()[meta] = np.where(errore > 0, np.ceil(prodotto), np.where(errore < 0, np.floor(prodotto), np.rint(prodotto)))
+    risultato /= scala
+    return risultato
+
+
+def componi_file(percorso, lunghezza, categorie, ordinato_per_data, sorgenti):
+    ''' Scrive un file binario colonnare; sorgenti è una lista di (campo, dtype, numero di byte, funzione che scrive i dati della colonna nel file). '''
+    intestazione = {"lunghezza": lunghezza, "categorie": categorie, "ordinato_per_data": ordinato_per_data, "colonne": {}}
+    posizione = 0
+    for campo, tipo, n_byte, scrivi in sorgenti:
+        intestazione["colonne"][campo] = {"dtype": np.dtype(tipo).str, "posizione": posizione}
+        posizione += allinea(n_byte)
+    testo = json.dumps(intestazione).encode("utf-8")
+    # l'inizio dei dati è allineato, così ogni colonna può essere letta direttamente dalla memoria mappata
+    inizio_dati = allinea(len(FIRMA_FILE) + 8 + len(testo))
+    temporaneo = percorso + ".tmp"
+    with open(temporaneo, "wb") as f:
+        f.write(FIRMA_FILE)
+        f.write(len(testo).to_bytes(8, "little"))
+        f.write(testo)
+        f.write(b"\0" * (inizio_dati - f.tell()))
+        for campo, tipo, n_byte, scrivi in sorgenti:
+            scrivi(f)
+            f.write(b"\0" * (allinea(n_byte) - n_byte))
+    # sostituzione atomica: chi sta leggendo il vecchio file non vede mai un file scritto a metà
+    os.replace(temporaneo, percorso)
+
+
+class ArchivioColonnare:
+    ''' Archivio colonnare dei campioni di pesca: ogni campo è un array NumPy tipizzato, i campi testuali sono codici di categoria e la data è un datetime64[D]. '''
+    def __init__(self, colonne, categorie, lunghezza=None):
+        ''' Inizializza l'archivio; le colonne assenti (es. i campi calcolati prima di prepara_dati_storici) semplicemente non sono presenti. '''
+        self.colonne = colonne
+        self.categorie = categorie
+        if lunghezza is None:
+            lunghezza = len(next(iter(colonne.values()))) if colonne else 0
+        self.lunghezza = lunghezza
+        # diventa True quando i record sono ordinati per data (indice per la ricerca binaria)
+        self.ordinato_per_data = False
+
+    @classmethod
+    def da_record(cls, records):
+        ''' Costruisce l'archivio da una lista di dizionari; i campi non previsti da ORDINE_CAMPI vengono ignorati. '''
+        if isinstance(records, cls):
+            return records
+        n = len(records)
+        colonne = {}
+        categorie = {}
+        # la data viene convertita una sola volta in datetime64
+        colonne["data"] = np.array([r.get("data") for r in records], dtype="datetime64[D]")
+        for campo in CAMPI_FLOAT:
+            valori = [r.get(campo) for r in records]
+            if any(v is not None for v in valori):
+                colonne[campo] = np.array([np.nan if v is None else v for v in valori], dtype=np.float64)
+        for campo in CAMPI_INTERI:
+            valori = [r.get(campo) for r in records]
+            if any(v is not None for v in valori):
+                colonne[campo] = np.array([MANCANTE if v is None else int(v) for v in valori], dtype=np.int8)
+        for campo in CAMPI_CATEGORICI:
+            valori = [r.get(campo) for r in records]
+            # le categorie seguono l'ordine di prima apparizione, come i dizionari dei riepiloghi
+            nomi = list(dict.fromkeys(v for v in valori if v is not None))
+            codice = {nome: i for i, nome in enumerate(nomi)}
+            colonne[campo] = np.fromiter((codice.get(v, MANCANTE) for v in valori), dtype=np.int16, count=n)
+            categorie[campo] = nomi
+        return cls(colonne, categorie, n)
+
+    @classmethod
+    def vuoto(cls):
+        ''' Restituisce un archivio senza record. '''
+        return cls.da_record([])
+
+    @classmethod
+    def concatena(cls, archivi):
+        ''' Unisce più archivi in uno solo, riconciliando le categorie; i campi assenti in un archivio risultano mancanti. '''
+        archivi = list(archivi)
+        if not archivi:
+            return cls.vuoto()
+        colonne = {}
+        categorie = {}
+        campi = [c for c in ORDINE_CAMPI if any(c in a.colonne for a in archivi)]
+        for campo in campi:
+            parti = []
+            if campo in CAMPI_CATEGORICI:
+                nomi = list(dict.fromkeys(n for a in archivi for n in a.categorie.get(campo, [])))
+                codice = {nome: i for i, nome in enumerate(nomi)}
+                for a in archivi:
+                    if campo not in a.colonne:
+                        parti.append(np.full(len(a), MANCANTE, dtype=np.int16))
+                        continue
+                    # l'ultima cella rimappa il codice MANCANTE su se stesso
+                    rimappa = np.array([codice[n] for n in a.categorie[campo]] + [MANCANTE], dtype=np.int16)
+                    parti.append(rimappa[a.colonne[campo]])
+                categorie[campo] = nomi
+            else:
+                tipo = next(a.colonne[campo].dtype for a in archivi if campo in a.colonne)
+                vuoto = np.datetime64("NaT") if campo == "data" else (MANCANTE if campo in CAMPI_INTERI else np.nan)
+                for a in archivi:
+                    parti.append(a.colonne[campo] if campo in a.colonne else np.full(len(a), vuoto, dtype=tipo))
+            colonne[campo] = np.concatenate(parti)
+        return cls(colonne, categorie, sum(len(a) for a in archivi))
+
+    def salva(self, percorso):
+        ''' Salva l'archivio nel formato binario colonnare: intestazione JSON con tipi, posizioni e categorie, seguita dalle colonne grezze. '''
+        sorgenti = [
+            (campo, colonna.dtype, colonna.nbytes, lambda f, colonna=colonna: f.write(np.ascontiguousarray(colonna).tobytes()))
+            for campo, colonna in self.colonne.items()
+        ]
+        componi_file(percorso, self.lunghezza, self.categorie, self.ordinato_per_data, sorgenti)
+
+    @classmethod
+    def carica(cls, percorso, mappa_memoria=None):
+        ''' Carica un archivio binario; con la mappatura in memoria le colonne sono viste di sola lettura sul file, senza copie. Su Windows il file viene letto per intero, perché un file mappato non potrebbe essere sostituito. '''
+        if mappa_memoria is None:
+            mappa_memoria = os.name != "nt"
+        with open(percorso, "rb") as f:
+            if mappa_memoria:
+                buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                buffer = f.read()
+        if bytes(buffer[:len(FIRMA_FILE)]) != FIRMA_FILE:
+            raise ValueError(f"Il file '{percorso}' non è un archivio colonnare valido.")
+        lunghezza_testo = int.from_bytes(buffer[len(FIRMA_FILE):len(FIRMA_FILE) + 8], "little")
+        inizio_testo = len(FIRMA_FILE) + 8
+        intestazione = json.loads(bytes(buffer[inizio_testo:inizio_testo + lunghezza_testo]).decode("utf-8"))
+        inizio_dati = allinea(inizio_testo + lunghezza_testo)
+        n = intestazione["lunghezza"]
+        colonne = {
+            campo: np.frombuffer(buffer, dtype=np.dtype(info["dtype"]), count=n, offset=inizio_dati + info["posizione"])
+            for campo, info in intestazione["colonne"].items()
+        }
+        archivio = cls(colonne, intestazione["categorie"], n)
+        archivio.ordinato_per_data = intestazione.get("ordinato_per_data", False)
+        return archivio
+
+    @classmethod
+    def migra_da_json(cls, percorso_json, percorso_binario):
+        ''' Converte una volta per tutte un archivio JSON (lista di record) nel formato binario, già ordinato per data. '''
+        with open(percorso_json, "r") as f:
+            archivio = cls.da_record(json.load(f)).ordina_per_data()
+        archivio.salva(percorso_binario)
+        return archivio
+
+    def esporta_json(self, percorso_json):
+        ''' Esporta l'archivio come lista di record JSON, nello stesso formato del vecchio historical_data.json. '''
+        with open(percorso_json, "w") as f:
+            json.dump(self.a_record(), f, indent=2)
+
+    def a_record(self):
+        ''' Converte l'archivio in una lista di dizionari, omettendo i valori mancanti. '''
+        campi = [c for c in ORDINE_CAMPI if c in self.colonne]
+        colonne = []
+        for campo in campi:
+            if campo == "data":
+                valori = [None if d == "NaT" else d for d in np.datetime_as_string(self.colonne["data"]).tolist()]
+            elif campo in CAMPI_CATEGORICI:
+                nomi = self.categorie[campo]
+                valori = [nomi[c] if c != MANCANTE else None for c in self.colonne[campo].tolist()]
+            elif campo in CAMPI_INTERI:
+                valori = [v if v != MANCANTE else None for v in self.colonne[campo].tolist()]
+            else:
+                valori = [None if v != v else v for v in self.colonne[campo].tolist()]
+            colonne.append(valori)
+        return [
+            {campo: valore for campo, valore in zip(campi, riga) if valore is not None}
+            for riga in zip(*colonne)
+        ]
+
+    def __len__(self):
+        return self.lunghezza
+
+    def __iter__(self):
+        ''' Itera sui record come dizionari, per compatibilità con il codice che lavora su liste di record. '''
+        return iter(self.a_record())
+
+    def colonna(self, campo):
+        ''' Restituisce l'array grezzo di un campo, oppure None se il campo non è presente. '''
+        return self.colonne.get(campo)
+
+    def valori(self, campo, predefinito=0.0):
+        ''' Restituisce un campo numerico come float64, sostituendo i valori mancanti con il predefinito; l'array restituito va trattato in sola lettura. '''
+        colonna = self.colonne.get(campo)
+        if colonna is None:
+            return np.full(self.lunghezza, predefinito, dtype=np.float64)
+        if campo in CAMPI_INTERI:
+            return np.where(colonna == MANCANTE, predefinito, colonna).astype(np.float64)
+        mancanti = np.isnan(colonna)
+        # CHECK: se non manca nulla restituisco la colonna stessa, senza copia (da non modificare)
+        if not mancanti.any():
+            return colonna
+        return np.where(mancanti, predefinito, colonna)
+
+    def interi(self, campo, predefinito):
+        ''' Restituisce un campo intero come int64, sostituendo i valori mancanti con il predefinito. '''
+        colonna = self.colonne.get(campo)
+        if colonna is None:
+            return np.full(self.lunghezza, predefinito, dtype=np.int64)
+        return np.where(colonna == MANCANTE, predefinito, colonna).astype(np.int64)
+
+    def decodifica(self, campo):
+        ''' Restituisce un campo categorico come array di stringhe (None per i mancanti). '''
+        nomi = np.array(self.categorie[campo] + [None], dtype=object)
+        return nomi[self.colonne[campo]]
+
+    def gruppi(self, campo, predefinito="Altro"):
+        ''' Raggruppa i record per un campo categorico: restituisce i nomi in ordine di prima apparizione e, per ogni record, l'indice del suo gruppo. '''
+        codici = self.colonne[campo]
+        nomi = self.categorie[campo]
+        presenti, primo = np.unique(codici, return_index=True)
+        rimappa = np.zeros(len(nomi) + 1, dtype=np.intp)
+        indice_nome = {}
+        for codice in presenti[np.argsort(primo, kind="stable")].tolist():
+            nome = nomi[codice] if codice != MANCANTE else predefinito
+            # il codice MANCANTE finisce nell'ultima cella di rimappa
+            rimappa[codice] = indice_nome.setdefault(nome, len(indice_nome))
+        return list(indice_nome), rimappa[codici]
+
+    def seleziona(self, indice):
+        ''' Restituisce un nuovo archivio con i soli record selezionati (slice, maschera o indici); con uno slice le colonne sono viste senza copia. '''
+        colonne = {campo: colonna[indice] for campo, colonna in self.colonne.items()}
+        return ArchivioColonnare(colonne, self.categorie, len(colonne["data"]) if colonne else 0)
+
+    def con_colonne(self, **nuove):
+        ''' Restituisce un nuovo archivio che condivide le colonne esistenti e sostituisce (o aggiunge) quelle indicate. '''
+        colonne = dict(self.colonne)
+        colonne.update(nuove)
+        archivio = ArchivioColonnare(colonne, self.categorie, self.lunghezza)
+        archivio.ordinato_per_data = self.ordinato_per_data
+        return archivio
+
+    def ordina_per_data(self):
+        ''' Restituisce l'archivio ordinato per data (ordinamento stabile), da fare una sola volta: diventa l'indice per i filtri per intervallo. '''
+        if self.ordinato_per_data:
+            return self
+        archivio = self.seleziona(np.argsort(self.colonne["data"], kind="stable"))
+        archivio.ordinato_per_data = True
+        return archivio
+
+    def ultima_data(self):
+        ''' Restituisce l'ultima data presente (datetime.date), letta dall'indice per data invece che con un massimo su tutti i record; None se non ci sono date (nessun record, solo date mancanti o nessuna colonna data). '''
+        if "data" not in self.colonne:
+            return None
+        date_record = self.ordina_per_data().colonne["data"]
+        # le date mancanti (NaT) sono in fondo all'indice: l'ultima data valida precede la prima NaT
+        fine = np.searchsorted(date_record, np.datetime64("NaT"), side="left")
+        return date_record[fine - 1].item() if fine else None
+
+    def intervallo_date(self, data_inizio, data_fine):
+        ''' Restituisce i record con data in [data_inizio, data_fine]: due ricerche binarie sull'indice e uno slice contiguo, senza copiare le colonne. '''
+        archivio = self.ordina_per_data()
+        date_record = archivio.colonne["data"]
+        inizio = np.searchsorted(date_record, np.datetime64(data_inizio, "D"), side="left")
+        fine = np.searchsorted(date_record, np.datetime64(data_fine, "D"), side="right")
+        risultato = archivio.seleziona(slice(inizio, fine))
+        risultato.ordinato_per_data = True
+        return risultato
+
+
+class ScrittoreArchivio:
+    ''' Scrive un archivio colonnare a blocchi successivi senza tenerlo in memoria: ogni colonna viene accodata a un file temporaneo e il file finale viene composto alla chiusura. '''
+    def __init__(self, percorso, categorie):
+        self.percorso = percorso
+        self.categorie = categorie
+        self.cartella = tempfile.mkdtemp(prefix=".archivio_", dir=os.path.dirname(os.path.abspath(percorso)))
+        self.file_colonne = {}
+        self.tipi = {}
+        self.lunghezza = 0
+        self.ordinato_per_data = True
+        self.ultima_data = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, tipo_errore, errore, traccia):
+        if tipo_errore is None:
+            self.chiudi()
+        else:
+            self.annulla()
+
+    def aggiungi(self, archivio):
+        ''' Accoda un blocco di record; tutti i blocchi devono avere le stesse colonne e le stesse categorie. '''
+        if archivio.categorie != self.categorie:
+            raise ValueError("Il blocco ha categorie diverse da quelle dell'archivio.")
+        if self.file_colonne and set(archivio.colonne) != set(self.file_colonne):
+            raise ValueError("Il blocco ha colonne diverse da quelle dell'archivio.")
+        # le colonne (e i loro tipi) vengono registrate anche da un blocco vuoto: se tutti i blocchi sono vuoti l'archivio ha comunque colonne vuote
+        for campo, colonna in archivio.colonne.items():
+            if campo not in self.file_colonne:
+                self.file_colonne[campo] = open(os.path.join(self.cartella, campo), "wb")
+                self.tipi[campo] = colonna.dtype
+        if not len(archivio):
+            return
+        for campo, colonna in archivio.colonne.items():
+            self.file_colonne[campo].write(np.ascontiguousarray(colonna, dtype=self.tipi[campo]).tobytes())
+        # l'archivio resta ordinato per data solo se ogni blocco è ordinato e comincia dopo la fine del precedente
+        if "data" in archivio.colonne:
+            date = archivio.colonne["data"]
+            if not archivio.ordinato_per_data or (self.ultima_data is not None and date[0] < self.ultima_data):
+                self.ordinato_per_data = False
+            self.ultima_data = date[-1]
+        self.lunghezza += len(archivio)
+
+    def chiudi(self):
+        ''' Compone il file finale dalle colonne accumulate e rimuove i file temporanei. '''
+        for file_colonna in self.file_colonne.values():
+            file_colonna.close()
+        sorgenti = [
+            (campo, self.tipi[campo], os.path.getsize(file_colonna.name), lambda f, nome=file_colonna.name: self.copia(nome, f))
+            for campo, file_colonna in self.file_colonne.items()
+        ]
+        try:
+            componi_file(self.percorso, self.lunghezza, self.categorie, self.ordinato_per_data, sorgenti)
+        finally:
+            shutil.rmtree(self.cartella, ignore_errors=True)
+
+    def copia(self, nome, destinazione):
+        ''' Copia una colonna temporanea nel file finale, a pezzi. '''
+        with open(nome, "rb") as sorgente:
+            shutil.copyfileobj(sorgente, destinazione, 1 << 22)
+
+    def annulla(self):
+        ''' Abbandona la scrittura lasciando intatto l'eventuale archivio esistente. '''
+        for file_colonna in self.file_colonne.values():
+            file_colonna.close()
+        shutil.rmtree(self.cartella, ignore_errors=True)
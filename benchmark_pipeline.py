@@ -0,0 +1,361 @@
+# Fi.Co? S.Vi.To.! A Fishing Company Simulation and Visualization Tool - Ver. 1.0"- benchmark_pipeline.py
+
+import os
+import sys
+import gc
+import json
+import time
+import shutil
+import platform
+import tempfile
+import tracemalloc
+from datetime import date
+import numpy as np
+from business_logic import ElaboratoreDati, VistaUnita, VistaRollup
+from cache_caricamenti import cache_caricamenti
+from cache_grafici import cache_grafici
+from crea_mappa_zone_pesca import GestoreMappa
+from input import GeneratoreDatiStorici
+from data_viz import GestoreDati, GestoreFiltroDati, GestoreVisualizzazioneDati
+
+# Dimensioni (righe) degli archivi sintetici misurati di default
+DIMENSIONI = (10_000, 100_000, 1_000_000, 10_000_000)
+# Slider usati per le fasi di simulazione
+RICICLO = 50
+LAVORAZIONE = 75
+
+
+class Fase:
+    ''' Fase misurata dal benchmark: esegui(contesto) viene cronometrata; prepara(contesto) viene eseguita una volta prima delle misure e azzera(contesto) prima di ogni esecuzione, entrambe fuori dal tempo misurato. Il risultato dell'ultima esecuzione resta nel contesto con il nome della fase; le fasi "dipendenza" servono a quelle successive e vengono eseguite anche quando non sono tra quelle scelte. '''
+    def __init__(self, nome, esegui, prepara=None, azzera=None, per_record=False, dipendenza=False):
+        self.nome = nome
+        self.esegui = esegui
+        self.prepara = prepara
+        self.azzera = azzera
+        # le fasi sulle liste di dizionari vengono saltate oltre il limite di righe (tempo e memoria crescono troppo)
+        self.per_record = per_record
+        self.dipendenza = dipendenza
+
+
+class BenchmarkPipeline:
+    ''' Benchmark della pipeline su archivi sintetici di dimensione crescente: per ogni fase (generazione, caricamento, unione, filtro, preparazione, simulazione, aggregazioni, rollup, mappa e grafici matplotlib) misura il tempo (il migliore su più ripetizioni) e il picco di memoria allocata (tracemalloc, esclusi i file mappati in memoria), e confronta i risultati con una baseline salvata. '''
+    # Prima data degli archivi sintetici (gli anni senza prezzi storici usano quelli del 2022)
+    DATA_INIZIO = date(2000, 1, 1)
+    SEED = 42
+    # Record manuali uniti allo storico (sostituiscono campioni storici esistenti)
+    CAMPIONI_MANUALI = 100
+    # Righe oltre le quali le fasi sulle liste di dizionari vengono saltate
+    LIMITE_RECORD = 1_000_000
+    # Tempo oltre il quale una fase non viene più ripetuta
+    TEMPO_MASSIMO_RIPETIZIONI = 10.0
+    # Regressione: peggioramento relativo oltre la soglia e, per evitare falsi allarmi sulle fasi brevi, assoluto oltre i minimi indicati
+    SOGLIA = 0.2
+    MINIMO_SECONDI = 0.005
+    MINIMO_MB = 1.0
+
+    def __init__(self, ripetizioni=3, memoria=True, limite_record=None, fasi=None):
+        self.ripetizioni = ripetizioni
+        self.memoria = memoria
+        self.limite_record = self.LIMITE_RECORD if limite_record is None else limite_record
+        self.elaboratore_dati = ElaboratoreDati()
+        self.generatore = GeneratoreDatiStorici()
+        self.gestore_mappa = GestoreMappa("eez_boundaries_v12.gpkg")
+        self.gestore_filtro = GestoreFiltroDati()
+        self.gestore_visualizzazione = GestoreVisualizzazioneDati(self.elaboratore_dati, self.gestore_mappa)
+        self.scelte = set(fasi) if fasi else None
+        if self.scelte is not None:
+            nomi = [fase.nome for fase in self.fasi()]
+            sconosciute = self.scelte - set(nomi)
+            if sconosciute:
+                raise ValueError(f"Fasi non valide: {', '.join(sorted(sconosciute))} (disponibili: {', '.join(nomi)})")
+
+    def genera_archivio(self, righe):
+        ''' Genera con il generatore vettoriale un archivio storico ordinato per data con esattamente il numero di righe indicato. '''
+        generatore = self.generatore.generatore_vettoriale()
+        # in media poco meno di un campione per specie al giorno: parto da una stima e allungo l'intervallo se non basta
+        giorni = righe // len(generatore.SPECIE) + 1
+        while True:
+            archivio = generatore.genera(self.DATA_INIZIO, np.datetime64(self.DATA_INIZIO, "D") + giorni - 1, self.SEED)
+            if len(archivio) >= righe:
+                break
+            giorni = int(giorni * 1.1) + 1
+        archivio = archivio.seleziona(slice(0, righe))
+        archivio.ordinato_per_data = True
+        return archivio
+
+    def crea_contesto(self, righe, cartella):
+        ''' Prepara gli ingressi comuni a tutte le fasi: archivio salvato su file, intervallo di date, intervallo filtrato (la metà centrale) e record manuali. '''
+        archivio = self.genera_archivio(righe)
+        percorso = os.path.join(cartella, f"storico_{righe}.bin")
+        archivio.salva(percorso)
+        date_archivio = archivio.colonna("data")
+        data_inizio, data_fine = date_archivio[0].item(), date_archivio[-1].item()
+        quarto = (data_fine - data_inizio) // 4
+        # record manuali: copie di campioni storici distribuiti sull'intervallo, con un peso diverso
+        posizioni = np.linspace(0, righe - 1, min(self.CAMPIONI_MANUALI, righe)).astype(np.int64)
+        manuali = archivio.seleziona(posizioni).a_record()
+        for record in manuali:
+            record["kg"] = round(record["kg"] + 1, 2)
+        manuali_modificati = [dict(record) for record in manuali]
+        if manuali_modificati:
+            manuali_modificati[-1]["kg"] = round(manuali_modificati[-1]["kg"] + 1, 2)
+        return {
+            "righe": righe,
+            "percorso": percorso,
+            "data_inizio": data_inizio,
+            "data_fine": data_fine,
+            "filtro_inizio": data_inizio + quarto,
+            "filtro_fine": data_fine - quarto,
+            "manuali": manuali,
+            "manuali_modificati": manuali_modificati
+        }
+
+    def fasi(self):
+        ''' Restituisce le fasi della pipeline nell'ordine in cui vengono eseguite nella dashboard. '''
+        elaboratore = self.elaboratore_dati
+        visualizzazione = self.gestore_visualizzazione
+
+        def gestore_dati(contesto, vista_unita=None):
+            return GestoreDati(self.generatore, None, elaboratore, percorso_archivio=contesto["percorso"], vista_unita=vista_unita)
+
+        def nuova_vista_unita(contesto):
+            contesto["vista_unita"] = VistaUnita(elaboratore)
+
+        def vista_con_manuali(contesto):
+            # vista già indicizzata con i record manuali originali: si misura solo l'aggiornamento
+            nuova_vista_unita(contesto)
+            contesto["vista_unita"].unisci(contesto["carica_dati"], contesto["manuali"])
+
+        def svuota_intervalli(contesto):
+            # l'unione conserva gli ultimi intervalli richiesti: li svuoto per misurare il filtro e non la cache
+            with contesto["unisci_dati"].lock:
+                contesto["unisci_dati"].intervalli.clear()
+
+        def frequenza(contesto):
+            return visualizzazione.scegli_frequenza(contesto["filtro_inizio"], contesto["filtro_fine"])
+
+        def prepara_grafici(contesto):
+            contesto["grafici"] = self.dati_grafici(contesto, frequenza(contesto))
+
+        def grafico(nome):
+            disegna = getattr(visualizzazione, "disegna_grafico_" + nome)
+            # figura disegnata e salvata in PNG come nella cache delle immagini (che la chiude subito dopo)
+            return Fase("disegna_grafico_" + nome, lambda c: cache_grafici.salva_figura(disegna(c["grafici"][nome])), prepara=prepara_grafici)
+
+        return [
+            Fase("genera_dati_storici", lambda c: self.generatore.genera_dati_storici(c["data_inizio"], c["data_fine"]), per_record=True),
+            Fase("genera_archivio_storico", lambda c: self.generatore.genera_archivio_storico(c["data_inizio"], c["data_fine"], self.SEED)),
+            Fase("carica_dati", lambda c: gestore_dati(c).carica_dati(), azzera=lambda c: cache_caricamenti.invalida(c["percorso"]), dipendenza=True),
+            Fase("unisci_dati", lambda c: gestore_dati(c, c["vista_unita"]).unisci_dati(c["carica_dati"], c["manuali"]), azzera=nuova_vista_unita, dipendenza=True),
+            Fase("unisci_dati:aggiornamento", lambda c: gestore_dati(c, c["vista_unita"]).unisci_dati(c["carica_dati"], c["manuali_modificati"]), azzera=vista_con_manuali),
+            Fase("filtra_record_per_data", lambda c: self.gestore_filtro.filtra_record_per_data(c["unisci_dati"], c["filtro_inizio"], c["filtro_fine"]), azzera=svuota_intervalli, dipendenza=True),
+            Fase("prepara_dati_storici", lambda c: elaboratore.prepara_dati_storici(c["filtra_record_per_data"]), dipendenza=True),
+            Fase("prepara_dati_storici:record", lambda c: elaboratore.prepara_dati_storici(c["record_filtrati"]),
+                 prepara=lambda c: c.update(record_filtrati=c["filtra_record_per_data"].a_record()), per_record=True),
+            Fase("applica_simulazione_ai_record", lambda c: elaboratore.applica_simulazione_ai_record(c["prepara_dati_storici"], RICICLO, LAVORAZIONE), dipendenza=True),
+            Fase("applica_simulazione_ai_record:record", lambda c: elaboratore.applica_simulazione_ai_record(c["record_preparati"], RICICLO, LAVORAZIONE),
+                 prepara=lambda c: c.update(record_preparati=c["prepara_dati_storici"].a_record()), per_record=True),
+            Fase("calcola_aggregati", lambda c: elaboratore.calcola_aggregati(c["applica_simulazione_ai_record"], c["filtro_inizio"], c["filtro_fine"]), dipendenza=True),
+            Fase("calcola_netto_scarto", lambda c: elaboratore.calcola_netto_scarto(c["applica_simulazione_ai_record"])),
+            Fase("calcola_sommario_costi", lambda c: elaboratore.calcola_sommario_costi(c["applica_simulazione_ai_record"])),
+            Fase("calcola_indice_qualita", lambda c: elaboratore.calcola_indice_qualita(c["applica_simulazione_ai_record"])),
+            Fase("calcola_metriche_giornaliere", lambda c: elaboratore.calcola_metriche_giornaliere(c["applica_simulazione_ai_record"])),
+            Fase("calcola_somme_giornaliere", lambda c: elaboratore.calcola_somme_giornaliere(c["applica_simulazione_ai_record"], c["filtro_inizio"], c["filtro_fine"]), dipendenza=True),
+            Fase("ricampiona_serie", lambda c: elaboratore.ricampiona_serie(c["calcola_somme_giornaliere"], frequenza(c))),
+            Fase("rollup_dati", lambda c: c["vista_rollup"].rollup_dati(c["unisci_dati"]), azzera=lambda c: c.update(vista_rollup=VistaRollup(elaboratore)), dipendenza=True),
+            Fase("aggregati_da_rollup", lambda c: elaboratore.aggregati_da_rollup(c["rollup_dati"], c["filtro_inizio"], c["filtro_fine"]), dipendenza=True),
+            Fase("simula_aggregati", lambda c: elaboratore.simula_aggregati(c["aggregati_da_rollup"], RICICLO, LAVORAZIONE)),
+            Fase("conta_campioni_zone", lambda c: self.gestore_mappa.conta_campioni_zone(c["applica_simulazione_ai_record"]), dipendenza=True),
+            # mappa creata e renderizzata in HTML, come la visualizza folium_static
+            Fase("crea_mappa_custom", lambda c: self.gestore_mappa.crea_mappa_custom(c["zone"], c["conta_campioni_zone"]).get_root().render(),
+                 prepara=lambda c: c.update(zone=self.gestore_mappa.suddividi_eez_ita(None))),
+            grafico("torta"),
+            grafico("barre"),
+            grafico("costi"),
+            grafico("temporale")
+        ]
+
+    def dati_grafici(self, contesto, frequenza):
+        ''' Costruisce i dati aggregati dei grafici matplotlib come li costruisce la dashboard a partire dagli aggregati simulati. '''
+        aggregati = contesto["calcola_aggregati"]
+        netto_scarto = aggregati.netto_scarto()
+        costi = aggregati.sommario_costi()
+        tipi = sorted((tipo for tipo in netto_scarto if tipo != "Totale"), key=lambda tipo: -(netto_scarto[tipo]["netto"] + netto_scarto[tipo]["scarto"]))
+        serie = self.elaboratore_dati.ricampiona_serie(aggregati.somme_giornaliere, frequenza)
+
+        def normalizza(valori):
+            minimo, massimo = min(valori), max(valori)
+            return [(x - minimo) / (massimo - minimo) if massimo > minimo else 0 for x in valori]
+        return {
+            "torta": {"scarto": netto_scarto["Totale"]["scarto"], "netto": netto_scarto["Totale"]["netto"]},
+            "barre": {"tipi": tipi, "netto": [netto_scarto[t]["netto"] for t in tipi], "scarto": [netto_scarto[t]["scarto"] for t in tipi]},
+            "costi": {
+                "tipi": list(costi),
+                "produzione": [v["costo_produzione"] for v in costi.values()],
+                "utile": [v["utile_lordo"] for v in costi.values()]
+            },
+            "temporale": {
+                "date": [str(punto["data"]) for punto in serie],
+                "quantita": normalizza([punto["quantita"] for punto in serie]),
+                "prezzo": normalizza([punto["prezzo_medio"] for punto in serie]),
+                "qualita": normalizza([punto["qualita_media"] for punto in serie])
+            }
+        }
+
+    def misura(self, fase, contesto):
+        ''' Esegue la fase e ne restituisce il tempo migliore (in secondi) e il picco di memoria allocata (in MB, None se la memoria non viene misurata); il risultato resta nel contesto. '''
+        if fase.prepara:
+            fase.prepara(contesto)
+        migliore, totale, ripetizioni = None, 0.0, 0
+        while ripetizioni < max(self.ripetizioni, 1) and totale < self.TEMPO_MASSIMO_RIPETIZIONI:
+            if fase.azzera:
+                fase.azzera(contesto)
+            contesto.pop(fase.nome, None)
+            gc.collect()
+            inizio = time.perf_counter()
+            contesto[fase.nome] = fase.esegui(contesto)
+            secondi = time.perf_counter() - inizio
+            migliore = secondi if migliore is None else min(migliore, secondi)
+            totale += secondi
+            ripetizioni += 1
+        picco_mb = None
+        if self.memoria:
+            if fase.azzera:
+                fase.azzera(contesto)
+            contesto.pop(fase.nome, None)
+            gc.collect()
+            # tracemalloc vede solo ciò che viene allocato durante la fase (anche gli array NumPy), non le pagine dei file mappati in memoria
+            tracemalloc.start()
+            try:
+                contesto[fase.nome] = fase.esegui(contesto)
+                picco_mb = tracemalloc.get_traced_memory()[1] / 2 ** 20
+            finally:
+                tracemalloc.stop()
+        return migliore, picco_mb, ripetizioni
+
+    def esegui(self, dimensioni=DIMENSIONI):
+        ''' Esegue tutte le fasi per ogni dimensione e restituisce i risultati man mano che vengono misurati (un dizionario per dimensione e fase). '''
+        fasi = self.fasi()
+        for righe in dimensioni:
+            cartella = tempfile.mkdtemp(prefix="benchmark_")
+            try:
+                contesto = self.crea_contesto(righe, cartella)
+                for fase in fasi:
+                    scelta = self.scelte is None or fase.nome in self.scelte
+                    if not scelta:
+                        # le fasi non scelte servono solo se le successive ne usano il risultato
+                        if fase.dipendenza:
+                            if fase.azzera:
+                                fase.azzera(contesto)
+                            contesto[fase.nome] = fase.esegui(contesto)
+                        continue
+                    risultato = {"righe": righe, "fase": fase.nome}
+                    if fase.per_record and righe > self.limite_record:
+                        risultato["saltata"] = f"oltre {self.limite_record} righe"
+                    else:
+                        chiavi = set(contesto)
+                        secondi, picco_mb, ripetizioni = self.misura(fase, contesto)
+                        risultato.update(secondi=round(secondi, 6), picco_mb=None if picco_mb is None else round(picco_mb, 3), ripetizioni=ripetizioni)
+                        if not fase.dipendenza:
+                            # risultato e ingressi della fase non servono alle successive: li libero, così la memoria non si accumula sugli archivi grandi
+                            for chiave in set(contesto) - chiavi:
+                                del contesto[chiave]
+                    yield risultato
+            finally:
+                cache_caricamenti.invalida()
+                shutil.rmtree(cartella, ignore_errors=True)
+
+    @staticmethod
+    def ambiente():
+        ''' Descrive la macchina su cui sono state fatte le misure (i confronti hanno senso solo sulla stessa macchina). '''
+        return {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "sistema": platform.platform(),
+            "processore": platform.processor() or platform.machine(),
+            "core": os.cpu_count()
+        }
+
+    @classmethod
+    def salva_baseline(cls, percorso, risultati):
+        ''' Salva i risultati come baseline, insieme alla descrizione dell'ambiente e alla data. '''
+        baseline = {"data": date.today().isoformat(), "ambiente": cls.ambiente(), "risultati": risultati}
+        temporaneo = percorso + ".tmp"
+        with open(temporaneo, "w") as f:
+            json.dump(baseline, f, indent=2)
+        os.replace(temporaneo, percorso)
+
+    @staticmethod
+    def leggi_baseline(percorso):
+        ''' Legge la baseline salvata; None se il file non esiste. '''
+        if not os.path.exists(percorso):
+            return None
+        with open(percorso, "r") as f:
+            return json.load(f)
+
+    @classmethod
+    def regressioni(cls, risultato, baseline, soglia=None):
+        ''' Confronta un risultato con la misura della baseline per la stessa dimensione e fase; restituisce le regressioni di tempo e di memoria (lista vuota se non ce ne sono o se la baseline non ha la misura). '''
+        soglia = cls.SOGLIA if soglia is None else soglia
+        riferimento = next((r for r in baseline["risultati"] if (r["righe"], r["fase"]) == (risultato["righe"], risultato["fase"])), None)
+        regressioni = []
+        if riferimento is None:
+            return regressioni
+        for misura, minimo in (("secondi", cls.MINIMO_SECONDI), ("picco_mb", cls.MINIMO_MB)):
+            attuale, precedente = risultato.get(misura), riferimento.get(misura)
+            if attuale is None or precedente is None:
+                continue
+            if attuale > precedente * (1 + soglia) and attuale - precedente > minimo:
+                variazione = (attuale - precedente) / precedente * 100 if precedente else float("inf")
+                regressioni.append({"misura": misura, "attuale": attuale, "baseline": precedente, "variazione_pct": round(variazione, 1)})
+        return regressioni
+
+
+# Con main eseguo il benchmark da riga di comando
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Misura tempo e picco di memoria di ogni fase della pipeline su archivi sintetici e segnala le regressioni rispetto alla baseline salvata.")
+    parser.add_argument("--righe", type=int, nargs="+", default=list(DIMENSIONI), help="dimensioni degli archivi sintetici, di default 10k, 100k, 1M e 10M righe")
+    parser.add_argument("--fasi", nargs="+", default=None, help="fasi da misurare, di default tutte")
+    parser.add_argument("--ripetizioni", type=int, default=3, help="esecuzioni per fase (si tiene il tempo migliore)")
+    parser.add_argument("--senza-memoria", action="store_true", help="non misura il picco di memoria (evita l'esecuzione aggiuntiva con tracemalloc)")
+    parser.add_argument("--limite-record", type=int, default=BenchmarkPipeline.LIMITE_RECORD, help="righe oltre le quali le fasi sulle liste di dizionari vengono saltate")
+    parser.add_argument("--baseline", default="benchmark_baseline.json", help="file della baseline")
+    parser.add_argument("--salva-baseline", action="store_true", help="salva i risultati come nuova baseline invece di confrontarli")
+    parser.add_argument("--soglia", type=float, default=BenchmarkPipeline.SOGLIA, help="peggioramento relativo oltre il quale una misura è una regressione (0.2 = 20%%)")
+    parser.add_argument("--output", default=None, help="file JSON in cui salvare i risultati")
+    args = parser.parse_args()
+
+    try:
+        benchmark = BenchmarkPipeline(args.ripetizioni, not args.senza_memoria, args.limite_record, args.fasi)
+    except ValueError as errore:
+        parser.error(str(errore))
+    baseline = None if args.salva_baseline else BenchmarkPipeline.leggi_baseline(args.baseline)
+    if baseline is not None and baseline.get("ambiente") != BenchmarkPipeline.ambiente():
+        print(f"Attenzione: la baseline '{args.baseline}' è stata misurata in un ambiente diverso.", file=sys.stderr)
+    risultati, regressioni = [], []
+    print(f"{'righe':>10}  {'fase':<40}{'secondi':>12}{'picco MB':>12}  confronto con la baseline")
+    for risultato in benchmark.esegui(args.righe):
+        risultati.append(risultato)
+        if "saltata" in risultato:
+            print(f"{risultato['righe']:>10}  {risultato['fase']:<40}{'-':>12}{'-':>12}  saltata ({risultato['saltata']})")
+            continue
+        confronto = ""
+        if baseline is not None:
+            trovate = BenchmarkPipeline.regressioni(risultato, baseline, args.soglia)
+            regressioni += [dict(trovata, righe=risultato["righe"], fase=risultato["fase"]) for trovata in trovate]
+            confronto = ", ".join(f"REGRESSIONE {r['misura']} {r['baseline']} -> {r['attuale']} (+{r['variazione_pct']}%)" for r in trovate) or "ok"
+        picco = "-" if risultato["picco_mb"] is None else f"{risultato['picco_mb']:.1f}"
+        print(f"{risultato['righe']:>10}  {risultato['fase']:<40}{risultato['secondi']:>12.4f}{picco:>12}  {confronto}", flush=True)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"ambiente": BenchmarkPipeline.ambiente(), "risultati": risultati, "regressioni": regressioni}, f, indent=2)
+    if args.salva_baseline:
+        BenchmarkPipeline.salva_baseline(args.baseline, risultati)
+        print(f"Baseline salvata in '{args.baseline}'.", file=sys.stderr)
+    elif baseline is None:
+        print(f"Nessuna baseline in '{args.baseline}': per crearla rilanciare con --salva-baseline.", file=sys.stderr)
+    elif regressioni:
+        print(f"{len(regressioni)} regressioni rispetto alla baseline.", file=sys.stderr)
+        sys.exit(1)
@@ -1,6 +1,10 @@
 # Fi.Co? S.Vi.To.! A Fishing Company Simulation and Visualization Tool - Ver. 1.0"- business_logic.py
 
-from collections import defaultdict
+import threading
+from collections import OrderedDict
+import numpy as np
+from archivio_colonnare import ArchivioColonnare, MANCANTE, arrotonda
+from rollup_campioni import RollupCampioni, RollupUnione
 
 class ElaboratoreDati:
     ''' Classe per l'elaborazione dei dati relativi ai campioni di pesca. '''
@@ -14,13 +18,7 @@ class ElaboratoreDati:
     # calcolo netto e scarto per tipo (per footer e indicatori)
     def calcola_netto_scarto(self, records):
         ''' Calcola il netto e lo scarto per ogni tipo di pesce. '''
-        risultato = defaultdict(lambda: {"netto": 0, "scarto": 0})
-        for r in records:
-            tipo = r.get("tipo", "Altro")
-            risultato[tipo]["netto"] += float(r.get("netto", 0))
-            risultato[tipo]["scarto"] += float(r.get("scarto", 0))
-        risultato["Totale"] = {"netto": sum(v["netto"] for v in risultato.values()), "scarto": sum(v["scarto"] for v in risultato.values())}
-        return dict(risultato)
+        return self.calcola_aggregati(records).netto_scarto()
 
     # calcolo differenze % tra simulato e storico 
     def calcola_delta_footer(self, original, simulated):
@@ -42,6 +40,8 @@ class ElaboratoreDati:
     # Pulizia dei record storici
     def prepara_dati_storici(self, records):
         ''' Prepara i dati storici, calcolando qualità, utile, prezzo finale e costo. '''
+        if isinstance(records, ArchivioColonnare):
+            return self.prepara_dati_storici_colonnare(records)
         preparati = []
         for r in records:
             r_copy = r.copy()
@@ -92,13 +92,51 @@ class ElaboratoreDati:
 
         return preparati
 
+    def prepara_dati_storici_colonnare(self, archivio):
+        ''' Versione colonnare di prepara_dati_storici: stessa logica applicata a intere colonne, restituisce un nuovo ArchivioColonnare. '''
+        prezzo_medio = archivio.valori("prezzo_medio", 1.0)
+        omogeneita = archivio.interi("omogeneita", 1)
+        stress = archivio.interi("stress", 1)
+        scarto = archivio.valori("scarto", 0.0)
+        netto = archivio.valori("netto", 0.0)
+
+        # LOGICA: QUALITÀ: 3 + omogeneità - stress, min 0 max 5 (solo dove manca nel record)
+        qualita = np.clip(3 + omogeneita - stress, 0, 5).astype(np.float64)
+        if archivio.colonna("qualita") is not None:
+            qualita = np.where(np.isnan(archivio.colonna("qualita")), qualita, archivio.colonna("qualita"))
+
+        # normalizzo UTILE lordo e PREZZO finale per €/kg se presenti come totali
+        def normalizza(campo, fallback):
+            originale = archivio.colonna(campo)
+            if originale is None:
+                return fallback
+            per_kg = np.divide(originale, netto, out=np.full(len(archivio), np.inf), where=(originale > 100) & (netto != 0))
+            return np.where(np.isnan(originale), fallback, np.where(originale > 100, per_kg, originale))
+
+        utile = normalizza("utile", prezzo_medio * 0.25)
+        prezzo_finale = normalizza("prezzo_finale", np.zeros(len(archivio)))
+
+        return archivio.con_colonne(
+            scarto=arrotonda(scarto),
+            netto=arrotonda(netto),
+            kg=arrotonda(netto + scarto),
+            prezzo_medio=prezzo_medio,
+            qualita=arrotonda(qualita),
+            utile=arrotonda(utile),
+            prezzo_finale=arrotonda(prezzo_finale),
+            costo=arrotonda(prezzo_medio)
+        )
 
     # Simulazione
     def applica_simulazione_ai_record(self, records, riciclo_scarti_pct, lavorazione_intensiva_pct):
         ''' Applica la simulazione ai record, modificando scarto, netto, costo, utile, prezzo finale e qualità. '''
         # Se gli slider sono entrambi a zero, restituisco una copia dei dati originali
         if riciclo_scarti_pct == 0 and lavorazione_intensiva_pct == 0:
+            if isinstance(records, ArchivioColonnare):
+                return records
             return [r.copy() for r in records]
+        if isinstance(records, ArchivioColonnare):
+            return self.applica_simulazione_colonnare(records, riciclo_scarti_pct, lavorazione_intensiva_pct)
 
         simulated = []
         for r in records:
@@ -142,90 +180,64 @@ class ElaboratoreDati:
 
         return simulated
 
+    def applica_simulazione_colonnare(self, archivio, riciclo_scarti_pct, lavorazione_intensiva_pct):
+        ''' Versione vettoriale di applica_simulazione_ai_record: applica le stesse formule a intere colonne, con lo stesso arrotondamento e lo stesso limite 0-5 sulla qualità. '''
+        if riciclo_scarti_pct == 0 and lavorazione_intensiva_pct == 0:
+            return archivio
+
+        kg = archivio.valori("kg", 0.0)
+        prezzo_medio = archivio.valori("prezzo_medio", 0.0)
+        prezzo_medio = np.where(prezzo_medio == 0, 1.0, prezzo_medio)  # evita 0
+
+        # LOGICA: lo scarto si riduce se il riciclo aumenta (fino al -12%)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            scarto_pct = archivio.valori("scarto", 0.0) / kg
+        scarto_pct -= (riciclo_scarti_pct / 100) * 0.12
+        scarto = kg * scarto_pct
+        netto = kg - scarto
+
+        # LOGICA: i fattori dipendono solo dagli slider, li calcolo una volta come scalari
+        fattore_costo = 1 + (riciclo_scarti_pct / 100) * 0.1 - (lavorazione_intensiva_pct / 100) * 0.2
+        fattore_utile = 1 + (lavorazione_intensiva_pct / 100) * 0.2
+        costo_produzione = prezzo_medio * fattore_costo
+        utile_lordo = archivio.valori("utile", np.nan) * fattore_utile
+        prezzo_finale = costo_produzione + utile_lordo
+
+        # LOGICA: la qualita' diminuisce fino a -1 con la lavorazione intensiva
+        # omogeneità e stress sono livelli interi: calcolo la qualità per ogni differenza possibile e la leggo da una tabella
+        differenza = archivio.interi("omogeneita", 1) - archivio.interi("stress", 0)
+        minimo = int(differenza.min()) if len(differenza) else 0
+        livelli = np.arange(minimo, int(differenza.max()) + 1 if len(differenza) else 1)
+        tabella_qualita = np.clip(arrotonda((3 + livelli) - (lavorazione_intensiva_pct / 100)), 0, 5)
+        qualita = tabella_qualita[differenza - minimo]
+
+        return archivio.con_colonne(
+            scarto=arrotonda(scarto),
+            netto=arrotonda(netto),
+            costo=arrotonda(costo_produzione),
+            utile=arrotonda(utile_lordo),
+            prezzo_finale=arrotonda(prezzo_finale),
+            qualita=qualita
+        )
+
     # Calcolo i costi medi di produzione, utile lordo e prezzo finale per tipo di pesce.
     def calcola_sommario_costi(self, records):
         ''' Calcola i costi medi di produzione, l'utile lordo e il prezzo finale per tipo di pesce. '''
-        cost_summary = {}
-        for r in records:
-            tipo = r.get("tipo", "Altro")
-            prezzo_fonte = float(r.get("prezzo_medio", 0)) if r.get("prezzo_medio") is not None else 1.0 
-            costo_produzione = float(r.get("costo", prezzo_fonte)) if r.get("costo") is not None else prezzo_fonte
-            raw_utile = r.get("utile", None)
-            if raw_utile is None or raw_utile == 0:
-                utile_lordo = costo_produzione * 0.25 
-            else:
-                utile_lordo = float(raw_utile)
-            prezzo_finale = costo_produzione + utile_lordo
-
-            if tipo not in cost_summary:
-                cost_summary[tipo] = {
-                    "costo_produzione": 0,
-                    "utile_lordo": 0,
-                    "prezzo_finale": 0,
-                    "count": 0
-                }
-
-            cost_summary[tipo]["costo_produzione"] += costo_produzione
-            cost_summary[tipo]["utile_lordo"] += utile_lordo
-            cost_summary[tipo]["prezzo_finale"] += prezzo_finale
-            cost_summary[tipo]["count"] += 1
-
-        for tipo in cost_summary:
-            count = cost_summary[tipo]["count"]
-            cost_summary[tipo]["costo_produzione"] /= count
-            cost_summary[tipo]["utile_lordo"] /= count
-            cost_summary[tipo]["prezzo_finale"] /= count
-
-        # Calcola la media generale
-        if cost_summary:
-            media_costo = sum(v["costo_produzione"] for v in cost_summary.values()) / len(cost_summary)
-            media_utile = sum(v["utile_lordo"] for v in cost_summary.values()) / len(cost_summary)
-            media_prezzo = sum(v["prezzo_finale"] for v in cost_summary.values()) / len(cost_summary)
-            cost_summary["Media"] = {
-                "costo_produzione": media_costo,
-                "utile_lordo": media_utile,
-                "prezzo_finale": media_prezzo,
-                "count": len(cost_summary)
-            }
-        else:
-            cost_summary["Media"] = {
-                "costo_produzione": 0,
-                "utile_lordo": 0,
-                "prezzo_finale": 0,
-                "count": 0
-            }
-
-        return cost_summary
+        return self.calcola_aggregati(records).sommario_costi()
 
     def calcola_indice_qualita(self, records):
         ''' Calcola l'indice di qualità per ogni tipo di pesce e un indice globale. '''
-        qualita_per_tipo = {}
-        for r in records:
-            tipo = r.get("tipo", "Altro")
-            qualita = float(r.get("qualita", 0))
-
-            if tipo not in qualita_per_tipo:
-                qualita_per_tipo[tipo] = {
-                    "tot": 0,
-                    "count": 0
-                }
-
-            qualita_per_tipo[tipo]["tot"] += qualita
-            qualita_per_tipo[tipo]["count"] += 1
-
-        for tipo in qualita_per_tipo:
-            tot = qualita_per_tipo[tipo]["tot"]
-            count = qualita_per_tipo[tipo]["count"]
-            qualita_per_tipo[tipo] = round(tot / count, 2) if count else 0
-
-        totale = sum(qualita_per_tipo[t] for t in qualita_per_tipo)
-        count = len(qualita_per_tipo)
-        qualita_per_tipo["globale"] = round(totale / count, 2) if count else 0
-
-        return qualita_per_tipo
+        return self.calcola_aggregati(records).indice_qualita()
 
     def calcola_metriche_giornaliere(self, records):
         ''' Calcola le metriche giornaliere (quantità, prezzo medio, qualità media). '''
+        if isinstance(records, ArchivioColonnare):
+            n = len(records)
+            return {
+                "quantita": round(float(records.valori("kg").sum()), 2),
+                "prezzo_medio": round(float(records.valori("prezzo_medio").sum()) / n, 2) if n else 0,
+                "qualita_media": round(float(records.valori("qualita").sum()) / n, 2) if n else 0
+            }
         total_kg = sum(float(r.get("kg", 0)) for r in records)
         prezzo_medio = sum(float(r.get("prezzo_medio", 0)) for r in records) / len(records) if records else 0
         qualita_media = sum(float(r.get("qualita", 0)) for r in records) / len(records) if records else 0
@@ -235,6 +247,153 @@ class ElaboratoreDati:
             "qualita_media": round(qualita_media, 2)
         }
 
+    def calcola_somme_giornaliere(self, records, data_inizio, data_fine):
+        ''' Raggruppa i record per giorno in un'unica passata: per ogni giorno dell'intervallo somma quantità, prezzo medio e qualità e conta i campioni. '''
+        archivio = ArchivioColonnare.da_record(records)
+        giorni = (data_fine - data_inizio).days + 1
+        indice = (archivio.colonna("data") - np.datetime64(data_inizio, "D")).astype(np.int64)
+        nel_periodo = (indice >= 0) & (indice < giorni)
+        if not nel_periodo.all():
+            archivio = archivio.seleziona(nel_periodo)
+            indice = indice[nel_periodo]
+        return {
+            "data": np.arange(np.datetime64(data_inizio, "D"), np.datetime64(data_fine, "D") + 1),
+            "kg": np.bincount(indice, weights=archivio.valori("kg"), minlength=giorni),
+            "prezzo_medio": np.bincount(indice, weights=archivio.valori("prezzo_medio"), minlength=giorni),
+            "qualita": np.bincount(indice, weights=archivio.valori("qualita"), minlength=giorni),
+            "conteggio": np.bincount(indice, minlength=giorni)
+        }
+
+    def ricampiona_serie(self, somme_giornaliere, frequenza="giorno"):
+        ''' Ricava dalle somme giornaliere la serie temporale alla frequenza richiesta (giorno, settimana, mese o anno), con le stesse metriche di calcola_metriche_giornaliere. '''
+        date_giorni = somme_giornaliere["data"]
+        if frequenza == "giorno":
+            etichette, gruppi = date_giorni, np.arange(len(date_giorni))
+        else:
+            if frequenza == "settimana":
+                # il 1970-01-01 era un giovedì: riporto ogni giorno al lunedì della sua settimana
+                inizio_gruppo = date_giorni - ((date_giorni.astype(np.int64) + 3) % 7).astype("timedelta64[D]")
+            elif frequenza == "mese":
+                inizio_gruppo = date_giorni.astype("datetime64[M]").astype("datetime64[D]")
+            elif frequenza == "anno":
+                inizio_gruppo = date_giorni.astype("datetime64[Y]").astype("datetime64[D]")
+            else:
+                raise ValueError(f"Frequenza non supportata: {frequenza}")
+            etichette, gruppi = np.unique(inizio_gruppo, return_inverse=True)
+            # il primo gruppo può iniziare prima dell'intervallo: lo etichetto con la data di inizio
+            if len(etichette):
+                etichette = np.maximum(etichette, date_giorni[0])
+        def somma(campo):
+            return np.bincount(gruppi, weights=somme_giornaliere[campo], minlength=len(etichette)).tolist()
+        quantita, prezzi, qualita = somma("kg"), somma("prezzo_medio"), somma("qualita")
+        conteggi = np.bincount(gruppi, weights=somme_giornaliere["conteggio"], minlength=len(etichette)).tolist()
+        return [
+            {
+                "data": data,
+                "quantita": round(quantita[i], 2),
+                "prezzo_medio": round(prezzi[i] / conteggi[i], 2) if conteggi[i] else 0,
+                "qualita_media": round(qualita[i] / conteggi[i], 2) if conteggi[i] else 0
+            }
+            for i, data in enumerate(etichette.tolist())
+        ]
+
+    def calcola_serie_temporale(self, records, data_inizio, data_fine, frequenza="giorno"):
+        ''' Calcola la serie temporale di quantità, prezzo medio e qualità media con un solo raggruppamento dei record. '''
+        return self.ricampiona_serie(self.calcola_somme_giornaliere(records, data_inizio, data_fine), frequenza)
+
+    def valori_aggregazione(self, archivio):
+        ''' Restituisce, per ogni record, i valori sommati dal kernel di aggregazione e dai rollup: quantità, prezzo medio, qualità e costo, utile e prezzo finale come nel sommario costi (senza costo uso il prezzo medio, senza utile o a zero il 25% del costo), più i termini che servono a simula_somme. '''
+        costo_produzione = archivio.valori("costo", np.nan)
+        costo_produzione = np.where(np.isnan(costo_produzione), archivio.valori("prezzo_medio", 1.0), costo_produzione)
+        utile = archivio.valori("utile", 0.0)
+        utile_lordo = np.where(utile == 0, costo_produzione * 0.25, utile)
+        # termini della simulazione: prezzo medio come in applica_simulazione_ai_record (0 diventa 1) e istogramma a tre classi di omogeneità - stress
+        prezzo_simulazione = archivio.valori("prezzo_medio", 0.0)
+        prezzo_simulazione = np.where(prezzo_simulazione == 0, 1.0, prezzo_simulazione)
+        differenza = archivio.interi("omogeneita", 1) - archivio.interi("stress", 0)
+        libera = (differenza >= -2) & (differenza <= 2)
+        return {
+            "kg": archivio.valori("kg"),
+            "netto": archivio.valori("netto"),
+            "scarto": archivio.valori("scarto"),
+            "prezzo_medio": archivio.valori("prezzo_medio"),
+            "costo_produzione": costo_produzione,
+            "utile_lordo": utile_lordo,
+            "prezzo_finale": costo_produzione + utile_lordo,
+            "qualita": archivio.valori("qualita"),
+            "utile": utile,
+            "prezzo_simulazione": prezzo_simulazione,
+            "prezzo_senza_utile": np.where(utile == 0, prezzo_simulazione, 0.0),
+            "campioni_qualita_libera": libera.astype(np.float64),
+            "differenza_qualita": np.where(libera, differenza, 0).astype(np.float64),
+            "campioni_qualita_massima": (differenza >= 3).astype(np.float64)
+        }
+
+    def simula_somme(self, somme, riciclo_scarti_pct, lavorazione_intensiva_pct):
+        ''' Simulazione in forma chiusa: applica le formule di applica_simulazione_ai_record a somme già aggregate (per tipo o per periodo, con i campi di valori_aggregazione) invece che ai singoli record. Le formule sono affini negli slider, quindi le somme simulate derivano da quelle storiche. Non coincide esattamente con la simulazione record per record, che arrotonda ogni record al centesimo: le medie per tipo (e la "Media") di costo e utile differiscono al più di 0.005, il prezzo finale (somma di due valori arrotondati) di 0.01, netto e scarto totali di 0.005 per campione e l'indice di qualità, già arrotondato a due decimali, di 0.01. Gli slider possono essere anche array (es. una griglia di scenari), combinati con le somme per broadcasting; con entrambi gli slider a zero la dashboard mostra invece i dati storici (vedi simula_aggregati). '''
+        riciclo = riciclo_scarti_pct / 100
+        lavorazione = lavorazione_intensiva_pct / 100
+        fattore_costo = 1 + riciclo * 0.1 - lavorazione * 0.2
+        fattore_utile = 1 + lavorazione * 0.2
+        simulate = dict(somme)
+        # LOGICA: lo scarto si riduce del 12% dei kg per ogni punto di riciclo, il netto è il resto dei kg
+        simulate["scarto"] = somme["scarto"] - somme["kg"] * riciclo * 0.12
+        simulate["netto"] = somme["kg"] - simulate["scarto"]
+        # LOGICA: costo e utile scalano con gli slider; dove l'utile è zero il sommario costi usa il 25% del costo simulato
+        simulate["costo_produzione"] = somme["prezzo_simulazione"] * fattore_costo
+        simulate["utile_lordo"] = somme["utile"] * fattore_utile + somme["prezzo_senza_utile"] * fattore_costo * 0.25
+        simulate["prezzo_finale"] = simulate["costo_produzione"] + simulate["utile_lordo"]
+        # LOGICA: qualità = 3 + omogeneità - stress - lavorazione, limitata a 0-5: con la lavorazione tra 0 e 1 il limite
+        # agisce solo sulle differenze <= -3 (sempre 0) e >= 3 (sempre 5), quindi bastano tre classi
+        simulate["qualita"] = (
+            somme["campioni_qualita_libera"] * (3 - lavorazione)
+            + somme["differenza_qualita"]
+            + somme["campioni_qualita_massima"] * 5
+        )
+        return simulate
+
+    def simula_aggregati(self, aggregati, riciclo_scarti_pct, lavorazione_intensiva_pct):
+        ''' Restituisce gli aggregati simulati in forma chiusa a partire da quelli storici (letti dai rollup o calcolati con calcola_aggregati): il costo dipende dal numero di tipi, non dai record, e gli slider possono assumere qualsiasi valore tra 0 e 100. Dashboard e scenari_batch usano entrambi questa strada, quindi mostrano gli stessi valori; per lo scostamento dalla simulazione record per record vedi simula_somme. '''
+        if riciclo_scarti_pct == 0 and lavorazione_intensiva_pct == 0:
+            return aggregati
+        def simula(somme):
+            return self.simula_somme(somme, riciclo_scarti_pct, lavorazione_intensiva_pct)
+        return AggregatiCampioni(aggregati.tipi, aggregati.conteggi, simula(aggregati.somme), rollup=aggregati.rollup, simula=simula)
+
+    def calcola_aggregati(self, records, data_inizio=None, data_fine=None):
+        ''' Kernel di aggregazione: raggruppa i record per tipo una sola volta e ne calcola somme e conteggi (e, se è indicato l'intervallo, le somme giornaliere); restituisce un AggregatiCampioni da cui grafici e metriche leggono i riepiloghi. '''
+        archivio = ArchivioColonnare.da_record(records)
+        tipi, gruppi = archivio.gruppi("tipo")
+        valori = self.valori_aggregazione(archivio)
+        # bincount accumula nello stesso ordine del ciclo sui record: le somme sono identiche a quelle della versione a dizionari
+        somme = {campo: np.bincount(gruppi, weights=v, minlength=len(tipi)) for campo, v in valori.items()}
+        conteggi = np.bincount(gruppi, minlength=len(tipi))
+        somme_giornaliere = None
+        if data_inizio is not None and data_fine is not None:
+            somme_giornaliere = self.calcola_somme_giornaliere(archivio, data_inizio, data_fine)
+        return AggregatiCampioni(tipi, conteggi, somme, somme_giornaliere)
+
+    def aggregati_da_rollup(self, rollup, data_inizio, data_fine):
+        ''' Come calcola_aggregati, ma leggendo somme e conteggi per tipo dai rollup invece che dai record: il costo non dipende dalla lunghezza dell'intervallo. Le serie temporali si leggono poi da rollup.serie. '''
+        conteggi_codici, somme_codici = rollup.totali_per_tipo(data_inizio, data_fine)
+        # nomi come in ArchivioColonnare.gruppi: il tipo mancante (codice 0) diventa "Altro"; tengo solo i tipi con campioni nell'intervallo
+        nomi = ["Altro"] + list(rollup.tipi)
+        tipi = []
+        gruppi = np.empty(len(nomi), dtype=np.int64)
+        for codice in list(range(1, len(nomi))) + [0]:
+            if nomi[codice] not in tipi:
+                tipi.append(nomi[codice])
+            gruppi[codice] = tipi.index(nomi[codice])
+        conteggi = np.bincount(gruppi, weights=conteggi_codici, minlength=len(tipi))
+        somme = {campo: np.bincount(gruppi, weights=v, minlength=len(tipi)) for campo, v in somme_codici.items()}
+        presenti = np.flatnonzero(np.rint(conteggi) > 0)
+        return AggregatiCampioni(
+            [tipi[i] for i in presenti],
+            np.rint(conteggi[presenti]).astype(np.int64),
+            {campo: v[presenti] for campo, v in somme.items()},
+            rollup=rollup
+        )
+
     def calcola_e_simula_dati(self, prepared_records, riciclo_slider_value, lavorazione_slider_value):
         ''' Calcola e simula i dati, applicando la simulazione ai record preparati. '''
         simulated_records = self.applica_simulazione_ai_record(
@@ -244,3 +403,296 @@ class ElaboratoreDati:
         )
 
         return prepared_records, simulated_records
+
+
+class AggregatiCampioni:
+    ''' Risultato del kernel di aggregazione: somme e conteggi per tipo (e somme giornaliere, oppure il rollup da cui leggere le serie) calcolati una volta o derivati in forma chiusa; i riepiloghi per grafici e footer ne derivano e vengono memorizzati al primo uso. '''
+    def __init__(self, tipi, conteggi, somme, somme_giornaliere=None, rollup=None, simula=None):
+        self.tipi = tipi
+        self.conteggi = conteggi
+        self.somme = somme
+        self.somme_giornaliere = somme_giornaliere
+        self.rollup = rollup
+        # funzione applicata alle somme lette dal rollup (simulazione in forma chiusa), oppure None
+        self.simula = simula
+        self.riepiloghi = {}
+
+    def serie(self, data_inizio, data_fine, livello):
+        ''' Somme della serie temporale al livello indicato, lette dal rollup ed eventualmente simulate. '''
+        serie = self.rollup.serie(data_inizio, data_fine, livello)
+        return self.simula(serie) if self.simula is not None else serie
+
+    def riepilogo(self, nome, calcola):
+        ''' Restituisce il riepilogo indicato, calcolandolo solo la prima volta (l'oggetto è condiviso da grafici e footer). '''
+        if nome not in self.riepiloghi:
+            self.riepiloghi[nome] = calcola()
+        return self.riepiloghi[nome]
+
+    def netto_scarto(self):
+        ''' Netto e scarto per tipo di pesce, più la riga "Totale". '''
+        def calcola():
+            risultato = {
+                tipo: {"netto": float(self.somme["netto"][i]), "scarto": float(self.somme["scarto"][i])}
+                for i, tipo in enumerate(self.tipi)
+            }
+            risultato["Totale"] = {"netto": sum(v["netto"] for v in risultato.values()), "scarto": sum(v["scarto"] for v in risultato.values())}
+            return risultato
+        return self.riepilogo("netto_scarto", calcola)
+
+    def sommario_costi(self):
+        ''' Costi medi di produzione, utile lordo e prezzo finale per tipo di pesce, più la riga "Media" (media delle medie per tipo). '''
+        def calcola():
+            cost_summary = {}
+            for i, tipo in enumerate(self.tipi):
+                count = int(self.conteggi[i])
+                cost_summary[tipo] = {
+                    "costo_produzione": float(self.somme["costo_produzione"][i]) / count,
+                    "utile_lordo": float(self.somme["utile_lordo"][i]) / count,
+                    "prezzo_finale": float(self.somme["prezzo_finale"][i]) / count,
+                    "count": count
+                }
+            if cost_summary:
+                cost_summary["Media"] = {
+                    "costo_produzione": sum(v["costo_produzione"] for v in cost_summary.values()) / len(cost_summary),
+                    "utile_lordo": sum(v["utile_lordo"] for v in cost_summary.values()) / len(cost_summary),
+                    "prezzo_finale": sum(v["prezzo_finale"] for v in cost_summary.values()) / len(cost_summary),
+                    "count": len(cost_summary)
+                }
+            else:
+                cost_summary["Media"] = {"costo_produzione": 0, "utile_lordo": 0, "prezzo_finale": 0, "count": 0}
+            return cost_summary
+        return self.riepilogo("sommario_costi", calcola)
+
+    def indice_qualita(self):
+        ''' Qualità media per tipo di pesce, più l'indice "globale" (media delle medie per tipo). '''
+        def calcola():
+            qualita_per_tipo = {
+                tipo: round(float(self.somme["qualita"][i]) / int(self.conteggi[i]), 2) if self.conteggi[i] else 0
+                for i, tipo in enumerate(self.tipi)
+            }
+            totale = sum(qualita_per_tipo.values())
+            count = len(qualita_per_tipo)
+            qualita_per_tipo["globale"] = round(totale / count, 2) if count else 0
+            return qualita_per_tipo
+        return self.riepilogo("indice_qualita", calcola)
+
+
+class VistaUnita:
+    ''' Vista persistente dell'unione tra storico e record manuali: lo storico viene indicizzato per chiave (data, tipo) una sola volta, i record manuali sono una sovrapposizione aggiornata solo sulle chiavi che cambiano. '''
+    def __init__(self, elaboratore_dati):
+        self.elaboratore_dati = elaboratore_dati
+        self.lock = threading.Lock()
+        # storico indicizzato: archivio di origine, archivio senza chiavi duplicate e ordinato per data, chiavi numeriche ordinate con la riga corrispondente
+        self.storico = None
+        self.base = None
+        self.chiavi_storico = None
+        self.righe_storico = None
+        self.codici_tipo = {}
+        # sovrapposizione: record manuale e posizione nello storico (riga sostituita, oppure punto di inserimento) per ogni chiave_record, e ultima unione prodotta
+        self.manuali = {}
+        self.posizioni = {}
+        self.unito = None
+        self.ricostruzioni = 0
+
+    def indicizza(self, archivio_storico):
+        ''' Indicizza lo storico per chiave: per ogni chiave resta il primo record, come in unisci_dati. '''
+        base = archivio_storico.ordina_per_data()
+        chiavi = self.chiave_numerica(base.colonna("data"), base.colonna("tipo"), len(base.categorie["tipo"]))
+        chiavi_uniche, prime = np.unique(chiavi, return_index=True)
+        if len(chiavi_uniche) < len(base):
+            # chiavi duplicate nello storico: tengo solo la prima apparizione, senza perdere l'ordine per data
+            ordine = np.sort(prime)
+            base = base.seleziona(ordine)
+            base.ordinato_per_data = True
+            chiavi_uniche, prime = np.unique(chiavi[ordine], return_index=True)
+        self.storico = archivio_storico
+        self.base = base
+        self.chiavi_storico = chiavi_uniche
+        self.righe_storico = prime
+        self.codici_tipo = {nome: i for i, nome in enumerate(base.categorie["tipo"])}
+        self.manuali = {}
+        self.posizioni = {}
+        self.unito = None
+
+    def chiave_numerica(self, giorni, codici_tipo, n_tipi):
+        ''' Chiave numerica equivalente a chiave_record: giorno e codice del tipo. '''
+        return giorni.astype(np.int64) * (n_tipi + 1) + (np.asarray(codici_tipo, dtype=np.int64) + 1)
+
+    def posizione(self, record):
+        ''' Cerca la chiave del record nello storico (ricerca binaria): restituisce (riga sostituita, None) se la chiave esiste, altrimenti (None, punto di inserimento per data). '''
+        giorno = np.datetime64(record.get("data"), "D")
+        codice = self.codici_tipo.get(record.get("tipo"))
+        if codice is not None and not np.isnat(giorno):
+            chiave = self.chiave_numerica(np.array([giorno]), [codice], len(self.codici_tipo))[0]
+            indice = np.searchsorted(self.chiavi_storico, chiave)
+            if indice < len(self.chiavi_storico) and self.chiavi_storico[indice] == chiave:
+                return int(self.righe_storico[indice]), None
+        # chiave nuova: va dopo tutti i record storici dello stesso giorno, come dopo l'ordinamento stabile per data
+        return None, int(np.searchsorted(self.base.colonna("data"), giorno, side="right"))
+
+    def aggiorna_manuali(self, record_manuali):
+        ''' Allinea la sovrapposizione ai record manuali, toccando solo le chiavi aggiunte, modificate o rimosse; restituisce True se qualcosa è cambiato. '''
+        nuovi = {self.elaboratore_dati.chiave_record(r): r for r in record_manuali}
+        cambiato = list(nuovi) != list(self.manuali)
+        for chiave, record in nuovi.items():
+            if chiave not in self.posizioni:
+                self.posizioni[chiave] = self.posizione(record)
+            if self.manuali.get(chiave) is not record and self.manuali.get(chiave) != record:
+                cambiato = True
+        for chiave in self.manuali.keys() - nuovi.keys():
+            del self.posizioni[chiave]
+        self.manuali = nuovi
+        return cambiato
+
+    def unisci(self, archivio_storico, record_manuali):
+        ''' Restituisce l'unione (UnioneStoricoManuali, ordinata per data), ricreata solo se lo storico o la sovrapposizione sono cambiati; il costo dipende dai record manuali, non dallo storico. '''
+        with self.lock:
+            if archivio_storico is not self.storico:
+                self.indicizza(archivio_storico)
+            if self.aggiorna_manuali(record_manuali) or self.unito is None:
+                posizioni = [self.posizioni[chiave] for chiave in self.manuali]
+                sostituite = np.array([MANCANTE if riga is None else riga for riga, _ in posizioni], dtype=np.int64)
+                inserimenti = np.array([MANCANTE if inserimento is None else inserimento for _, inserimento in posizioni], dtype=np.int64)
+                self.unito = UnioneStoricoManuali(self.base, ArchivioColonnare.da_record(list(self.manuali.values())), sostituite, inserimenti)
+                self.ricostruzioni += 1
+            return self.unito
+
+
+class UnioneStoricoManuali:
+    ''' Unione in sola lettura tra storico e record manuali, ordinata per data: lo storico non viene copiato e le righe vengono composte solo per l'intervallo di date richiesto. '''
+    # Intervalli di date già composti conservati per ogni unione (i rerun chiedono quasi sempre gli stessi)
+    MAX_INTERVALLI = 8
+
+    def __init__(self, base, manuali, sostituite, inserimenti):
+        self.base = base
+        self.manuali = manuali
+        # per ogni record manuale: riga storica sostituita (o MANCANTE) e punto di inserimento delle chiavi nuove (o MANCANTE)
+        self.sostituite = sostituite
+        self.inserimenti = inserimenti
+        self.lunghezza = len(base) + int(np.count_nonzero(sostituite == MANCANTE))
+        self.ordinato_per_data = True
+        self.intervalli = OrderedDict()
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return self.lunghezza
+
+    def __iter__(self):
+        ''' Itera sui record uniti come dizionari, per compatibilità con il codice che lavora su liste di record. '''
+        return iter(self.archivio())
+
+    def archivio(self):
+        ''' Restituisce l'unione completa come ArchivioColonnare (copia tutto lo storico: da usare solo quando serve davvero). '''
+        return self.componi(0, len(self.base), np.ones(len(self.manuali), dtype=bool))
+
+    def intervallo_date(self, data_inizio, data_fine):
+        ''' Restituisce i record uniti con data in [data_inizio, data_fine]; senza record manuali nell'intervallo è uno slice dello storico, senza copie. '''
+        chiave = (data_inizio, data_fine)
+        with self.lock:
+            if chiave in self.intervalli:
+                self.intervalli.move_to_end(chiave)
+                return self.intervalli[chiave]
+        giorno_inizio = np.datetime64(data_inizio, "D")
+        giorno_fine = np.datetime64(data_fine, "D")
+        date_storiche = self.base.colonna("data")
+        inizio = int(np.searchsorted(date_storiche, giorno_inizio, side="left"))
+        fine = int(np.searchsorted(date_storiche, giorno_fine, side="right"))
+        date_manuali = self.manuali.colonna("data")
+        nell_intervallo = (date_manuali >= giorno_inizio) & (date_manuali <= giorno_fine)
+        risultato = self.componi(inizio, fine, nell_intervallo)
+        with self.lock:
+            self.intervalli[chiave] = risultato
+            while len(self.intervalli) > self.MAX_INTERVALLI:
+                self.intervalli.popitem(last=False)
+        return risultato
+
+    def componi(self, inizio, fine, selezionati):
+        ''' Compone le righe storiche [inizio, fine) con i record manuali selezionati: chi ha una chiave storica ne prende il posto, le chiavi nuove vengono inserite nella posizione della loro data. '''
+        parte_storica = self.base.seleziona(slice(inizio, fine))
+        indici = np.flatnonzero(selezionati)
+        if not len(indici):
+            parte_storica.ordinato_per_data = True
+            return parte_storica
+        n_storici = fine - inizio
+        unito = ArchivioColonnare.concatena([parte_storica, self.manuali.seleziona(indici)])
+        righe_manuali = n_storici + np.arange(len(indici))
+        ordine = np.arange(n_storici)
+        sostituite = self.sostituite[indici]
+        da_sostituire = sostituite != MANCANTE
+        ordine[sostituite[da_sostituire] - inizio] = righe_manuali[da_sostituire]
+        nuove_righe = righe_manuali[~da_sostituire]
+        inserimenti = self.inserimenti[indici][~da_sostituire] - inizio
+        # le chiavi nuove con lo stesso punto di inserimento (es. dopo l'ultimo giorno storico) vanno in ordine di data; a parità di data resta l'ordine dei record manuali
+        ordine_nuove = np.lexsort((unito.colonna("data")[nuove_righe], inserimenti))
+        ordine = np.insert(ordine, inserimenti[ordine_nuove], nuove_righe[ordine_nuove])
+        archivio = unito.seleziona(ordine)
+        archivio.ordinato_per_data = True
+        return archivio
+
+
+class VistaRollup:
+    ''' Rollup persistenti dei dati uniti: lo storico viene riassunto una sola volta ed esteso solo con i giorni aggiunti in coda; i record manuali sono un piccolo rollup di sovrapposizione (più i record manuali, meno le righe storiche che sostituiscono), ricalcolato solo quando cambia l'unione. '''
+    def __init__(self, elaboratore_dati):
+        self.elaboratore_dati = elaboratore_dati
+        self.lock = threading.Lock()
+        # storico già riassunto e suo rollup
+        self.base = None
+        self.rollup_base = None
+        # ultimi dati richiesti e rollup corrispondente
+        self.dati = None
+        self.rollup = None
+        self.costruzioni = 0
+        self.estensioni = 0
+
+    def riassumi(self, archivio, tipi=None, zone=None, segno=1):
+        ''' Prepara i record dell'archivio e ne costruisce il rollup, con le categorie indicate. '''
+        preparati = self.elaboratore_dati.prepara_dati_storici(archivio)
+        return RollupCampioni.da_archivio(preparati, self.elaboratore_dati.valori_aggregazione(preparati), tipi, zone, segno)
+
+    def stesso_prefisso(self, base, n):
+        ''' Verifica che le prime n righe di base coincidano con lo storico già riassunto (stessi valori e stesse categorie), cioè che i giorni nuovi siano stati solo aggiunti in coda. '''
+        for campo, nomi in self.base.categorie.items():
+            if base.categorie.get(campo, [])[:len(nomi)] != list(nomi):
+                return False
+        for campo, colonna in self.base.colonne.items():
+            nuova = base.colonna(campo)
+            if nuova is None or len(nuova) < n:
+                return False
+            if not np.array_equal(nuova[:n], colonna, equal_nan=colonna.dtype.kind == "f"):
+                return False
+        return True
+
+    def aggiorna_base(self, base):
+        ''' Allinea il rollup dello storico: se base estende lo storico già riassunto riassume solo le righe nuove, altrimenti lo ricostruisce. '''
+        if base is self.base:
+            return
+        n = len(self.base) if self.base is not None else 0
+        if 0 < n < len(base) and self.stesso_prefisso(base, n):
+            coda = self.riassumi(base.seleziona(slice(n, len(base))), self.rollup_base.tipi, self.rollup_base.zone)
+            self.rollup_base = self.rollup_base.unisci(coda)
+            self.estensioni += 1
+        else:
+            self.rollup_base = self.riassumi(base)
+            self.costruzioni += 1
+        self.base = base
+
+    def rollup_dati(self, dati):
+        ''' Restituisce il rollup dei dati uniti (UnioneStoricoManuali o ArchivioColonnare), aggiornando solo ciò che è cambiato; solleva TypeError se i dati sono in un altro formato. '''
+        with self.lock:
+            if dati is self.dati:
+                return self.rollup
+            if isinstance(dati, UnioneStoricoManuali):
+                self.aggiorna_base(dati.base)
+                sostituite = dati.sostituite[dati.sostituite != MANCANTE]
+                # sovrapposizione: meno le righe storiche sostituite, più i record manuali (categorie estese in coda a quelle dello storico)
+                sottrazione = self.riassumi(dati.base.seleziona(sostituite), self.rollup_base.tipi, self.rollup_base.zone, segno=-1)
+                aggiunta = self.riassumi(dati.manuali, sottrazione.tipi, sottrazione.zone)
+                rollup = RollupUnione(self.rollup_base, sottrazione.unisci(aggiunta))
+            elif isinstance(dati, ArchivioColonnare):
+                self.aggiorna_base(dati)
+                rollup = self.rollup_base
+            else:
+                raise TypeError(f"Formato dei dati non supportato per i rollup: {type(dati).__name__}")
+            self.dati = dati
+            self.rollup = rollup
+            return rollup
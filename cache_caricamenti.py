@@ -0,0 +1,66 @@
+# Fi.Co? S.Vi.To.! A Fishing Company Simulation and Visualization Tool - Ver. 1.0"- cache_caricamenti.py
+
+import os
+import threading
+
+class CacheCaricamenti:
+    ''' Cache di processo dei file di dati già caricati, condivisa in sola lettura da tutte le sessioni e i rerun di Streamlit. '''
+    def __init__(self):
+        self.voci = {}
+        self.lock = threading.Lock()
+        self.lock_file = {}
+        self.hit = 0
+        self.miss = 0
+        self.invalidazioni = 0
+
+    def firma(self, percorso):
+        ''' Restituisce la firma del file (data di modifica in ns e dimensione), oppure None se il file non esiste. '''
+        try:
+            stato = os.stat(percorso)
+        except FileNotFoundError:
+            return None
+        return (stato.st_mtime_ns, stato.st_size)
+
+    def carica(self, percorso, lettore):
+        ''' Restituisce il contenuto del file letto con lettore(percorso), rileggendolo solo se la firma del file è cambiata; il valore è condiviso e va trattato in sola lettura. '''
+        chiave = os.path.abspath(percorso)
+        firma = self.firma(percorso)
+        with self.lock:
+            voce = self.voci.get(chiave)
+            if voce is not None and voce[0] == firma:
+                self.hit += 1
+                return voce[1]
+            lock_file = self.lock_file.setdefault(chiave, threading.Lock())
+        # leggo sotto il lock del file: sessioni concorrenti aspettano la stessa lettura invece di ripeterla, senza bloccare gli altri file
+        with lock_file:
+            with self.lock:
+                voce = self.voci.get(chiave)
+                if voce is not None and voce[0] == firma:
+                    self.hit += 1
+                    return voce[1]
+                self.miss += 1
+                invalidazioni = self.invalidazioni
+            valore = lettore(percorso)
+            with self.lock:
+                # un'invalidazione arrivata durante la lettura rende il valore sospetto: lo restituisco senza conservarlo
+                if self.invalidazioni == invalidazioni:
+                    self.voci[chiave] = (firma, valore)
+            return valore
+
+    def invalida(self, percorso=None):
+        ''' Elimina dalla cache un file (da chiamare dopo averlo riscritto) oppure, senza argomenti, tutti i file. '''
+        with self.lock:
+            if percorso is None:
+                self.voci.clear()
+            else:
+                self.voci.pop(os.path.abspath(percorso), None)
+            self.invalidazioni += 1
+
+    def statistiche(self):
+        ''' Restituisce i contatori della cache: hit, miss, invalidazioni e file presenti. '''
+        with self.lock:
+            return {"hit": self.hit, "miss": self.miss, "invalidazioni": self.invalidazioni, "file": len(self.voci)}
+
+
+# Istanza unica per processo, condivisa da GestoreDati e GeneratoreDatiStorici
+cache_caricamenti = CacheCaricamenti()
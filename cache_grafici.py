@@ -0,0 +1,79 @@
+# Fi.Co? S.Vi.To.! A Fishing Company Simulation and Visualization Tool - Ver. 1.0"- cache_grafici.py
+
+import io
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+import matplotlib.pyplot as plt
+
+class CacheGrafici:
+    ''' Cache di processo delle immagini dei grafici (PNG o SVG), indicizzate sull'impronta dei dati aggregati da cui sono disegnate: a parità di dati l'immagine non viene ridisegnata. Le voci meno usate di recente vengono scartate oltre max_byte. '''
+    # Opzioni di salvataggio, le stesse usate da st.pyplot
+    OPZIONI_SALVATAGGIO = {"bbox_inches": "tight", "dpi": 200}
+
+    def __init__(self, max_byte=64 * 1024 * 1024):
+        self.max_byte = max_byte
+        self.voci = OrderedDict()
+        self.byte = 0
+        self.lock = threading.Lock()
+        # pyplot ha uno stato globale: disegno una figura alla volta, senza bloccare chi legge la cache
+        self.lock_disegno = threading.Lock()
+        self.hit = 0
+        self.miss = 0
+        self.scartate = 0
+
+    def impronta(self, nome, dati, formato):
+        ''' Calcola la chiave di un grafico: nome, formato e dati aggregati (serializzati in JSON con le chiavi ordinate). '''
+        testo = json.dumps([nome, formato, dati], sort_keys=True, default=str)
+        return hashlib.sha256(testo.encode("utf-8")).hexdigest()
+
+    def immagine(self, nome, dati, disegna, formato="png"):
+        ''' Restituisce i byte dell'immagine del grafico: dalla cache se i dati non sono cambiati, altrimenti chiamando disegna(dati), che deve restituire una figura matplotlib (chiusa subito dopo il salvataggio). '''
+        chiave = self.impronta(nome, dati, formato)
+        with self.lock:
+            if chiave in self.voci:
+                self.voci.move_to_end(chiave)
+                self.hit += 1
+                return self.voci[chiave]
+            self.miss += 1
+        with self.lock_disegno:
+            # un'altra sessione potrebbe aver appena disegnato lo stesso grafico
+            with self.lock:
+                if chiave in self.voci:
+                    return self.voci[chiave]
+            immagine = self.salva_figura(disegna(dati), formato)
+        with self.lock:
+            self.voci[chiave] = immagine
+            self.byte += len(immagine)
+            while self.byte > self.max_byte and len(self.voci) > 1:
+                _, scartata = self.voci.popitem(last=False)
+                self.byte -= len(scartata)
+                self.scartate += 1
+        return immagine
+
+    def salva_figura(self, fig, formato="png"):
+        ''' Salva la figura nel formato indicato e la chiude, così pyplot non la trattiene in memoria; l'SVG viene restituito come testo. '''
+        buffer = io.BytesIO()
+        try:
+            fig.savefig(buffer, format=formato, **self.OPZIONI_SALVATAGGIO)
+        finally:
+            plt.close(fig)
+        if formato == "svg":
+            return buffer.getvalue().decode("utf-8")
+        return buffer.getvalue()
+
+    def svuota(self):
+        ''' Elimina tutte le immagini dalla cache. '''
+        with self.lock:
+            self.voci.clear()
+            self.byte = 0
+
+    def statistiche(self):
+        ''' Restituisce i contatori della cache: hit, miss, immagini scartate, immagini e byte presenti. '''
+        with self.lock:
+            return {"hit": self.hit, "miss": self.miss, "scartate": self.scartate, "immagini": len(self.voci), "byte": self.byte}
+
+
+# Istanza unica per processo, condivisa da tutte le sessioni
+cache_grafici = CacheGrafici()
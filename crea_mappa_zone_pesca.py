@@ -1,38 +1,179 @@
 # Fi.Co? S.Vi.To.! A Fishing Company Simulation and Visualization Tool - Ver. 1.0"- crea_mappa_zone_pesca.py
 
-import fiona
-import geopandas as gpd
-from shapely.geometry import Polygon, Point
+import os
+import json
+import hashlib
+import threading
+import numpy as np
+import shapely
+from shapely.geometry import Polygon, Point, mapping, shape
 import folium
+from archivio_colonnare import ArchivioColonnare, MANCANTE
+
+# Zone della mappa e modelli HTML, calcolati una volta per processo (per file GeoPackage) e condivisi da tutte le sessioni
+cache_zone = {}
+cache_modelli = {}
+cache_indici = {}
+lock_mappa = threading.Lock()
+# Segnaposto del modello HTML, sostituiti a ogni rerun con il colore e il conteggio di ogni zona
+SEGNAPOSTO_COLORE = "__COLORE_ZONA_{}__"
+SEGNAPOSTO_CONTEGGIO = "__CONTEGGIO_ZONA_{}__"
+SEGNAPOSTO_NETTO = "__NETTO_ZONA_{}__"
+# Colore fisso quando tutte le zone hanno lo stesso conteggio
+COLORE_UNIFORME = "#0E1117"
+# Scale dei colori della mappa: lineare sui conteggi, per quantili (classi con lo stesso numero di zone) o logaritmica, per conteggi molto sbilanciati
+SCALE_COLORI = ("lineare", "quantili", "log")
+
+class IndiceZone:
+    ''' Indice spaziale a griglia delle zone di pesca: le celle interne a una sola zona vengono assegnate direttamente, solo i punti nelle celle di confine vengono verificati sui poligoni candidati. '''
+    # Celle della griglia: interne a una zona (codice >= 0), fuori da tutte le zone (MANCANTE) o di confine (DA_VERIFICARE)
+    DA_VERIFICARE = -2
+
+    def __init__(self, nomi, geometrie, passo=0.25):
+        self.nomi = list(nomi)
+        self.geometrie = list(geometrie)
+        for geometria in self.geometrie:
+            shapely.prepare(geometria)
+        self.passo = passo
+        limiti = np.array([g.bounds for g in self.geometrie])
+        self.minx, self.miny = limiti[:, 0].min(), limiti[:, 1].min()
+        self.maxx, self.maxy = limiti[:, 2].max(), limiti[:, 3].max()
+        self.nx = max(int(np.ceil((self.maxx - self.minx) / passo)), 1)
+        self.ny = max(int(np.ceil((self.maxy - self.miny) / passo)), 1)
+        # celle come rettangoli, riga per riga
+        ix, iy = np.meshgrid(np.arange(self.nx), np.arange(self.ny))
+        x0 = self.minx + ix.ravel() * passo
+        y0 = self.miny + iy.ravel() * passo
+        celle = shapely.box(x0, y0, x0 + passo, y0 + passo)
+        # per ogni zona: celle che tocca e celle che contiene per intero
+        tocca = np.array([shapely.intersects(g, celle) for g in self.geometrie])
+        contiene = np.array([shapely.contains(g, celle) for g in self.geometrie])
+        n_zone_cella = tocca.sum(axis=0)
+        self.celle = np.full(len(celle), self.DA_VERIFICARE, dtype=np.int16)
+        self.celle[n_zone_cella == 0] = MANCANTE
+        # una cella è risolta solo se è dentro una zona e non tocca nessun'altra zona (nemmeno sul bordo)
+        interna = (n_zone_cella == 1) & contiene.any(axis=0)
+        self.celle[interna] = np.argmax(contiene[:, interna], axis=0)
+        # per le celle di confine, le zone candidate
+        self.candidate = tocca & (self.celle == self.DA_VERIFICARE)
+
+    def assegna(self, lat, lon):
+        ''' Restituisce per ogni punto il codice della zona (indice in nomi) che lo contiene, bordo compreso, oppure MANCANTE; a parità vince la prima zona. '''
+        lat = np.asarray(lat, dtype=np.float64)
+        lon = np.asarray(lon, dtype=np.float64)
+        codici = np.full(lat.shape, MANCANTE, dtype=np.int16)
+        ix = np.floor((lon - self.minx) / self.passo)
+        iy = np.floor((lat - self.miny) / self.passo)
+        # i punti esattamente sul bordo massimo delle zone appartengono all'ultima cella
+        ix = np.where((ix == self.nx) & (lon <= self.maxx), self.nx - 1, ix)
+        iy = np.where((iy == self.ny) & (lat <= self.maxy), self.ny - 1, iy)
+        dentro = (ix >= 0) & (ix < self.nx) & (iy >= 0) & (iy < self.ny)
+        indici = np.flatnonzero(dentro)
+        cella = iy[indici].astype(np.int64) * self.nx + ix[indici].astype(np.int64)
+        codici[indici] = self.celle[cella]
+        confine = codici[indici] == self.DA_VERIFICARE
+        indici, cella = indici[confine], cella[confine]
+        codici[indici] = MANCANTE
+        for codice, geometria in enumerate(self.geometrie):
+            # solo i punti ancora senza zona che cadono in celle dove la zona è candidata
+            da_provare = self.candidate[codice, cella] & (codici[indici] == MANCANTE)
+            punti = indici[da_provare]
+            if len(punti):
+                codici[punti[shapely.intersects_xy(geometria, lon[punti], lat[punti])]] = codice
+        return codici
+
 
 class GestoreMappa:
     ''' Classe per la gestione della mappa delle zone di pesca. '''
-    def __init__(self, percorso_gpkg):
+    def __init__(self, percorso_gpkg, tolleranza=0.01, percorso_cache=None):
         self.percorso_gpkg = percorso_gpkg
+        # tolleranza (gradi) per semplificare i confini EEZ salvati nella cache locale
+        self.tolleranza = tolleranza
+        self.percorso_cache = percorso_cache or os.path.splitext(percorso_gpkg)[0] + "_ita.geojson"
 
     def carica_eez_ita(self, nome_livello=None):
-        ''' Carica i confini delle Zone Economiche Esclusive (EEZ) italiane da un file GeoPackage. '''
-        if nome_livello is None:
-            nome_livello = fiona.listlayers(self.percorso_gpkg)[0]
-        eez = gpd.read_file(self.percorso_gpkg, layer=nome_livello)
+        ''' Carica i confini delle Zone Economiche Esclusive (EEZ) italiane, semplificati: dalla cache locale se corrisponde al file GeoPackage, altrimenti estraendoli dal GeoPackage e aggiornando la cache. Restituisce una lista di dizionari con le proprietà e la "geometria" (shapely). '''
+        cache = self.leggi_cache_eez(nome_livello)
+        if cache is None:
+            cache = self.crea_cache_eez(nome_livello)
+        return [dict(f["properties"], geometria=shape(f["geometry"])) for f in cache["features"] if f["geometry"]]
+
+    def checksum_gpkg(self):
+        ''' Calcola lo SHA-256 del file GeoPackage, leggendolo a blocchi. '''
+        impronta = hashlib.sha256()
+        with open(self.percorso_gpkg, "rb") as f:
+            for blocco in iter(lambda: f.read(1 << 20), b""):
+                impronta.update(blocco)
+        return impronta.hexdigest()
+
+    def leggi_cache_eez(self, nome_livello=None):
+        ''' Legge la cache delle EEZ italiane; restituisce None se manca o non corrisponde più al GeoPackage (checksum), alla tolleranza o al livello richiesti. '''
+        if not os.path.exists(self.percorso_cache):
+            return None
+        with open(self.percorso_cache, "r") as f:
+            cache = json.load(f)
+        origine = cache.get("origine", {})
+        if origine.get("tolleranza") != self.tolleranza or origine.get("livello") != nome_livello:
+            return None
+        # Senza il GeoPackage la cache basta da sola
+        if not os.path.exists(self.percorso_gpkg):
+            return cache
+        stato = os.stat(self.percorso_gpkg)
+        # Se dimensione e data di modifica non sono cambiate evito di rileggere tutto il file per il checksum
+        if (origine.get("dimensione"), origine.get("modifica_ns")) == (stato.st_size, stato.st_mtime_ns):
+            return cache
+        if origine.get("sha256") != self.checksum_gpkg():
+            return None
+        origine["dimensione"], origine["modifica_ns"] = stato.st_size, stato.st_mtime_ns
+        self.scrivi_cache_eez(cache)
+        return cache
+
+    def crea_cache_eez(self, nome_livello=None):
+        ''' Estrae le EEZ italiane dal GeoPackage, le semplifica e le salva nella cache locale; solo qui servono fiona e geopandas. '''
+        import fiona
+        import geopandas as gpd
+        livello = nome_livello if nome_livello is not None else fiona.listlayers(self.percorso_gpkg)[0]
+        eez = gpd.read_file(self.percorso_gpkg, layer=livello)
         eez_italiane = eez[
             eez["EEZ1"].str.contains("Italian", na=False) |
             eez["EEZ2"].str.contains("Italian", na=False)
         ]
-        return eez_italiane
+        eez_italiane = eez_italiane.set_geometry(eez_italiane.geometry.simplify(self.tolleranza, preserve_topology=True))
+        cache = json.loads(eez_italiane.to_json())
+        stato = os.stat(self.percorso_gpkg)
+        cache["origine"] = {
+            "sha256": self.checksum_gpkg(),
+            "dimensione": stato.st_size,
+            "modifica_ns": stato.st_mtime_ns,
+            "tolleranza": self.tolleranza,
+            "livello": nome_livello
+        }
+        self.scrivi_cache_eez(cache)
+        return cache
 
-    # 
-    def suddividi_eez_ita(self, eez_italiane):
-        ''' Suddivide le EEZ sudddivido i mari italiani e creo dei poligoni semplificati che vanno in overlay sulla mappa delle terre; faccio la differenza con le terre emerse (non funziona, da rivedere). '''
-        zone = [
+    def scrivi_cache_eez(self, cache):
+        ''' Salva la cache delle EEZ italiane in modo atomico. '''
+        temporaneo = self.percorso_cache + ".tmp"
+        with open(temporaneo, "w") as f:
+            json.dump(cache, f)
+        os.replace(temporaneo, self.percorso_cache)
+
+    def zone_eez_ita(self, eez_italiane):
+        ''' Restituisce le zone di pesca come lista di dizionari con "nome_zona" e "geometria" (poligoni semplificati dei mari italiani). '''
+        return [
             {"nome_zona": "Adriatico", "geometria": Polygon([(12, 46.5), (19, 46.5), (19, 40), (12, 40)])},
             {"nome_zona": "Tirreno", "geometria": Polygon([(8, 44), (12, 44), (12, 37), (8, 37)])},
             {"nome_zona": "Ionio", "geometria": Polygon([(12, 40), (20, 40), (20, 34), (12, 34)])},
             {"nome_zona": "Mediterraneo Occidentale", "geometria": Polygon([(0, 46.5), (12, 46.5), (12, 44), (8, 44), (8, 37), (12, 37), (12, 34), (0, 34)])},
             {"nome_zona": "Mediterraneo Centrale", "geometria": Polygon([(19, 46.5), (30, 46.5), (30, 34), (20, 34), (20, 40), (19, 40)])}
         ]
+
+    # 
+    def suddividi_eez_ita(self, eez_italiane):
+        ''' Suddivide le EEZ sudddivido i mari italiani e creo dei poligoni semplificati che vanno in overlay sulla mappa delle terre; faccio la differenza con le terre emerse (non funziona, da rivedere). '''
+        import geopandas as gpd
         # Creo un GeoDataFrame dalla lista delle zone
-        gdf = gpd.GeoDataFrame(zone, geometry="geometria", crs="EPSG:4326")
+        gdf = gpd.GeoDataFrame(self.zone_eez_ita(eez_italiane), geometry="geometria", crs="EPSG:4326")
         return gdf
     
     def trova_punti_etichette(self, geom, posizione):
@@ -54,51 +195,75 @@ class GestoreMappa:
         else:
             return geom.representative_point()
 
-    def crea_mappa_custom(self, gdf, conti_zone, schema_colori=["blue", "red"]):
-        ''' Creo una mappa personalizzata con Folium, mostrando le zone e il numero di campioni per zona; per mediterraneo centrale ed occidentale, ho previsto degli spostamenti dell'etichetta per renderal ben visibile. '''
-        
-        # Verifico che il GeoDataFrame non sia vuoto
-        if gdf is None or gdf.empty:
-            print("Attenzione: GeoDataFrame è di tipo None o vuoto. Restituisco un mappa di default.")
-            m = folium.Map(
-                location=[40.5, 13.5],
-                zoom_start=5,
-                tiles="CartoDB.DarkMatter",
-                max_bounds=False,
-                min_zoom=5,
-                max_zoom=5,
-                zoom_control=False,
-                dragging=False
-            )
-            return m
+    def posizione_etichetta(self, nome_zona, geometria):
+        ''' Calcola il punto in cui posizionare l'etichetta di una zona e l'ancoraggio CSS appropriato; spostamento maggiore per i due mediterranei. '''
+        if nome_zona == "Mediterraneo Occidentale":
+            return self.trova_punti_etichette(geometria, "bottom_right"), "translate(-800%, -100%)"
+        elif nome_zona == "Mediterraneo Centrale":
+            return self.trova_punti_etichette(geometria, "top_left"), "translate(+100%, +20%)"
+        return geometria.representative_point(), "translate(-50%, -50%)"
 
-        # Verifico che la colonna zone_name esista veramente
-        if 'nome_zona' not in gdf.columns:
-            print("Errore: non è possibile trovare la colonna'nome_zona' nel GeoDataFrame.")
-            return folium.Map(
-                location=[40.5, 13.5],
-                zoom_start=5,
-                tiles="CartoDB.DarkMatter",
-                max_bounds=False,
-                min_zoom=5,
-                max_zoom=5,
-                zoom_control=False,
-                dragging=False
-            )
+    def calcola_zone_mappa(self, zone_pesca):
+        ''' Prepara per ogni zona (dizionari con "nome_zona" e "geometria") tutto ciò che non dipende dai conteggi: GeoJSON del poligono, punto dell'etichetta e ancoraggio CSS; restituisce anche i limiti della mappa. '''
+        zone = []
+        for zona_pesca in zone_pesca:
+            nome_zona, geometria = zona_pesca["nome_zona"], zona_pesca["geometria"]
+            punto, trasformazione = self.posizione_etichetta(nome_zona, geometria)
+            zone.append({
+                "nome_zona": nome_zona,
+                "geojson": mapping(geometria),
+                "etichetta": [punto.y, punto.x],
+                "trasformazione": trasformazione
+            })
+        limiti = [z["geometria"].bounds for z in zone_pesca]
+        minx, miny = min(l[0] for l in limiti), min(l[1] for l in limiti)
+        maxx, maxy = max(l[2] for l in limiti), max(l[3] for l in limiti)
+        return {"zone": zone, "limiti": [[miny, minx], [maxy, maxx]]}
 
-        # Verifico che zone counts non sia None ne un dizionario
-        if conti_zone is None or not isinstance(conti_zone, dict):
-            print("Errore: conti_zone è di tipo None o non è un dizionario.")
-            conti_zone = {}
+    def indice_zone(self):
+        ''' Restituisce l'indice spaziale delle zone di pesca, costruito una sola volta per processo. '''
+        with lock_mappa:
+            if self.percorso_gpkg not in cache_indici:
+                zone_pesca = self.zone_eez_ita(self.carica_eez_ita())
+                cache_indici[self.percorso_gpkg] = IndiceZone([z["nome_zona"] for z in zone_pesca], [z["geometria"] for z in zone_pesca])
+            return cache_indici[self.percorso_gpkg]
 
-        # Create SampleCount column, handling missing zone
-        gdf["ConteggioCampioni"] = gdf["nome_zona"].map(lambda x: conti_zone.get(x, 0))
-        
-        # Calcola il minimo e il massimo dei conteggi
-        min_count = gdf["ConteggioCampioni"].min() if len(gdf) > 0 else 0
-        max_count = gdf["ConteggioCampioni"].max() if len(gdf) > 0 else 0
+    def assegna_zone(self, lat, lon):
+        ''' Assegna in blocco una zona di pesca a ogni coppia di coordinate; restituisce i nomi delle zone e i codici (MANCANTE fuori da tutte le zone). '''
+        indice = self.indice_zone()
+        return indice.nomi, indice.assegna(lat, lon)
 
-        m = folium.Map(
+    def zona_da_coordinate(self, lat, lon):
+        ''' Restituisce la zona di pesca che contiene il punto, oppure None. '''
+        nomi, codici = self.assegna_zone([lat], [lon])
+        return nomi[codici[0]] if codici[0] != MANCANTE else None
+
+    def assegna_zone_archivio(self, archivio):
+        ''' Restituisce l'archivio con la zona dei campioni che hanno coordinate (lat/lon) ricalcolata sui poligoni delle zone; gli altri campioni, e quelli fuori da tutte le zone, mantengono la zona indicata. '''
+        if archivio.colonna("lat") is None or archivio.colonna("lon") is None:
+            return archivio
+        nomi, codici = self.assegna_zone(archivio.colonna("lat"), archivio.colonna("lon"))
+        # rimappo i codici dell'indice sulle categorie di zona dell'archivio, aggiungendo quelle mancanti
+        categorie_zona = list(archivio.categorie.get("zona", []))
+        categorie_zona += [nome for nome in nomi if nome not in categorie_zona]
+        rimappa = np.array([categorie_zona.index(nome) for nome in nomi] + [MANCANTE], dtype=np.int16)
+        zona = archivio.colonna("zona")
+        zona = np.full(len(archivio), MANCANTE, dtype=np.int16) if zona is None else zona
+        zona = np.where(codici != MANCANTE, rimappa[codici], zona).astype(np.int16)
+        risultato = archivio.con_colonne(zona=zona)
+        risultato.categorie = dict(archivio.categorie, zona=categorie_zona)
+        return risultato
+
+    def zone_mappa(self):
+        ''' Restituisce le zone della mappa (da suddividi_eez_ita), calcolate una sola volta per processo e condivise da tutte le sessioni. '''
+        with lock_mappa:
+            if self.percorso_gpkg not in cache_zone:
+                cache_zone[self.percorso_gpkg] = self.calcola_zone_mappa(self.zone_eez_ita(self.carica_eez_ita()))
+            return cache_zone[self.percorso_gpkg]
+
+    def mappa_vuota(self):
+        ''' Crea la mappa di base, senza zone. '''
+        return folium.Map(
             location=[40.5, 13.5],
             zoom_start=5,
             tiles="CartoDB.DarkMatter",
@@ -108,63 +273,162 @@ class GestoreMappa:
             zoom_control=False,
             dragging=False
         )
-        if not gdf.empty:
-            bounds = gdf.total_bounds
-            m.fit_bounds([[bounds[1], bounds[0]], [bounds[3], bounds[2]]])
-
-        for _, row in gdf.iterrows():
-            count = row["ConteggioCampioni"]
-            # Gestione del caso in cui tutti i conteggi siano uguali
-            if max_count == min_count:
-                color = "#0E1117"  # Colore fisso se tutti i conteggi sono uguali
+
+    def colori_zone(self, conteggi, schema_colori, scala="lineare", classi=5):
+        ''' Calcola il colore di ogni zona dal suo conteggio, con un'unica scala di colori tra il minimo e il massimo: lineare, per quantili (in "classi" classi) o logaritmica. '''
+        min_count = min(conteggi, default=0)
+        max_count = max(conteggi, default=0)
+        # Gestione del caso in cui tutti i conteggi siano uguali: colore fisso
+        if max_count == min_count:
+            return [COLORE_UNIFORME for _ in conteggi]
+        if scala == "lineare":
+            colormap = folium.LinearColormap(schema_colori, vmin=min_count, vmax=max_count)
+            return [colormap(count) for count in conteggi]
+        valori = np.asarray(conteggi, dtype=np.float64)
+        if scala == "quantili":
+            # classe di ogni zona tra i quantili dei conteggi, riportata tra 0 e 1
+            soglie = np.quantile(valori, np.linspace(0, 1, classi + 1)[1:-1])
+            posizione = np.searchsorted(soglie, valori, side="right") / (classi - 1)
+        elif scala == "log":
+            posizione = (np.log1p(valori) - np.log1p(min_count)) / (np.log1p(max_count) - np.log1p(min_count))
+        else:
+            raise ValueError(f"Scala dei colori non valida: {scala} (attese: {', '.join(SCALE_COLORI)})")
+        colormap = folium.LinearColormap(schema_colori, vmin=0, vmax=1)
+        return [colormap(p) for p in posizione.tolist()]
+
+    def legenda_colori(self, conteggi, schema_colori, scala="lineare", classi=5):
+        ''' Descrive la legenda della scala usata da colori_zone: restituisce le tappe della barra dei colori [(posizione 0-1, colore)] e le etichette [(posizione 0-1, testo)]. Per i quantili la barra è a gradini, una classe per colore, con i limiti tra le classi; per la scala logaritmica le etichette intermedie sono i conteggi che cadono in quel punto della barra. '''
+        min_count = min(conteggi, default=0)
+        max_count = max(conteggi, default=0)
+        if max_count == min_count:
+            return {"tappe": [(0.0, COLORE_UNIFORME), (1.0, COLORE_UNIFORME)], "etichette": [(0.0, f"Min. {min_count}"), (1.0, f"Max. {max_count}")]}
+        # conteggi interi: decimali solo se l'intervallo è troppo stretto per distinguere le etichette
+        decimali = 0 if max_count - min_count >= 10 else 1
+        colormap = folium.LinearColormap(schema_colori, vmin=0, vmax=1)
+        if scala == "quantili":
+            soglie = np.quantile(np.asarray(conteggi, dtype=np.float64), np.linspace(0, 1, classi + 1)[1:-1])
+            tappe = []
+            for i in range(classi):
+                # stesso colore di colori_zone per la classe i, su un tratto della barra senza sfumature
+                colore = colormap(i / (classi - 1))
+                tappe += [(i / classi, colore), ((i + 1) / classi, colore)]
+            etichette = [(i / classi, f"{soglia:,.{decimali}f}") for i, soglia in enumerate(soglie.tolist(), 1)]
+        elif scala in ("lineare", "log"):
+            posizioni = np.linspace(0, 1, classi)
+            tappe = [(p, colormap(p)) for p in posizioni.tolist()]
+            if scala == "lineare":
+                valori = min_count + posizioni * (max_count - min_count)
             else:
-                # Crea la colormap con vmin e vmax basati sui valori minimi e massimi
-                colormap = folium.LinearColormap(schema_colori, vmin=min_count, vmax=max_count)
-                color = colormap(count)
-            zone_name = row["nome_zona"]
+                valori = np.expm1(np.log1p(min_count) + posizioni * (np.log1p(max_count) - np.log1p(min_count)))
+            etichette = [(p, f"{v:,.{decimali}f}") for p, v in zip(posizioni.tolist()[1:-1], valori.tolist()[1:-1])]
+        else:
+            raise ValueError(f"Scala dei colori non valida: {scala} (attese: {', '.join(SCALE_COLORI)})")
+        return {"tappe": tappe, "etichette": [(0.0, f"Min. {min_count}")] + etichette + [(1.0, f"Max. {max_count}")]}
 
+    def aggiungi_zone(self, m, zone_mappa, colori, conteggi, netti=None):
+        ''' Aggiunge alla mappa il poligono e l'etichetta di ogni zona, con il colore, il conteggio e (facoltativo) il netto in kg indicati (valori o segnaposto del modello). '''
+        m.fit_bounds(zone_mappa["limiti"])
+        netti = netti if netti is not None else [None] * len(conteggi)
+        for zona, color, count, netto in zip(zone_mappa["zone"], colori, conteggi, netti):
+            zone_name = zona["nome_zona"]
+            tooltip = f"{zone_name}: {count} campioni" if netto is None else f"{zone_name}: {count} campioni, {netto} kg netti"
             folium.GeoJson(
-                row["geometria"],
+                zona["geojson"],
                 style_function=lambda feature, c=color: {
                     "fillColor": c,
                     "color": "white",
                     "weight": 1,
                     "fillOpacity": 0.3,
                 },
-                tooltip=f"{zone_name}: {count} campioni"
+                tooltip=tooltip
             ).add_to(m)
 
-            # Calcola il punto in cui posizionare l'etichetta e determina l'ancoraggio CSS appropriato; spostamento maggiore per i due mediterranei
-            if zone_name == "Mediterraneo Occidentale":
-                label_point = self.trova_punti_etichette(row["geometria"], "bottom_right")
-                transform_str = "translate(-800%, -100%)"
-            elif zone_name == "Mediterraneo Centrale":
-                label_point = self.trova_punti_etichette(row["geometria"], "top_left")
-                transform_str = "translate(+100%, +20%)"
-            else:
-                label_point = row["geometria"].representative_point()
-                transform_str = "translate(-50%, -50%)"
-            
-            # Aggiunge un marker con un DivIcon che usa il transform_str determinato
+            # Aggiunge un marker con un DivIcon che usa l'ancoraggio CSS della zona
             folium.Marker(
-                location=[label_point.y, label_point.x],
+                location=zona["etichetta"],
                 icon=folium.DivIcon(
                     html=f'''
-                    <div style="text-align: center; color: white; font-weight: bold; font-size: 14px; transform: {transform_str};">
+                    <div style="text-align: center; color: white; font-weight: bold; font-size: 14px; transform: {zona["trasformazione"]};">
                         {zone_name}<br>{count}
                     </div>
                     '''
                 )
             ).add_to(m)
-
         return m
 
+    def crea_mappa_custom(self, gdf, conti_zone, schema_colori=["blue", "red"]):
+        ''' Creo una mappa personalizzata con Folium, mostrando le zone e il numero di campioni per zona; per mediterraneo centrale ed occidentale, ho previsto degli spostamenti dell'etichetta per renderal ben visibile. '''
+        
+        # Verifico che il GeoDataFrame non sia vuoto
+        if gdf is None or gdf.empty:
+            print("Attenzione: GeoDataFrame è di tipo None o vuoto. Restituisco un mappa di default.")
+            return self.mappa_vuota()
+
+        # Verifico che la colonna zone_name esista veramente
+        if 'nome_zona' not in gdf.columns:
+            print("Errore: non è possibile trovare la colonna'nome_zona' nel GeoDataFrame.")
+            return self.mappa_vuota()
+
+        # Verifico che zone counts non sia None ne un dizionario
+        if conti_zone is None or not isinstance(conti_zone, dict):
+            print("Errore: conti_zone è di tipo None o non è un dizionario.")
+            conti_zone = {}
+
+        zone_mappa = self.calcola_zone_mappa([{"nome_zona": n, "geometria": g} for n, g in zip(gdf["nome_zona"], gdf.geometry)])
+        # Conteggio per zona, gestendo le zone mancanti (senza modificare il GeoDataFrame)
+        conteggi = [conti_zone.get(zona["nome_zona"], 0) for zona in zone_mappa["zone"]]
+        return self.aggiungi_zone(self.mappa_vuota(), zone_mappa, self.colori_zone(conteggi, schema_colori), conteggi)
+
+    def modello_mappa(self):
+        ''' Restituisce l'HTML della mappa con le zone, renderizzato una sola volta per processo, con dei segnaposto al posto di colori e conteggi. '''
+        zone_mappa = self.zone_mappa()
+        with lock_mappa:
+            if self.percorso_gpkg not in cache_modelli:
+                if zone_mappa["zone"]:
+                    n_zone = len(zone_mappa["zone"])
+                    m = self.aggiungi_zone(
+                        self.mappa_vuota(), zone_mappa,
+                        [SEGNAPOSTO_COLORE.format(i) for i in range(n_zone)],
+                        [SEGNAPOSTO_CONTEGGIO.format(i) for i in range(n_zone)],
+                        [SEGNAPOSTO_NETTO.format(i) for i in range(n_zone)]
+                    )
+                else:
+                    m = self.mappa_vuota()
+                cache_modelli[self.percorso_gpkg] = folium.Figure().add_child(m).render()
+            return cache_modelli[self.percorso_gpkg]
+
+    def html_mappa(self, conti_zone, schema_colori=["blue", "red"], scala="lineare", netto_zone=None):
+        ''' Restituisce l'HTML della mappa sostituendo nel modello solo i conteggi, il netto (kg) e i colori delle zone. '''
+        zone = self.zone_mappa()["zone"]
+        netto_zone = netto_zone or {}
+        conteggi = [conti_zone.get(zona["nome_zona"], 0) for zona in zone]
+        netti = [netto_zone.get(zona["nome_zona"], 0) for zona in zone]
+        colori = self.colori_zone(conteggi, schema_colori, scala)
+        html = self.modello_mappa()
+        for i, (colore, conteggio, netto) in enumerate(zip(colori, conteggi, netti)):
+            html = (html.replace(SEGNAPOSTO_COLORE.format(i), colore)
+                        .replace(SEGNAPOSTO_CONTEGGIO.format(i), str(conteggio))
+                        .replace(SEGNAPOSTO_NETTO.format(i), f"{netto:,.0f}"))
+        return html
+
+    def riepilogo_zone(self, prodotti, colonna_zona="zona"):
+        ''' Calcola in un solo passaggio sui codici di zona il numero di campioni e i totali di kg e netto per zona; restituisce un dizionario nome_zona -> {"campioni", "kg", "netto"} con le sole zone presenti. '''
+        archivio = ArchivioColonnare.da_record(prodotti)
+        codici = archivio.colonna(colonna_zona)
+        if codici is None or not len(archivio):
+            return {}
+        nomi = archivio.categorie[colonna_zona]
+        validi = codici != MANCANTE
+        codici = codici[validi]
+        campioni = np.bincount(codici, minlength=len(nomi))
+        kg = np.bincount(codici, weights=archivio.valori("kg")[validi], minlength=len(nomi))
+        netto = np.bincount(codici, weights=archivio.valori("netto")[validi], minlength=len(nomi))
+        return {
+            nome: {"campioni": int(campioni[i]), "kg": round(float(kg[i]), 2), "netto": round(float(netto[i]), 2)}
+            for i, nome in enumerate(nomi) if nome and campioni[i]
+        }
+
     # Calcola il numero di campioni per ciascuna zona basandosi su una proprietà 'zona' presente in ogni prodotto.
     def conta_campioni_zone(self, prodotti, colonna_zona="zona"):
         ''' Calcolo il numero di campioni per ciascuna zona. '''
-        conteggi = {}
-        for prodotto in prodotti:
-            nome_zona = prodotto.get(colonna_zona, None)
-            if nome_zona:
-                conteggi[nome_zona] = conteggi.get(nome_zona, 0) + 1
-        return conteggi
+        return {nome: totali["campioni"] for nome, totali in self.riepilogo_zone(prodotti, colonna_zona).items()}
@@ -1,14 +1,20 @@
 # Fi.Co? S.Vi.To.! A Fishing Company Simulation and Visualization Tool - Ver. 1.0"- data_viz.py
 import streamlit as st
 import pandas as pd
+import numpy as np
 import matplotlib.pyplot as plt
 import matplotlib as mpl
 import os
 import random
 import json
-from datetime import date, datetime
+import hashlib
+from datetime import date, datetime, timedelta
 from crea_mappa_zone_pesca import GestoreMappa
-from streamlit_folium import folium_static
+from archivio_colonnare import ArchivioColonnare
+from business_logic import UnioneStoricoManuali
+from cache_caricamenti import cache_caricamenti
+from cache_grafici import cache_grafici
+import streamlit.components.v1 as components
 
 class GestoreVisualizzazioneDati:
 
@@ -17,8 +23,26 @@ class GestoreVisualizzazioneDati:
         self.elaboratore_dati = elaboratore_dati
         self.gestore_mappa = gestore_mappa
         self.schema_colori = ["blue", "red"]
+        # motore dei grafici: "vega" (interattivi, disegnati dal browser) oppure "matplotlib" (immagini statiche)
+        self.motore_grafici = "vega"
+        # bande Monte Carlo sul grafico temporale: (simulazione, storie, seed) oppure None
+        self.monte_carlo = None
         self.configura_matplotlib()
 
+    def seleziona_motore_grafici(self):
+        """ Visualizza nella sidebar la scelta del motore dei grafici: interattivi (Vega-Lite, zoom e spostamento nel browser senza rerun) o statici (matplotlib, per esportare le immagini). """
+        etichette_motore = {"Interattivi (Vega-Lite)": "vega", "Statici (matplotlib)": "matplotlib"}
+        scelta = st.sidebar.selectbox("Grafici", options=list(etichette_motore), key="motore_grafici")
+        self.motore_grafici = etichette_motore[scelta]
+
+    def seleziona_monte_carlo(self, simulazione_monte_carlo):
+        """ Visualizza nella sidebar le impostazioni delle bande di incertezza Monte Carlo (numero di storie simulate e seed) da sovrapporre al grafico temporale. """
+        self.monte_carlo = None
+        if st.sidebar.checkbox("Bande di incertezza (Monte Carlo)", key="monte_carlo"):
+            storie = st.sidebar.number_input("Storie simulate", min_value=10, max_value=5000, value=1000, step=100, key="storie_monte_carlo")
+            seed = st.sidebar.number_input("Seed", min_value=0, value=42, step=1, key="seed_monte_carlo")
+            self.monte_carlo = (simulazione_monte_carlo, int(storie), int(seed))
+
     def configura_matplotlib(self):
         """
         Configura le impostazioni di default di Matplotlib per i grafici: imposta il colore di sfondo, il colore delle etichette, la dimensione e il peso dei titoli,
@@ -40,9 +64,22 @@ class GestoreVisualizzazioneDati:
     def visualizza_mappa(self, record_finali):
         """ Visualiza la mappa delle zone di pesca con il numero di campioni per zona. """
         st.subheader("Mappa delle Zone di Pesca")
-        # Calcola il numero massimo di campioni per zona
-        max_count = max(self.gestore_mappa.conta_campioni_zone(record_finali).values(), default=0)
-        # Crea la legenda della mappa
+        # Calcola campioni e netto per zona in un solo passaggio, per la mappa e per la legenda
+        riepilogo_zone = self.gestore_mappa.riepilogo_zone(record_finali)
+        conti_zone = {zona: totali["campioni"] for zona, totali in riepilogo_zone.items()}
+        netto_zone = {zona: totali["netto"] for zona, totali in riepilogo_zone.items()}
+        # Scala dei colori: quantili o logaritmica rendono leggibili conteggi molto sbilanciati tra le zone
+        etichette_scala = {"Lineare": "lineare", "Quantili": "quantili", "Logaritmica": "log"}
+        scala = etichette_scala[st.selectbox("Scala dei colori", options=list(etichette_scala), key="scala_mappa")]
+        # Crea la legenda della mappa con le stesse tappe di colore e gli stessi valori della scala scelta (a gradini per i quantili)
+        conteggi = [conti_zone.get(zona["nome_zona"], 0) for zona in self.gestore_mappa.zone_mappa()["zone"]]
+        legenda = self.gestore_mappa.legenda_colori(conteggi, self.schema_colori, scala)
+        gradiente = ", ".join(f"{colore} {posizione * 100:.1f}%" for posizione, colore in legenda["tappe"])
+        # ogni etichetta è centrata sul suo punto della barra, tranne gli estremi che restano allineati ai bordi
+        etichette_html = "".join(
+            f'<span style="position: absolute; left: {posizione * 100:.1f}%; transform: translateX(-{posizione * 100:.1f}%); white-space: nowrap;">{testo}</span>'
+            for posizione, testo in legenda["etichette"]
+        )
         legend_html = f"""
             <div class="map-legend-container" style="
                 width: 100%;
@@ -54,32 +91,24 @@ class GestoreVisualizzazioneDati:
                 text-align: center;
                 margin-bottom: 5px;
             ">
-                <div style="display: inline-block; width: 97%; height: 10px; background: linear-gradient(to right, {self.schema_colori[0]}, {self.schema_colori[-1]});"></div>
-                <div>
-                    <span style="float: left;">Min.</span>
-                    <span style="float: right;">Max.</span>
-                </div>
-                <div style="font-weight: bold; margin-top: 5px;">Numero di Campioni per Zona</div>
+                <div style="display: inline-block; width: 97%; height: 10px; background: linear-gradient(to right, {gradiente});"></div>
+                <div style="position: relative; width: 97%; height: 1.4em; margin: 0 auto;">{etichette_html}</div>
+                <div style="font-weight: bold; margin-top: 5px;">Numero di Campioni per Zona (scala {scala})</div>
             </div>
         """
-        # Carica le EEZ italiane
-        eez_italiane = self.gestore_mappa.carica_eez_ita()
-        # Crea la mappa personalizzata
-        map_obj = self.gestore_mappa.crea_mappa_custom(
-            self.gestore_mappa.suddividi_eez_ita(eez_italiane),
-            self.gestore_mappa.conta_campioni_zone(record_finali),
-            self.schema_colori
-        )
-        # Visualizza la mappa con Streamlit Folium
-        folium_static(map_obj, width=None, height=380)
+        # Crea la mappa personalizzata: le zone e la mappa di base sono già pronte, cambiano solo conteggi e colori
+        html_mappa = self.gestore_mappa.html_mappa(conti_zone, self.schema_colori, scala, netto_zone)
+        # Visualizza la mappa (stesso componente HTML statico usato da folium_static)
+        components.html(html_mappa, height=390, width=None)
         # Visualizza la legenda
         st.markdown(legend_html, unsafe_allow_html=True)
 
-    def visualizza_grafico_torta(self, record_preparati):
-        """ Visualizza il grafico a torta della distribuzione di netto e scarto. """
+    def visualizza_grafico_torta(self, record_preparati, summary=None):
+        """ Visualizza il grafico a torta della distribuzione di netto e scarto; summary può essere già calcolato (es. dagli aggregati simulati). """
         st.subheader("Distribuzione Quantità")
-        # Calcola il netto e lo scarto
-        summary = self.elaboratore_dati.calcola_netto_scarto(record_preparati)
+        # Calcola il netto e lo scarto se non già disponibili
+        if summary is None:
+            summary = self.elaboratore_dati.calcola_netto_scarto(record_preparati)
         # Prendi i totali dalla riga "Totale" del DataFrame
         totale_netto = float(self.crea_totale_da_sommario(summary, "netto"))
         totale_scarto = float(self.crea_totale_da_sommario(summary, "scarto"))
@@ -87,66 +116,127 @@ class GestoreVisualizzazioneDati:
         if totale_netto + totale_scarto == 0:
             st.warning("Nessun dato disponibile per il grafico a torta.")
         else:
-            # Crea il grafico a torta
-            fig_pie, ax_pie = plt.subplots()
-            fig_pie.patch.set_facecolor("none")
-            ax_pie.set_facecolor("none")
-            ax_pie.pie(
-                [totale_scarto, totale_netto],
-                labels=["Scarto", "Peso Netto"],
-                autopct=lambda p: f"{p:.1f}%",
-                textprops={"fontsize": 10, "color": "white", "weight": "bold"}
-            )
-            fig_pie.tight_layout()
-            # Visualizza il grafico con Streamlit
-            st.pyplot(fig_pie, use_container_width=True)
+            # Visualizza il grafico a torta (ridisegnato solo se cambiano i totali)
+            self.mostra_grafico("torta", {"scarto": totale_scarto, "netto": totale_netto}, self.disegna_grafico_torta, self.specifica_grafico_torta)
             # Visualizza i totali di scarto e netto
             st.markdown(f"<p style='text-align:center; font-size:24px'>Scarto: <b>{totale_scarto:.2f} kg</b> – Netto: <b>{totale_netto:.2f} kg</b></p>", unsafe_allow_html=True)
 
+    def disegna_grafico_torta(self, dati):
+        """ Crea la figura del grafico a torta di scarto e netto. """
+        fig_pie, ax_pie = plt.subplots()
+        fig_pie.patch.set_facecolor("none")
+        ax_pie.set_facecolor("none")
+        ax_pie.pie(
+            [dati["scarto"], dati["netto"]],
+            labels=["Scarto", "Peso Netto"],
+            autopct=lambda p: f"{p:.1f}%",
+            textprops={"fontsize": 10, "color": "white", "weight": "bold"}
+        )
+        fig_pie.tight_layout()
+        return fig_pie
+
+    def specifica_grafico_torta(self, dati):
+        """ Crea la specifica Vega-Lite del grafico a torta di scarto e netto, con la percentuale calcolata dal browser. """
+        return {
+            "data": {"values": [{"Categoria": "Scarto", "Kg": dati["scarto"]}, {"Categoria": "Peso Netto", "Kg": dati["netto"]}]},
+            "transform": [
+                {"joinaggregate": [{"op": "sum", "field": "Kg", "as": "Totale"}]},
+                {"calculate": "datum.Kg / datum.Totale", "as": "Quota"}
+            ],
+            "mark": {"type": "arc", "stroke": "white"},
+            "encoding": {
+                "theta": {"field": "Kg", "type": "quantitative", "stack": True},
+                "color": {"field": "Categoria", "type": "nominal", "scale": {"domain": ["Scarto", "Peso Netto"], "range": ["#1f77b4", "#ff7f0e"]}},
+                "tooltip": [
+                    {"field": "Categoria", "type": "nominal"},
+                    {"field": "Kg", "type": "quantitative", "format": ",.2f"},
+                    {"field": "Quota", "type": "quantitative", "format": ".1%"}
+                ]
+            }
+        }
+
+    def mostra_grafico(self, nome, dati, disegna, specifica, formato="png"):
+        """
+        Visualizza un grafico a partire dai dati aggregati (serializzabili in JSON): con il motore "vega" li invia al browser con la specifica Vega-Lite, con "matplotlib"
+        usa la cache delle immagini, dove i dati sono la chiave e l'input di disegna, quindi la figura viene creata, salvata e chiusa solo quando i dati cambiano.
+        """
+        if self.motore_grafici == "matplotlib":
+            immagine = cache_grafici.immagine(nome, dati, disegna, formato)
+            st.image(immagine, use_column_width=True)
+        else:
+            st.vega_lite_chart(spec=specifica(dati), use_container_width=True)
+
     def crea_totale_da_sommario(self, summary, key):
         """ Estrae il valore totale da un dizionario di riepilogo. """
         return summary.get("Totale", {}).get(key, 0)
 
-    def visualizza_grafico_barre(self, record_preparati):
-        """ Visualizza il grafico a barre delle quantità per tipo di pesce. """
+    def visualizza_grafico_barre(self, record_preparati, summary=None):
+        """ Visualizza il grafico a barre delle quantità per tipo di pesce; summary può essere già calcolato (es. dagli aggregati simulati). """
         st.subheader("Quantità per Tipo di Pesce")
-        # Calcola il netto e lo scarto per tipo di pesce
-        summary = self.elaboratore_dati.calcola_netto_scarto(record_preparati)
+        # Calcola il netto e lo scarto per tipo di pesce se non già disponibili
+        if summary is None:
+            summary = self.elaboratore_dati.calcola_netto_scarto(record_preparati)
         if summary:
             # Crea un DataFrame dal dizionario di riepilogo
             df_quantita = pd.DataFrame.from_dict(summary, orient="index")
             # Ordina il DataFrame per la colonna "totale" se presente
             if "totale" in df_quantita.columns:
                 df_quantita = df_quantita.sort_values("totale", ascending=False)
-            # Crea il grafico a barre
-            fig_bar, ax_bar = plt.subplots()
-            # Crea il grafico a barre con netto e scarto impilati
-            df_quantita[["netto", "scarto"]].plot(
-                kind="bar",
-                stacked=True,
-                ax=ax_bar,
-                color=["#1f77b4", "#ff7f0e"],
-                edgecolor="white",
-                linewidth=0.5
-            )
-            ax_bar.set_ylabel("Kg")
-            fig_bar.patch.set_facecolor("none")
-            ax_bar.set_facecolor("none")
-            ax_bar.tick_params(colors='white')
-            # Imposta la dimensione e il peso del font per le etichette dell'asse x
-            for label in ax_bar.get_xticklabels():
-                label.set_fontsize(11)
-                label.set_fontweight("bold")
-            # Imposta la dimensione e il peso del font per le etichette dell'asse y
-            for label in ax_bar.get_yticklabels():
-                label.set_fontsize(11)
-                label.set_fontweight("bold")
-            fig_bar.tight_layout()
-            # Visualizza il grafico con Streamlit
-            st.pyplot(fig_bar, use_container_width=True)
+            # Visualizza il grafico a barre (ridisegnato solo se cambiano le quantità)
+            dati_barre = {
+                "tipi": [str(tipo) for tipo in df_quantita.index],
+                "netto": df_quantita["netto"].tolist(),
+                "scarto": df_quantita["scarto"].tolist()
+            }
+            self.mostra_grafico("barre", dati_barre, self.disegna_grafico_barre, self.specifica_grafico_barre)
             # Visualizza la tabella riassuntiva
             self.visualizza_tabella_riassuntiva(df_quantita)
 
+    def disegna_grafico_barre(self, dati):
+        """ Crea la figura del grafico a barre con netto e scarto impilati per tipo di pesce. """
+        fig_bar, ax_bar = plt.subplots()
+        df_quantita = pd.DataFrame({"netto": dati["netto"], "scarto": dati["scarto"]}, index=dati["tipi"])
+        # Crea il grafico a barre con netto e scarto impilati
+        df_quantita.plot(
+            kind="bar",
+            stacked=True,
+            ax=ax_bar,
+            color=["#1f77b4", "#ff7f0e"],
+            edgecolor="white",
+            linewidth=0.5
+        )
+        ax_bar.set_ylabel("Kg")
+        fig_bar.patch.set_facecolor("none")
+        ax_bar.set_facecolor("none")
+        ax_bar.tick_params(colors='white')
+        # Imposta la dimensione e il peso del font per le etichette degli assi
+        for label in ax_bar.get_xticklabels() + ax_bar.get_yticklabels():
+            label.set_fontsize(11)
+            label.set_fontweight("bold")
+        fig_bar.tight_layout()
+        return fig_bar
+
+    def specifica_grafico_barre(self, dati):
+        """ Crea la specifica Vega-Lite delle barre impilate di netto e scarto per tipo di pesce; i valori vengono ripiegati in formato lungo dal browser. """
+        return {
+            "data": {"values": [
+                {"Tipo": tipo, "netto": netto, "scarto": scarto}
+                for tipo, netto, scarto in zip(dati["tipi"], dati["netto"], dati["scarto"])
+            ]},
+            "transform": [{"fold": ["netto", "scarto"], "as": ["Componente", "Kg"]}],
+            "mark": {"type": "bar", "stroke": "white", "strokeWidth": 0.5},
+            "encoding": {
+                "x": {"field": "Tipo", "type": "nominal", "sort": None, "title": None, "axis": {"labelAngle": -90}},
+                "y": {"field": "Kg", "type": "quantitative", "stack": True},
+                "color": {"field": "Componente", "type": "nominal", "scale": {"domain": ["netto", "scarto"], "range": ["#1f77b4", "#ff7f0e"]}},
+                "tooltip": [
+                    {"field": "Tipo", "type": "nominal"},
+                    {"field": "Componente", "type": "nominal"},
+                    {"field": "Kg", "type": "quantitative", "format": ",.2f"}
+                ]
+            }
+        }
+
     def visualizza_tabella_riassuntiva(self, df_quantita):
         """ Visualizza la tabella riassuntiva delle quantità. """
         if not df_quantita.empty:
@@ -174,11 +264,12 @@ class GestoreVisualizzazioneDati:
         else:
             st.warning("Nessun dato disponibile per la tabella delle quantità.")
 
-    def visualizza_grafico_costi(self, record_simulati):
-        """ Visualizza il grafico dei costi di produzione, utile e prezzo finale. """
+    def visualizza_grafico_costi(self, record_simulati, costi=None):
+        """ Visualizza il grafico dei costi di produzione, utile e prezzo finale; costi può essere già calcolato (es. dagli aggregati simulati). """
         st.subheader("Costi di Produzione, Utile e Prezzo Finale (€/kg)")
-        # Calcola i costi medi per tipo di pesce
-        costi = self.elaboratore_dati.calcola_sommario_costi(record_simulati)
+        # Calcola i costi medi per tipo di pesce se non già disponibili
+        if costi is None:
+            costi = self.elaboratore_dati.calcola_sommario_costi(record_simulati)
         if costi:
             # Crea un DataFrame dal dizionario dei costi
             df_costi = pd.DataFrame.from_dict(costi, orient="index").reset_index()
@@ -192,33 +283,59 @@ class GestoreVisualizzazioneDati:
             # Rimuovi la colonna "count" se presente
             if "count" in df_costi.columns:
                 df_costi.drop(columns=["count"], inplace=True)
-            # Crea il grafico a barre
-            fig_costi, ax_costi = plt.subplots()
-            # Crea il grafico a barre con i costi di produzione e l'utile lordo
-            df_costi.set_index("Tipo di Pesce")[["Produzione (€/kg)", "Utile Lordo (€/kg)"]].plot(
-                kind="bar",
-                ax=ax_costi,
-                edgecolor="white",
-                linewidth=0.5
-            )
-            ax_costi.set_ylabel("€/kg")
-            fig_costi.patch.set_facecolor("none")
-            ax_costi.set_facecolor("none")
-            ax_costi.tick_params(colors='white')
-            # Imposta la dimensione e il peso del font per le etichette dell'asse x
-            for label in ax_costi.get_xticklabels():
-                label.set_fontsize(11)
-                label.set_fontweight("bold")
-            # Imposta la dimensione e il peso del font per le etichette dell'asse y
-            for label in ax_costi.get_yticklabels():
-                label.set_fontsize(11)
-                label.set_fontweight("bold")
-            fig_costi.tight_layout()
-            # Visualizza il grafico con Streamlit
-            st.pyplot(fig_costi, use_container_width=True)
+            # Visualizza il grafico dei costi (ridisegnato solo se cambiano i costi)
+            dati_costi = {
+                "tipi": [str(tipo) for tipo in df_costi["Tipo di Pesce"]],
+                "produzione": df_costi["Produzione (€/kg)"].tolist(),
+                "utile": df_costi["Utile Lordo (€/kg)"].tolist()
+            }
+            self.mostra_grafico("costi", dati_costi, self.disegna_grafico_costi, self.specifica_grafico_costi)
             # Visualizza la tabella dei costi
             self.visualizza_tabella_costi(df_costi)
 
+    def disegna_grafico_costi(self, dati):
+        """ Crea la figura del grafico a barre con i costi di produzione e l'utile lordo per tipo di pesce. """
+        fig_costi, ax_costi = plt.subplots()
+        df_costi = pd.DataFrame({"Produzione (€/kg)": dati["produzione"], "Utile Lordo (€/kg)": dati["utile"]}, index=pd.Index(dati["tipi"], name="Tipo di Pesce"))
+        df_costi.plot(
+            kind="bar",
+            ax=ax_costi,
+            edgecolor="white",
+            linewidth=0.5
+        )
+        ax_costi.set_ylabel("€/kg")
+        fig_costi.patch.set_facecolor("none")
+        ax_costi.set_facecolor("none")
+        ax_costi.tick_params(colors='white')
+        # Imposta la dimensione e il peso del font per le etichette degli assi
+        for label in ax_costi.get_xticklabels() + ax_costi.get_yticklabels():
+            label.set_fontsize(11)
+            label.set_fontweight("bold")
+        fig_costi.tight_layout()
+        return fig_costi
+
+    def specifica_grafico_costi(self, dati):
+        """ Crea la specifica Vega-Lite delle barre affiancate di costo di produzione e utile lordo per tipo di pesce. """
+        return {
+            "data": {"values": [
+                {"Tipo": tipo, "Produzione (€/kg)": produzione, "Utile Lordo (€/kg)": utile}
+                for tipo, produzione, utile in zip(dati["tipi"], dati["produzione"], dati["utile"])
+            ]},
+            "transform": [{"fold": ["Produzione (€/kg)", "Utile Lordo (€/kg)"], "as": ["Voce", "Valore"]}],
+            "mark": {"type": "bar", "stroke": "white", "strokeWidth": 0.5},
+            "encoding": {
+                "x": {"field": "Tipo", "type": "nominal", "sort": None, "title": None, "axis": {"labelAngle": -90}},
+                "xOffset": {"field": "Voce", "type": "nominal"},
+                "y": {"field": "Valore", "type": "quantitative", "title": "€/kg"},
+                "color": {"field": "Voce", "type": "nominal", "scale": {"range": ["#1f77b4", "#ff7f0e"]}},
+                "tooltip": [
+                    {"field": "Tipo", "type": "nominal"},
+                    {"field": "Voce", "type": "nominal"},
+                    {"field": "Valore", "type": "quantitative", "format": ".2f"}
+                ]
+            }
+        }
+
     def visualizza_tabella_costi(self, df_costi):
         """ Visualizza la tabella dei costi. """
         # Assicura che i dati siano di tipo float
@@ -237,11 +354,12 @@ class GestoreVisualizzazioneDati:
         # Visualizza la tabella con Streamlit
         st.dataframe(df_costi, use_container_width=True, hide_index=True)
 
-    def visualizza_indicatore_qualita(self, record_simulati):
-        """ Visualizza l'indicatore di qualità del prodotto. """
+    def visualizza_indicatore_qualita(self, record_simulati, indici_qualita=None):
+        """ Visualizza l'indicatore di qualità del prodotto; indici_qualita può essere già calcolato (es. dagli aggregati simulati). """
         st.subheader("Indicatore di Qualità del Prodotto")
-        # Calcola gli indici di qualità
-        indici_qualita = self.elaboratore_dati.calcola_indice_qualita(record_simulati)
+        # Calcola gli indici di qualità se non già disponibili
+        if indici_qualita is None:
+            indici_qualita = self.elaboratore_dati.calcola_indice_qualita(record_simulati)
         def get_emoticon(score):
             """ Restituisce l'emoticon e il colore corrispondenti al punteggio. """
             if score >= 4.5:
@@ -284,11 +402,35 @@ class GestoreVisualizzazioneDati:
         </div>
         """, unsafe_allow_html=True)
         
-    def visualizza_grafico_temporale(self, record_simulati, data_inizio, data_fine):
-        """ Visualizza il grafico temporale dell'andamento di quantità, prezzo e qualità. """
+    def scegli_frequenza(self, data_inizio, data_fine):
+        """ Sceglie la frequenza della serie temporale in base alla lunghezza dell'intervallo: giornaliera fino a 4 mesi, settimanale fino a 2 anni, mensile fino a 10 anni, poi annuale. """
+        giorni = (data_fine - data_inizio).days + 1
+        if giorni <= 120:
+            return "giorno"
+        if giorni <= 730:
+            return "settimana"
+        if giorni <= 3660:
+            return "mese"
+        return "anno"
+
+    def visualizza_grafico_temporale(self, record_simulati, data_inizio, data_fine, somme_giornaliere=None, aggregati=None, riciclo=0, lavorazione=0):
+        """ Visualizza il grafico temporale dell'andamento di quantità, prezzo e qualità; le somme giornaliere possono arrivare già calcolate, oppure la serie può essere letta dai rollup degli aggregati al livello della frequenza scelta. Se attive, sovrappone le bande Monte Carlo calcolate con gli stessi slider. """
         st.subheader("Andamento Temporale")
-        # Crea un intervallo di date
-        date_range = pd.date_range(start=data_inizio, end=data_fine).date
+        # Seleziona la frequenza della serie: per intervalli lunghi aggrega per settimana, per mese o per anno
+        etichette_frequenza = {"Automatica": None, "Giornaliera": "giorno", "Settimanale": "settimana", "Mensile": "mese", "Annuale": "anno"}
+        frequenza = "giorno"
+        if data_inizio != data_fine:
+            scelta = st.selectbox("Aggregazione", options=list(etichette_frequenza), key="frequenza_temporale")
+            frequenza = etichette_frequenza[scelta] or self.scegli_frequenza(data_inizio, data_fine)
+        if aggregati is not None and aggregati.rollup is not None:
+            # Dai rollup leggo direttamente un punto per periodo (già simulato, se serve): le somme sono già alla frequenza scelta
+            serie = self.elaboratore_dati.ricampiona_serie(aggregati.serie(data_inizio, data_fine, frequenza), "giorno")
+        else:
+            # Raggruppa i record per giorno in un'unica passata, se le somme non sono già disponibili
+            if somme_giornaliere is None:
+                somme_giornaliere = self.elaboratore_dati.calcola_somme_giornaliere(record_simulati, data_inizio, data_fine)
+            serie = self.elaboratore_dati.ricampiona_serie(somme_giornaliere, frequenza)
+        date_range = [punto["data"] for punto in serie]
         dati_giornalieri = []
         # Inizializza un dizionario nella sessione per i valori casuali giornalieri
         if "daily_random" not in st.session_state:
@@ -297,41 +439,19 @@ class GestoreVisualizzazioneDati:
         # Gestisce il caso in cui sia selezionato un solo giorno
         if data_inizio == data_fine:
             st.markdown("<h2 style='text-align:center; font-weight:bold;'>Selezionare un intervallo più lungo per visualizzare gli andamenti temporali!</h2>", unsafe_allow_html=True)
-            key = str(data_inizio)
+        for punto in serie:
+            key = str(punto["data"])
             # Genera un valore casuale se non esiste già
             if key not in st.session_state["daily_random"]:
                 st.session_state["daily_random"][key] = random.uniform(0, 1)
-            # Filtra i record per il giorno selezionato
-            record_giornalieri = [r for r in record_simulati if GestoreFiltroDati.parse_date(r) == data_inizio]
-            # Calcola le metriche giornaliere
-            metriche_giornaliere = self.elaboratore_dati.calcola_metriche_giornaliere(record_giornalieri)
             # Aggiunge i dati al dizionario
             dati_giornalieri.append({
-                "Data": data_inizio,
-                "Quantità": metriche_giornaliere['quantita'],
-                "Prezzo Medio": metriche_giornaliere['prezzo_medio'],
-                "Qualità Media": metriche_giornaliere['qualita_media'],
+                "Data": punto["data"],
+                "Quantità": punto["quantita"],
+                "Prezzo Medio": punto["prezzo_medio"],
+                "Qualità Media": punto["qualita_media"],
                 "Circolarità": st.session_state["daily_random"][key]
             })
-        # Gestisce il caso in cui sia selezionato un intervallo di date
-        else:
-            for single_date in date_range:
-                key = str(single_date)
-                # Genera un valore casuale se non esiste già
-                if key not in st.session_state["daily_random"]:
-                    st.session_state["daily_random"][key] = random.uniform(0, 1)
-                # Filtra i record per il giorno corrente
-                record_giornalieri = [r for r in record_simulati if GestoreFiltroDati.parse_date(r) == single_date]
-                # Calcola le metriche giornaliere
-                metriche_giornaliere = self.elaboratore_dati.calcola_metriche_giornaliere(record_giornalieri)
-                # Aggiunge i dati al dizionario
-                dati_giornalieri.append({
-                    "Data": single_date,
-                    "Quantità": metriche_giornaliere["quantita"],
-                    "Prezzo Medio": metriche_giornaliere["prezzo_medio"],
-                    "Qualità Media": metriche_giornaliere["qualita_media"],
-                    "Circolarità": st.session_state["daily_random"][key]
-                })
         # Visualizza il grafico solo se è selezionato un intervallo di date
         if data_inizio != data_fine:
             # Estrae i dati dalle liste
@@ -339,41 +459,35 @@ class GestoreVisualizzazioneDati:
             prices = [item["Prezzo Medio"] for item in dati_giornalieri]
             qualities = [item["Qualità Media"] for item in dati_giornalieri]
             circularities = [item["Circolarità"] for item in dati_giornalieri]
-            # Normalizza i dati
-            def normalize(data):
+            # Calcola le bande Monte Carlo (storie conservate per intervallo: cambiando gli slider non vengono rigenerate)
+            bande = None
+            if self.monte_carlo is not None and serie:
+                simulazione, storie, seed = self.monte_carlo
+                with st.spinner(f"Simulazione Monte Carlo di {storie} storie..."):
+                    bande = simulazione.bande(data_inizio, data_fine, frequenza, storie, seed, riciclo, lavorazione)
+                if len(bande["serie"]["data"]) != len(serie):
+                    bande = None
+            # Normalizza i dati (con le bande, sullo stesso intervallo di valori della serie e delle bande)
+            def normalize(data, *limiti):
                 """ Normalizza i dati in un intervallo tra 0 e 1 """
-                min_val = min(data)
-                max_val = max(data)
+                valori = list(data) + [x for limite in limiti for x in limite]
+                min_val = min(valori)
+                max_val = max(valori)
                 return [(x - min_val) / (max_val - min_val) if max_val > min_val else 0 for x in data]
-            quantities_norm = normalize(quantities)
-            prices_norm = normalize(prices)
-            qualities_norm = normalize(qualities)
-            # Crea il grafico
-            fig, ax = plt.subplots()
-            # Traccia le linee per quantità, prezzo e qualità
-            ax.plot(date_range, quantities_norm, label="Quantità", color="blue")
-            ax.plot(date_range, prices_norm, label="Prezzo", color="green")
-            ax.plot(date_range, qualities_norm, label="Qualità", color="orange")
-            ax.set_xlabel("Data")
-            ax.set_ylabel("Valore Normalizzato")
-            ax.legend(loc="upper center", bbox_to_anchor=(0.5, 1.15), ncol=2)
-            fig.autofmt_xdate()
-            # Formatta le date sull'asse x
-            ax.xaxis.set_major_formatter(mpl.dates.DateFormatter('%Y-%m-%d'))
-            ax.xaxis.set_major_locator(mpl.dates.AutoDateLocator())
-            fig.patch.set_facecolor("none")
-            ax.set_facecolor("none")
-            ax.tick_params(colors='white')
-            # Imposta la dimensione e il peso del font per le etichette dell'asse x
-            for label in ax.get_xticklabels():
-                label.set_fontsize(11)
-                label.set_fontweight("bold")
-            # Imposta la dimensione e il peso del font per le etichette dell'asse y
-            for label in ax.get_yticklabels():
-                label.set_fontsize(11)
-                label.set_fontweight("bold")
-            # Visualizza il grafico con Streamlit
-            st.pyplot(fig, use_container_width=True)
+            dati_serie = {"date": [str(data) for data in date_range]}
+            for nome, valori, campo in (("quantita", quantities, "quantita"), ("prezzo", prices, "prezzo_medio"), ("qualita", qualities, "qualita_media")):
+                if bande is None:
+                    dati_serie[nome] = normalize(valori)
+                    continue
+                inferiore = bande["serie"][campo]["p5"].tolist()
+                superiore = bande["serie"][campo]["p95"].tolist()
+                dati_serie[nome] = normalize(valori, inferiore, superiore)
+                dati_serie[nome + "_min"] = normalize(inferiore, valori, superiore)
+                dati_serie[nome + "_max"] = normalize(superiore, valori, inferiore)
+            # Visualizza il grafico (ridisegnato solo se cambiano le serie)
+            self.mostra_grafico("temporale", dati_serie, self.disegna_grafico_temporale, self.specifica_grafico_temporale)
+            if bande is not None:
+                self.visualizza_tabella_monte_carlo(bande)
         # Visualizza la tabella dei dati giornalieri
         if dati_giornalieri:
             df_daily = pd.DataFrame(dati_giornalieri)
@@ -388,6 +502,81 @@ class GestoreVisualizzazioneDati:
         else:
             st.warning("Nessun dato disponibile per la tabella dei dati giornalieri.")
 
+    def disegna_grafico_temporale(self, dati):
+        """ Crea la figura dell'andamento normalizzato di quantità, prezzo e qualità. """
+        date_range = [date.fromisoformat(data) for data in dati["date"]]
+        fig, ax = plt.subplots()
+        # Traccia le linee per quantità, prezzo e qualità
+        ax.plot(date_range, dati["quantita"], label="Quantità", color="blue")
+        ax.plot(date_range, dati["prezzo"], label="Prezzo", color="green")
+        ax.plot(date_range, dati["qualita"], label="Qualità", color="orange")
+        # Bande Monte Carlo (percentili 5-95), se presenti
+        for nome, colore in (("quantita", "blue"), ("prezzo", "green"), ("qualita", "orange")):
+            if nome + "_min" in dati:
+                ax.fill_between(date_range, dati[nome + "_min"], dati[nome + "_max"], color=colore, alpha=0.2, linewidth=0)
+        ax.set_xlabel("Data")
+        ax.set_ylabel("Valore Normalizzato")
+        ax.legend(loc="upper center", bbox_to_anchor=(0.5, 1.15), ncol=2)
+        fig.autofmt_xdate()
+        # Formatta le date sull'asse x
+        ax.xaxis.set_major_formatter(mpl.dates.DateFormatter('%Y-%m-%d'))
+        ax.xaxis.set_major_locator(mpl.dates.AutoDateLocator())
+        fig.patch.set_facecolor("none")
+        ax.set_facecolor("none")
+        ax.tick_params(colors='white')
+        # Imposta la dimensione e il peso del font per le etichette degli assi
+        for label in ax.get_xticklabels() + ax.get_yticklabels():
+            label.set_fontsize(11)
+            label.set_fontweight("bold")
+        return fig
+
+    def specifica_grafico_temporale(self, dati):
+        """ Crea la specifica Vega-Lite dell'andamento normalizzato di quantità, prezzo e qualità (con le eventuali bande Monte Carlo come aree): zoom (rotella) e spostamento (trascinamento) sull'asse delle date avvengono nel browser, senza rerun. """
+        colore = {
+            "field": "Serie", "type": "nominal",
+            "scale": {"domain": ["Quantità", "Prezzo", "Qualità"], "range": ["blue", "green", "orange"]},
+            "legend": {"orient": "top"}
+        }
+        asse_x = {"field": "Data", "type": "temporal", "axis": {"format": "%Y-%m-%d", "labelAngle": -30}}
+        # Una riga per data e serie, con i limiti della banda se presenti
+        valori = []
+        for nome, serie in (("quantita", "Quantità"), ("prezzo", "Prezzo"), ("qualita", "Qualità")):
+            for i, data in enumerate(dati["date"]):
+                riga = {"Data": data, "Serie": serie, "Valore": round(dati[nome][i], 4)}
+                if nome + "_min" in dati:
+                    riga["Minimo"] = round(dati[nome + "_min"][i], 4)
+                    riga["Massimo"] = round(dati[nome + "_max"][i], 4)
+                valori.append(riga)
+        livelli = []
+        if "quantita_min" in dati:
+            livelli.append({
+                "mark": {"type": "area", "opacity": 0.2},
+                "encoding": {"x": asse_x, "y": {"field": "Minimo", "type": "quantitative"}, "y2": {"field": "Massimo"}, "color": colore}
+            })
+        livelli.append({
+            "params": [{"name": "zoom", "select": {"type": "interval", "encodings": ["x"]}, "bind": "scales"}],
+            "mark": {"type": "line", "tooltip": True},
+            "encoding": {"x": asse_x, "y": {"field": "Valore", "type": "quantitative", "title": "Valore Normalizzato"}, "color": colore}
+        })
+        return {"data": {"values": valori}, "layer": livelli}
+
+    def visualizza_tabella_monte_carlo(self, bande):
+        """ Visualizza media e percentili degli indicatori sulle storie simulate. """
+        nomi = {
+            "netto": "Netto Totale",
+            "scarto": "Scarto Totale",
+            "costo_produzione": "Costo Produzione Medio",
+            "utile_lordo": "Utile Lordo Medio",
+            "prezzo_finale": "Prezzo Finale Medio",
+            "qualita": "Indice di Qualità"
+        }
+        df_bande = pd.DataFrame([
+            {"Indicatore": nomi[nome], "Media": valori["media"], "P5": valori["p5"], "Mediana": valori["p50"], "P95": valori["p95"]}
+            for nome, valori in bande["indicatori"].items()
+        ])
+        st.caption(f"Incertezza Monte Carlo su {bande['storie']} storie simulate (bande: percentili 5-95)")
+        st.dataframe(df_bande.round(2), hide_index=True, use_container_width=True)
+
 class GestoreFiltroDati:
     """ Classe per la gestione del filtro dei dati per data. """
     def __init__(self):
@@ -421,8 +610,17 @@ class GestoreFiltroDati:
             print(f"Error parsing date for record {record}: {e}")
             return None
 
+    def crea_indice_date(self, records):
+        """ Converte i record in un archivio colonnare ordinato per data (date convertite una sola volta), da riutilizzare per tutti i filtri successivi; l'unione con i record manuali è già ordinata per data. """
+        if isinstance(records, UnioneStoricoManuali):
+            return records
+        return ArchivioColonnare.da_record(records).ordina_per_data()
+
     def filtra_record_per_data(self, records, data_inizio, data_fine):
         """ Filtra i record in base all'intervallo di date selezionato. """
+        if isinstance(records, (ArchivioColonnare, UnioneStoricoManuali)):
+            # Ricerca binaria sull'indice per data: il costo dipende dai record restituiti, non dalla dimensione dell'archivio
+            return records.intervallo_date(data_inizio, data_fine)
         return [r for r in records if data_inizio <= self.parse_date(r) <= data_fine]
 
 class GestoreSimulazione:
@@ -436,9 +634,9 @@ class GestoreSimulazione:
             left, right = st.columns([2, 1])
             with left:
                 # Slider per il riciclo degli scarti
-                scarto = st.slider("Riciclo Scarti (%) - se aumento il riciclo, diminiusco lo scarto ma alzo i costi di produzione", 0, 100, 0, step=25, key="scarto_sim")
+                scarto = st.slider("Riciclo Scarti (%) - se aumento il riciclo, diminiusco lo scarto ma alzo i costi di produzione", 0, 100, step=1, key="scarto_sim")
                 # Slider per la lavorazione intensiva
-                lavorazione = st.slider("Lavorazione Intensiva (%) - se la lavorazione è più intensiva, aumento l'utile netto ma riduco la qualità", 0, 100, 0, step=25, key="lavorazione_sim")
+                lavorazione = st.slider("Lavorazione Intensiva (%) - se la lavorazione è più intensiva, aumento l'utile netto ma riduco la qualità", 0, 100, step=1, key="lavorazione_sim")
             return scarto, lavorazione
 
     def calcola_delta(self, originale, simulato):
@@ -469,27 +667,29 @@ class GestoreSimulazione:
             "qualita": media("qualita")
         }
 
-    def visualizza_metriche_footer(self, record_preparati, record_simulati, scarto, lavorazione):
-        """ Visualizza le metriche nel footer (scarto, costo produzione, utile lordo, qualità). """
-        # Calcola il riepilogo di netto e scarto per i record preparati
-        summary_base = self.elaboratore_dati.calcola_netto_scarto(record_preparati)
-        # Calcola il riepilogo dei costi per i record preparati
-        costi_base = self.elaboratore_dati.calcola_sommario_costi(record_preparati)
-        # Calcola l'indice di qualità per i record preparati
-        indici_qualita_base = self.elaboratore_dati.calcola_indice_qualita(record_preparati)
+    def visualizza_metriche_footer(self, record_preparati, record_simulati, scarto, lavorazione, aggregati_base=None, aggregati_simulati=None):
+        """ Visualizza le metriche nel footer (scarto, costo produzione, utile lordo, qualità); i riepiloghi storici e simulati possono arrivare già calcolati. """
+        # Calcola i riepiloghi (netto/scarto, costi, qualità) per i record preparati e simulati se non già disponibili
+        if aggregati_base is None:
+            aggregati_base = self.elaboratore_dati.calcola_aggregati(record_preparati)
+        if aggregati_simulati is None:
+            aggregati_simulati = self.elaboratore_dati.calcola_aggregati(record_simulati)
+        scarto_simulato = aggregati_simulati.netto_scarto().get("Totale", {}).get("scarto", 0)
+        costi_simulati = aggregati_simulati.sommario_costi().get("Media", {})
+        qualita_simulata = aggregati_simulati.indice_qualita().get("globale", 0)
         # Calcola le differenze percentuali tra i dati originali e simulati
         delta_footer = self.elaboratore_dati.calcola_delta_footer(
             {
-                "scarto": summary_base.get("Totale", {}).get("scarto", 0),
-                "costo": costi_base.get("Media", {}).get("costo_produzione", 0),
-                "utile": costi_base.get("Media", {}).get("utile_lordo", 0),
-                "qualita": indici_qualita_base.get("globale", 0)
+                "scarto": aggregati_base.netto_scarto().get("Totale", {}).get("scarto", 0),
+                "costo": aggregati_base.sommario_costi().get("Media", {}).get("costo_produzione", 0),
+                "utile": aggregati_base.sommario_costi().get("Media", {}).get("utile_lordo", 0),
+                "qualita": aggregati_base.indice_qualita().get("globale", 0)
             },
             {
-                "scarto": sum(float(r.get("scarto", 0)) for r in record_simulati),
-                "costo": self.elaboratore_dati.calcola_sommario_costi(record_simulati).get("Media", {}).get("costo_produzione", 0),
-                "utile": self.elaboratore_dati.calcola_sommario_costi(record_simulati).get("Media", {}).get("utile_lordo", 0),
-                "qualita": self.elaboratore_dati.calcola_indice_qualita(record_simulati).get("globale", 0)
+                "scarto": scarto_simulato,
+                "costo": costi_simulati.get("costo_produzione", 0),
+                "utile": costi_simulati.get("utile_lordo", 0),
+                "qualita": qualita_simulata
             }
         )
         # Visualizza le metriche nel footer
@@ -497,13 +697,13 @@ class GestoreSimulazione:
         st.markdown("### Differenze rispetto ai dati storici")
         col1, col2, col3, col4 = st.columns(4)
         # Visualizza la metrica dello scarto
-        col1.metric("Scarto", f"{sum(float(r.get('scarto', 0)) for r in record_simulati):.2f}", delta_footer["scarto_pct"])
+        col1.metric("Scarto", f"{scarto_simulato:.2f}", delta_footer["scarto_pct"])
         # Visualizza la metrica del costo di produzione
-        col2.metric("Costo Produzione", f"{self.elaboratore_dati.calcola_sommario_costi(record_simulati).get('Media', {}).get('costo_produzione', 0):.2f}", delta_footer["costo_produzione"])
+        col2.metric("Costo Produzione", f"{costi_simulati.get('costo_produzione', 0):.2f}", delta_footer["costo_produzione"])
         # Visualizza la metrica dell'utile lordo
-        col3.metric("Utile Lordo", f"{self.elaboratore_dati.calcola_sommario_costi(record_simulati).get('Media', {}).get('utile_lordo', 0):.2f}", delta_footer["utile_lordo"])
+        col3.metric("Utile Lordo", f"{costi_simulati.get('utile_lordo', 0):.2f}", delta_footer["utile_lordo"])
         # Visualizza la metrica della qualità
-        col4.metric("Qualità", f"{self.elaboratore_dati.calcola_indice_qualita(record_simulati).get('globale', 0):.2f}", delta_footer["qualita"])
+        col4.metric("Qualità", f"{qualita_simulata:.2f}", delta_footer["qualita"])
         return record_simulati
 
     def visualizza_indicatori_circolarita(self, scarto, lavorazione):
@@ -553,48 +753,124 @@ class GestoreSimulazione:
                     <div style="text-align: center; font-size: 20px; color: {green_color};">Green Action Score: {green_action_score}/10</div>
                 """, unsafe_allow_html=True)
 
+    def visualizza_ottimizzazione(self, ottimizzatore, aggregati_base):
+        """ Visualizza l'ottimizzatore degli slider: vincoli su qualità minima e scarto massimo, combinazione con l'utile lordo più alto e frontiera di Pareto tra utile, qualità e scarto; un pulsante riporta la combinazione migliore sugli slider. """
+        with st.expander("Ottimizzazione Riciclo / Lavorazione"):
+            scarto_storico = aggregati_base.netto_scarto().get("Totale", {}).get("scarto", 0)
+            qualita_minima = st.number_input("Qualità minima (indice globale)", min_value=0.0, max_value=5.0, value=3.5, step=0.1, key="qualita_minima_ottimizzazione")
+            limita_scarto = st.checkbox("Scarto non superiore allo storico", value=True, key="limita_scarto_ottimizzazione")
+            frontiera, migliore = ottimizzatore.ottimizza(aggregati_base, qualita_minima, scarto_storico if limita_scarto else None)
+            if migliore is None:
+                st.warning("Nessuna combinazione rispetta i vincoli indicati.")
+                return
+            st.markdown(f"**Migliore:** riciclo {migliore['riciclo']}%, lavorazione {migliore['lavorazione']}% - utile lordo {migliore['utile_lordo']:.2f}, qualità {migliore['qualita']:.2f}, scarto {migliore['scarto']:.2f}")
+
+            def applica_migliore():
+                """ Porta gli slider sulla combinazione migliore (eseguita prima del rerun, quando gli slider non sono ancora stati creati). """
+                st.session_state["scarto_sim"] = migliore["riciclo"]
+                st.session_state["lavorazione_sim"] = migliore["lavorazione"]
+            st.button("Applica agli slider", on_click=applica_migliore, key="applica_ottimizzazione")
+            # Frontiera di Pareto: nessuna combinazione ha utile e qualità più alti e scarto più basso
+            df_frontiera = pd.DataFrame(frontiera).rename(columns={
+                "riciclo": "Riciclo (%)",
+                "lavorazione": "Lavorazione (%)",
+                "utile_lordo": "Utile Lordo",
+                "qualita": "Qualità",
+                "scarto": "Scarto",
+                "costo_produzione": "Costo Produzione"
+            })
+            st.caption(f"Frontiera di Pareto ({len(frontiera)} combinazioni su {(100 // ottimizzatore.passo + 1) ** 2})")
+            st.dataframe(df_frontiera.round(2), hide_index=True, use_container_width=True)
+
 
 class GestoreDati:
     """ Classe per la gestione dei dati storici e manuali. """
-    def __init__(self, generatore_storico, gestore_input_manuale, elaboratore_dati):
+    def __init__(self, generatore_storico, gestore_input_manuale, elaboratore_dati, percorso_archivio="historical_data.bin", percorso_json="historical_data.json", vista_unita=None, gestore_mappa=None):
         self.generatore_storico = generatore_storico
         self.gestore_input_manuale = gestore_input_manuale
         self.elaboratore_dati = elaboratore_dati
+        self.percorso_archivio = percorso_archivio
+        self.percorso_json = percorso_json
+        self.vista_unita = vista_unita
+        self.gestore_mappa = gestore_mappa
 
     def carica_dati(self):
-        """ Carica i dati storici dal file JSON. """
-        record_storici = []
-        if os.path.exists("historical_data.json"):
-            with open("historical_data.json", "r") as f:
-                record_storici = json.load(f)
-        return record_storici
-
-    def aggiorna_dati_storici(self, record_storici):
-        """ Aggiorna i dati storici se necessario; se i dati storici non sono aggiornati ad oggi, li rigenera. """
-        if record_storici:
-            # Trova l'ultima data presente nei record storici
-            ultima_data_record = max(datetime.fromisoformat(r["data"]).date() for r in record_storici)
-            # Prende la data di oggi
-            oggi = date.today()
-            # Se l'ultima data è precedente a oggi, rigenera i dati storici
-            if ultima_data_record < oggi:
-                st.info("I dati storici non sono aggiornati. Rigenerazione in corso...")
-                data_inizio = oggi.replace(year=oggi.year - 5)
-                record_storici = self.generatore_storico.genera_dati_storici(data_inizio, oggi)
-                self.generatore_storico.salva_dati_storici(record_storici)
-                st.success("Dati storici rigenerati e salvati in 'historical_data.json'.")
-        else:
-            # Se non ci sono dati storici, li genera
+        """ Carica i dati storici dall'archivio binario colonnare tramite la cache di processo (condivisa tra sessioni e rerun); alla prima esecuzione migra il vecchio file JSON, se presente. """
+        if not os.path.exists(self.percorso_archivio) and os.path.exists(self.percorso_json):
+            ArchivioColonnare.migra_da_json(self.percorso_json, self.percorso_archivio)
+        if os.path.exists(self.percorso_archivio):
+            return cache_caricamenti.carica(self.percorso_archivio, self.leggi_archivio)
+        return []
+
+    def leggi_archivio(self, percorso):
+        """ Legge l'archivio storico; i campioni con posizione GPS ricevono la zona calcolata sui poligoni delle zone di pesca (una volta per versione del file). """
+        archivio = ArchivioColonnare.carica(percorso)
+        if self.gestore_mappa is not None:
+            archivio = self.gestore_mappa.assegna_zone_archivio(archivio)
+        return archivio
+
+    def esporta_json(self):
+        """ Esporta l'archivio storico nel vecchio formato JSON (historical_data.json). """
+        archivio = self.carica_dati()
+        ArchivioColonnare.da_record(archivio).esporta_json(self.percorso_json)
+
+    def versione_dati(self, record_manuali):
+        """ Restituisce un identificativo della versione dei dati (firma dell'archivio storico e impronta dei record manuali), usato come chiave dalle cache. """
+        firma_storico = None
+        if os.path.exists(self.percorso_archivio):
+            stato = os.stat(self.percorso_archivio)
+            firma_storico = (stato.st_mtime_ns, stato.st_size)
+        impronta_manuali = hashlib.md5(json.dumps(record_manuali, sort_keys=True, default=str).encode()).hexdigest()
+        return (firma_storico, impronta_manuali)
+
+    def aggiorna_dati_storici(self, record_storici, incrementale=True):
+        """ Aggiorna i dati storici se necessario; se i dati storici non sono aggiornati ad oggi, genera solo i giorni mancanti (o, con incrementale=False, rigenera tutto lo storico). """
+        # Trova l'ultima data presente nei record storici dall'indice per data (None se lo storico è vuoto o non ha date valide)
+        archivio_storico = ArchivioColonnare.da_record(record_storici) if len(record_storici) else None
+        ultima_data_record = archivio_storico.ultima_data() if archivio_storico is not None else None
+        # Prende la data di oggi
+        oggi = date.today()
+        if ultima_data_record is None:
+            # Se non ci sono dati storici (o nessuno ha una data), li genera sull'intera finestra di 5 anni
             st.info("Nessun dato storico trovato. Generazione in corso...")
-            oggi = date.today()
             data_inizio = oggi.replace(year=oggi.year - 5)
-            record_storici = self.generatore_storico.genera_dati_storici(data_inizio, oggi)
-            self.generatore_storico.salva_dati_storici(record_storici)
-            st.success("Dati storici generati e salvati in 'historical_data.json'.")
+            record_storici = self.generatore_storico.genera_archivio_storico(data_inizio, oggi)
+            self.generatore_storico.salva_dati_storici(record_storici, self.percorso_archivio)
+            record_storici = self.carica_dati()
+            st.success(f"Dati storici generati e salvati in '{self.percorso_archivio}'.")
+        # Se l'ultima data è precedente a oggi, aggiunge i giorni mancanti
+        elif ultima_data_record < oggi and incrementale:
+            st.info("I dati storici non sono aggiornati. Generazione dei giorni mancanti in corso...")
+            record_storici = self.aggiungi_giorni_mancanti(archivio_storico, ultima_data_record, oggi)
+            st.success(f"Dati storici aggiornati al {oggi.isoformat()} e salvati in '{self.percorso_archivio}'.")
+        elif ultima_data_record < oggi:
+            st.info("I dati storici non sono aggiornati. Rigenerazione in corso...")
+            data_inizio = oggi.replace(year=oggi.year - 5)
+            record_storici = self.generatore_storico.genera_archivio_storico(data_inizio, oggi)
+            self.generatore_storico.salva_dati_storici(record_storici, self.percorso_archivio)
+            record_storici = self.carica_dati()
+            st.success(f"Dati storici rigenerati e salvati in '{self.percorso_archivio}'.")
         return record_storici
 
+    def aggiungi_giorni_mancanti(self, archivio_storico, ultima_data_record, oggi):
+        """ Genera solo i giorni successivi all'ultima data, scarta quelli usciti dalla finestra mobile di 5 anni e salva l'archivio aggiornato. """
+        inizio_finestra = oggi.replace(year=oggi.year - 5)
+        # Se lo storico è più vecchio dell'intera finestra, genero a partire dall'inizio della finestra
+        data_inizio = max(ultima_data_record + timedelta(days=1), inizio_finestra)
+        nuovi_record = self.generatore_storico.genera_archivio_storico(data_inizio, oggi)
+        # I nuovi giorni sono tutti successivi a quelli conservati: l'archivio unito resta ordinato per data
+        archivio = ArchivioColonnare.concatena([archivio_storico.intervallo_date(inizio_finestra, ultima_data_record), nuovi_record.ordina_per_data()])
+        archivio.ordinato_per_data = True
+        self.generatore_storico.salva_dati_storici(archivio, self.percorso_archivio)
+        return self.carica_dati()
+
     def unisci_dati(self, record_storici, record_manuali):
         """ Unisce i record storici e manuali; i record manuali sovrascrivono quelli storici se hanno la stessa data e lo stesso tipo. """
+        if isinstance(record_storici, ArchivioColonnare) and len(record_storici) and self.vista_unita is not None:
+            # Vista persistente: lo storico è già indicizzato, si aggiornano solo le chiavi dei record manuali cambiati
+            return self.vista_unita.unisci(record_storici, record_manuali)
+        if isinstance(record_storici, ArchivioColonnare):
+            return self.unisci_archivio(record_storici, record_manuali)
         # Creo un dizionario dove la chiave è la tupla (data, tipo)
         combinati = {}
         for r in record_storici:
@@ -611,6 +887,21 @@ class GestoreDati:
         record_finali = list(combinati.values())
         return record_finali
 
+    def unisci_archivio(self, archivio_storico, record_manuali):
+        """ Versione colonnare di unisci_dati: stessa chiave (data, tipo) e stesso ordine dei record, senza convertire lo storico in dizionari. """
+        n_storici = len(archivio_storico)
+        unito = ArchivioColonnare.concatena([archivio_storico, ArchivioColonnare.da_record(record_manuali)])
+        if not len(unito):
+            return unito
+        # Chiave numerica equivalente a chiave_record: giorno e codice del tipo
+        chiavi = unito.colonna("data").astype(np.int64) * (len(unito.categorie["tipo"]) + 1) + (unito.colonna("tipo").astype(np.int64) + 1)
+        _, primo, inverso = np.unique(chiavi, return_index=True, return_inverse=True)
+        # Per ogni chiave vince l'ultimo record manuale (che ha indice maggiore di tutti gli storici), altrimenti il primo storico
+        scelta = primo.copy()
+        np.maximum.at(scelta, inverso[n_storici:], np.arange(n_storici, len(unito)))
+        # Ogni chiave resta nella posizione della sua prima apparizione, come nel dizionario di unisci_dati
+        return unito.seleziona(scelta[np.argsort(primo, kind="stable")])
+
 class GestoreLayoutPagina:
     """ Classe per la gestione del layout della pagina Streamlit; questa classe gestisce la configurazione della pagina, la visualizzazione dell'header e del footer e la creazione della griglia per i grafici. """
     def __init__(self):
@@ -689,9 +980,16 @@ class GestoreSidebar:
             if st.button("Rigenera Dati Storici"):
                 oggi = date.today()
                 data_inizio = oggi.replace(year=oggi.year - 5)
-                record_storici = self.generatore_storico.genera_dati_storici(data_inizio, oggi)
-                self.generatore_storico.salva_dati_storici(record_storici)
-                st.success("Dati storici rigenerati e salvati in 'historical_data.json'.")
+                record_storici = self.generatore_storico.genera_archivio_storico(data_inizio, oggi)
+                self.generatore_storico.salva_dati_storici(record_storici, self.gestore_dati.percorso_archivio)
+                st.success(f"Dati storici rigenerati e salvati in '{self.gestore_dati.percorso_archivio}'.")
+            # Contatori della cache dei file, per verificare che le sessioni condividano i caricamenti
+            statistiche = cache_caricamenti.statistiche()
+            st.caption(f"Cache dati: {statistiche['hit']} hit, {statistiche['miss']} miss, {statistiche['invalidazioni']} invalidazioni")
+            # Bottone per esportare l'archivio storico nel formato JSON
+            if st.button("Esporta Dati Storici in JSON"):
+                self.gestore_dati.esporta_json()
+                st.success(f"Dati storici esportati in '{self.gestore_dati.percorso_json}'.")
 
             st.markdown("---")
             st.header("Input dei Manuale Campioni")
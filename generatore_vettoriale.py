@@ -0,0 +1,134 @@
+# Fi.Co? S.Vi.To.! A Fishing Company Simulation and Visualization Tool - Ver. 1.0"- generatore_vettoriale.py
+
+import os
+import numpy as np
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from archivio_colonnare import ArchivioColonnare, ScrittoreArchivio, arrotonda
+
+
+def genera_blocco(generatore, data_inizio, data_fine, seme):
+    ''' Genera un blocco di giorni in un processo del pool (funzione di modulo, così può essere inviata ai processi). '''
+    return generatore.genera(data_inizio, data_fine, seme)
+
+
+class GeneratoreVettoriale:
+    ''' Generatore vettoriale dei dati storici: stesse distribuzioni dei metodi genera_* di GeneratoreDatiStorici, estratte come array (giorni x specie) su tutto l'intervallo. '''
+    ETA = ["giovane", "medio", "tardivo"]
+    ALLEVAMENTO = ["selvatico", "allevamento"]
+    # Peso base usato per le specie senza un valore in pesi_base
+    PESO_BASE_PREDEFINITO = 1000
+    # Giorni per blocco nella generazione parallela: a parità di seed e di blocco il risultato non dipende dal numero di processi
+    GIORNI_PER_BLOCCO = 365
+
+    def __init__(self, zone, species, historical_prices, pesi_base):
+        self.zone = list(zone)
+        self.SPECIE = list(species)
+        self.PREZZI_STORICI = historical_prices
+        self.PESI_BASE = pesi_base
+
+    def tabella_prezzi(self, anni):
+        ''' Restituisce i prezzi base (anni x specie); come genera_prezzo, se manca l'anno uso il 2022 e, se manca anche quello, l'anno più recente disponibile. '''
+        tabella = np.empty((len(anni), len(self.SPECIE)))
+        for j, specie in enumerate(self.SPECIE):
+            prezzi = self.PREZZI_STORICI.get(specie, {})
+            ripiego = prezzi.get("2022", prezzi[max(prezzi)] if prezzi else np.nan)
+            for i, anno in enumerate(anni):
+                tabella[i, j] = prezzi.get(str(anno), ripiego)
+        return tabella
+
+    def categorie(self):
+        ''' Restituisce le categorie dell'archivio generato: sempre tutte le opzioni, così i blocchi generati separatamente hanno gli stessi codici. '''
+        return {
+            "zona": list(self.zone),
+            "tipo": list(self.SPECIE),
+            "eta_coltura": list(self.ETA),
+            "allevamento_selvatico": list(self.ALLEVAMENTO)
+        }
+
+    def genera(self, data_inizio, data_fine, seed=None):
+        ''' Genera l'archivio storico giornaliero tra data_inizio e data_fine; con lo stesso seed il risultato è sempre lo stesso. '''
+        rng = np.random.default_rng(seed)
+        giorni = np.arange(np.datetime64(data_inizio, "D"), np.datetime64(data_fine, "D") + 1)
+        forma = (len(giorni), len(self.SPECIE))
+
+        # Un indice meteo per giorno, condiviso da tutte le specie
+        meteo = arrotonda(rng.uniform(0.3, 1.0, len(giorni)))
+        meteo_specie = meteo[:, None]
+        # Zona random per ogni campione
+        zona = rng.integers(0, len(self.zone), forma)
+        # Se meteo è molto sfavorevole (indice < 0.5), c'è una probabilità di saltare il campione
+        tenuto = rng.random(forma) >= np.maximum(0, 0.5 - meteo_specie)
+
+        # Peso: condizioni migliori portano a pesi maggiori, più una componente casuale di +-5 kg
+        pesi_base = np.array([self.PESI_BASE.get(specie, self.PESO_BASE_PREDEFINITO) for specie in self.SPECIE], dtype=np.float64)
+        peso = arrotonda(pesi_base * (0.9 + meteo_specie * 0.2) + rng.uniform(-5, 5, forma))
+        # Stress: 1-2 con meteo < 0.5, altrimenti 0-1
+        stress = rng.integers(0, 2, forma) + (meteo_specie < 0.5)
+        eta = rng.integers(0, len(self.ETA), forma)
+        omogeneita = rng.integers(1, 4, forma)
+        # Allevamento con probabilità 20%, selvatico 80%
+        allevamento = (rng.random(forma) < 0.2).astype(np.int16)
+
+        # Prezzo base per anno e specie, con una variazione del +-10%
+        anni, indice_anno = np.unique(giorni.astype("datetime64[Y]").astype(np.int64) + 1970, return_inverse=True)
+        prezzo_base = self.tabella_prezzi(anni.tolist())[indice_anno]
+        prezzo = arrotonda(prezzo_base + rng.uniform(-0.1, 0.1, forma) * prezzo_base)
+
+        # Scarto tra 25% e 35%
+        scarto = arrotonda(peso * rng.uniform(0.25, 0.35, forma))
+        netto = arrotonda(peso - scarto)
+
+        # Appiattisco giorno per giorno e specie per specie, come il ciclo di genera_dati_storici, tenendo solo i campioni non saltati
+        righe = np.flatnonzero(tenuto)
+        giorno_riga = righe // forma[1]
+        colonne = {
+            "data": giorni[giorno_riga],
+            "zona": zona.ravel()[righe].astype(np.int16),
+            "kg": peso.ravel()[righe],
+            "tipo": (righe % forma[1]).astype(np.int16),
+            "prezzo_medio": prezzo.ravel()[righe],
+            "stress": stress.ravel()[righe].astype(np.int8),
+            "eta_coltura": eta.ravel()[righe].astype(np.int16),
+            "omogeneita": omogeneita.ravel()[righe].astype(np.int8),
+            "allevamento_selvatico": allevamento.ravel()[righe],
+            "meteo": meteo[giorno_riga],
+            "scarto": scarto.ravel()[righe],
+            "netto": netto.ravel()[righe]
+        }
+        archivio = ArchivioColonnare(colonne, self.categorie(), len(righe))
+        archivio.ordinato_per_data = True
+        return archivio
+
+    def blocchi(self, data_inizio, data_fine, giorni_per_blocco):
+        ''' Divide l'intervallo di date in blocchi consecutivi di giorni_per_blocco giorni. '''
+        inizio = np.datetime64(data_inizio, "D")
+        fine = np.datetime64(data_fine, "D")
+        while inizio <= fine:
+            fine_blocco = min(inizio + giorni_per_blocco - 1, fine)
+            yield inizio, fine_blocco
+            inizio = fine_blocco + 1
+
+    def genera_su_file(self, percorso, data_inizio, data_fine, seed=None, processi=None, giorni_per_blocco=None):
+        ''' Genera l'archivio a blocchi in un pool di processi, ognuno con un seed indipendente derivato da seed, e li scrive in ordine direttamente nel file; restituisce il numero di campioni scritti. '''
+        giorni_per_blocco = giorni_per_blocco or self.GIORNI_PER_BLOCCO
+        blocchi = list(self.blocchi(data_inizio, data_fine, giorni_per_blocco))
+        semi = np.random.SeedSequence(seed).spawn(len(blocchi))
+        processi = min(processi or os.cpu_count() or 1, max(len(blocchi), 1))
+        with ScrittoreArchivio(percorso, self.categorie()) as scrittore:
+            # un blocco vuoto registra le colonne: anche un intervallo senza giorni produce un archivio valido
+            scrittore.aggiungi(self.genera(data_inizio, np.datetime64(data_inizio, "D") - 1))
+            if processi == 1:
+                for (inizio, fine), seme in zip(blocchi, semi):
+                    scrittore.aggiungi(self.genera(inizio, fine, seme))
+            else:
+                with ProcessPoolExecutor(processi) as pool:
+                    in_corso = deque()
+                    for (inizio, fine), seme in zip(blocchi, semi):
+                        in_corso.append(pool.submit(genera_blocco, self, inizio, fine, seme))
+                        # al massimo due blocchi in attesa per processo: la memoria resta costante qualunque sia l'intervallo
+                        if len(in_corso) >= 2 * processi:
+                            scrittore.aggiungi(in_corso.popleft().result())
+                    while in_corso:
+                        scrittore.aggiungi(in_corso.popleft().result())
+        return scrittore.lunghezza
@@ -0,0 +1,155 @@
+# Fi.Co? S.Vi.To.! A Fishing Company Simulation and Visualization Tool - Ver. 1.0"- giornale_campioni.py
+
+import os
+import json
+import threading
+
+if os.name == "nt":
+    import msvcrt
+else:
+    import fcntl
+
+
+class BloccoFile:
+    ''' Lock esclusivo tra processi (e tra sessioni dello stesso processo) su un file sentinella accanto al file protetto. '''
+    def __init__(self, percorso):
+        self.percorso = percorso + ".lock"
+        self.file = None
+
+    def __enter__(self):
+        self.file = open(self.percorso, "a+b")
+        if os.name == "nt":
+            self.file.seek(0)
+            msvcrt.locking(self.file.fileno(), msvcrt.LK_LOCK, 1)
+        else:
+            fcntl.flock(self.file.fileno(), fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, tipo_errore, errore, traccia):
+        if os.name == "nt":
+            self.file.seek(0)
+            msvcrt.locking(self.file.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            fcntl.flock(self.file.fileno(), fcntl.LOCK_UN)
+        self.file.close()
+
+
+class GiornaleCampioni:
+    ''' Giornale in sola aggiunta dei campioni manuali (una riga JSON per campione): a parità di chiave vince l'ultima riga scritta, risolta in lettura. '''
+    # Compatto il giornale quando le righe superano sia questa soglia sia il doppio dei campioni distinti
+    SOGLIA_COMPATTAZIONE = 1000
+
+    def __init__(self, percorso, chiave):
+        self.percorso = percorso
+        self.chiave = chiave
+        self.lock = threading.Lock()
+        # stato della lettura incrementale: file letto, byte già letti, righe lette e campioni per chiave
+        self.identita = None
+        self.posizione = 0
+        self.righe = 0
+        self.combinati = {}
+
+    def esiste(self):
+        ''' Indica se il file del giornale esiste. '''
+        return os.path.exists(self.percorso)
+
+    def aggiungi(self, record):
+        ''' Accoda un campione con una sola scrittura, in tempo costante qualunque sia la lunghezza del giornale. '''
+        riga = (json.dumps(record) + "\n").encode("utf-8")
+        with BloccoFile(self.percorso):
+            with open(self.percorso, "ab") as f:
+                # se una scrittura precedente è stata interrotta a metà riga, la chiudo perché non rovini questa
+                if f.tell() and not self.termina_con_a_capo():
+                    riga = b"\n" + riga
+                f.write(riga)
+
+    def termina_con_a_capo(self):
+        ''' Indica se l'ultimo byte del giornale è un a capo. '''
+        with open(self.percorso, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b"\n"
+
+    def leggi(self):
+        ''' Restituisce i campioni distinti (a parità di chiave l'ultimo scritto), leggendo dal file solo le righe aggiunte dall'ultima lettura. '''
+        with self.lock:
+            try:
+                stato = os.stat(self.percorso)
+            except FileNotFoundError:
+                self.azzera_stato(None)
+                return []
+            identita = (stato.st_dev, stato.st_ino)
+            # il file è stato compattato o riscritto da un'altra sessione: rileggo da capo
+            if identita != self.identita or stato.st_size < self.posizione:
+                self.azzera_stato(identita)
+            if stato.st_size > self.posizione:
+                with open(self.percorso, "rb") as f:
+                    f.seek(self.posizione)
+                    self.posizione += self.applica(f.read(stato.st_size - self.posizione))
+            if self.righe > max(self.SOGLIA_COMPATTAZIONE, 2 * len(self.combinati)):
+                self.compatta()
+            return list(self.combinati.values())
+
+    def applica(self, dati):
+        ''' Applica le righe complete lette dal giornale; restituisce i byte consumati (una riga ancora in scrittura verrà letta la volta successiva). '''
+        fine = dati.rfind(b"\n") + 1
+        for riga in dati[:fine].splitlines():
+            if not riga.strip():
+                continue
+            try:
+                record = json.loads(riga)
+            except ValueError:
+                # riga rovinata da una scrittura interrotta: la salto
+                continue
+            self.combinati[self.chiave(record)] = record
+            self.righe += 1
+        return fine
+
+    def azzera_stato(self, identita):
+        ''' Dimentica quanto letto finora, per rileggere il giornale dall'inizio. '''
+        self.identita = identita
+        self.posizione = 0
+        self.righe = 0
+        self.combinati = {}
+
+    def compatta(self):
+        ''' Riscrive il giornale con un solo campione per chiave. '''
+        with BloccoFile(self.percorso):
+            # rileggo sotto lock le righe aggiunte nel frattempo da altre sessioni, così nessun campione va perso
+            with open(self.percorso, "rb") as f:
+                f.seek(self.posizione)
+                self.posizione += self.applica(f.read())
+            self.scrivi(list(self.combinati.values()))
+
+    def riscrivi(self, records):
+        ''' Sostituisce l'intero contenuto del giornale con i records (es. per cancellare tutti i campioni). '''
+        with self.lock, BloccoFile(self.percorso):
+            self.azzera_stato(None)
+            for record in records:
+                self.combinati[self.chiave(record)] = record
+            self.scrivi(list(self.combinati.values()))
+
+    def scrivi(self, records):
+        ''' Scrive i records in un nuovo file e lo sostituisce al giornale in modo atomico; da chiamare con il lock del file. '''
+        temporaneo = self.percorso + ".tmp"
+        with open(temporaneo, "w") as f:
+            for record in records:
+                f.write(json.dumps(record) + "\n")
+        os.replace(temporaneo, self.percorso)
+        stato = os.stat(self.percorso)
+        self.identita = (stato.st_dev, stato.st_ino)
+        self.posizione = stato.st_size
+        self.righe = len(records)
+
+
+# Un giornale per file, condiviso da tutte le sessioni del processo (così la lettura incrementale sopravvive ai rerun)
+giornali = {}
+lock_giornali = threading.Lock()
+
+
+def apri_giornale(percorso, chiave):
+    ''' Restituisce il giornale condiviso del file indicato, creandolo al primo utilizzo. '''
+    with lock_giornali:
+        percorso_assoluto = os.path.abspath(percorso)
+        if percorso_assoluto not in giornali:
+            giornali[percorso_assoluto] = GiornaleCampioni(percorso, chiave)
+        return giornali[percorso_assoluto]
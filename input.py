@@ -4,14 +4,20 @@ import random
 import os
 from datetime import date, timedelta
 from business_logic import ElaboratoreDati
+from archivio_colonnare import ArchivioColonnare
+from cache_caricamenti import cache_caricamenti
+from giornale_campioni import apri_giornale
+from generatore_vettoriale import GeneratoreVettoriale
 
 ##### GENERATORE INPUT MANUALI #####
 class GestoreInputManuale:
     ''' Gestisce l'input manuale dei campioni di pesca da parte dell'utente. '''
-    def __init__(self, zone=None, species=None):
+    def __init__(self, zone=None, species=None, gestore_mappa=None):
         # Creo le opzioni predefinite per le tendine
         self.zone = zone or ["Adriatico", "Tirreno", "Ionio", "Mediterraneo Centrale", "Mediterraneo Occidentale"]
         self.SPECIE = species or ["Acciuga", "Sardina", "Tonno rosso", "Pesce spada"]
+        # se disponibile, assegna la zona dalle coordinate GPS del campione
+        self.gestore_mappa = gestore_mappa
 
     def render_input_manuali(self):
         ''' Visualizza l'interfaccia utente per l'inserimento manuale dei dati dei campioni e salva il campione inserito nella sessione e nel file JSON. '''
@@ -36,6 +42,11 @@ class GestoreInputManuale:
         allevamento_selvatico = st.selectbox("Tipo (Allevamento/Selvatico)", options=["selvatico", "allevamento"])
         # Inserimento manuale del prezzo medio (€/kg)
         prezzo_medio = st.number_input("Prezzo Medio (€/kg)", min_value=0.0, value=2.50, step=0.01)
+        # Posizione GPS facoltativa della cala: se è dentro una zona di pesca, la zona viene assegnata dalle coordinate
+        posizione_gps = st.checkbox("Posizione GPS della cala")
+        if posizione_gps:
+            lat = st.number_input("Latitudine", min_value=-90.0, max_value=90.0, value=42.0, step=0.0001, format="%.4f")
+            lon = st.number_input("Longitudine", min_value=-180.0, max_value=180.0, value=14.0, step=0.0001, format="%.4f")
         # Bottone per salvare il campione manuale
         if st.button("Salva Campione Manuale"):
             # Calcolo di scarto e netto qui, con randomizzazione**
@@ -59,15 +70,17 @@ class GestoreInputManuale:
                 "scarto": scarto,  
                 "netto": netto    
             }
-            if "manual_records" not in st.session_state:
-                st.session_state["manual_records"] = []            
-            # Aggiungo il nuovo record alla lista
-            st.session_state["manual_records"].append(nuovo_record)            
-            # Gestisco i duplicati
-            elaboratore_dati = ElaboratoreDati()
-            combinati = {elaboratore_dati.chiave_record(r): r for r in st.session_state["manual_records"]}
-            st.session_state["manual_records"] = list(combinati.values())
-            self.salva_record_manuali(st.session_state["manual_records"])
+            if posizione_gps:
+                nuovo_record["lat"] = round(lat, 6)
+                nuovo_record["lon"] = round(lon, 6)
+                zona_gps = self.gestore_mappa.zona_da_coordinate(lat, lon) if self.gestore_mappa is not None else None
+                if zona_gps is not None:
+                    nuovo_record["zona"] = zona_gps
+                else:
+                    st.info(f"La posizione non ricade in nessuna zona di pesca: uso la zona selezionata ({zona}).")
+            # Accodo il nuovo record al giornale (i duplicati si risolvono in lettura) e aggiorno la lista della sessione
+            self.aggiungi_record_manuale(nuovo_record)
+            st.session_state["manual_records"] = self.carica_record_manuali()
             st.success("Campione manuale salvato con successo!")    
     
     def viz_record_manuali(self):
@@ -84,33 +97,38 @@ class GestoreInputManuale:
         self.salva_record_manuali(st.session_state["manual_records"])
         st.success("Campioni manuali cancellati.")
 
-    def salva_record_manuali(self, records, filename="manual_data.json"):
-        ''' Salva i record manuali in un file JSON. '''
-        elaboratore_dati = ElaboratoreDati()
-        # Creo un dizionario per gestire i duplicati
-        combinati = {elaboratore_dati.chiave_record(r): r for r in records}
-        
-        # Converto il dizionario in una lista di record
-        records_unici = list(combinati.values())
-        
-        with open(filename, "w") as f:
-            json.dump(records_unici, f, indent=2)
-
-    def carica_record_manuali(self, filename="manual_data.json"):
-        ''' Carica i record manuali da un file JSON. '''
-        if os.path.exists(filename):
-            with open(filename, "r") as f:
-                records = json.load(f)
-                elaboratore_dati = ElaboratoreDati()
-                combinati = {elaboratore_dati.chiave_record(r): r for r in records}
-                return list(combinati.values())
-        return []
+    def giornale(self, filename="manual_data.jsonl"):
+        ''' Restituisce il giornale dei record manuali, condiviso da tutte le sessioni del processo. '''
+        return apri_giornale(filename, ElaboratoreDati().chiave_record)
+
+    def aggiungi_record_manuale(self, record, filename="manual_data.jsonl"):
+        ''' Accoda un record manuale al giornale, senza riscrivere i record già salvati. '''
+        self.giornale(filename).aggiungi(record)
+
+    def salva_record_manuali(self, records, filename="manual_data.jsonl"):
+        ''' Sostituisce tutti i record manuali salvati con records, eliminando i duplicati. '''
+        self.giornale(filename).riscrivi(records)
+
+    def leggi_record_manuali(self, filename):
+        ''' Legge i record manuali dal vecchio file JSON, eliminando i duplicati. '''
+        with open(filename, "r") as f:
+            records = json.load(f)
+            elaboratore_dati = ElaboratoreDati()
+            combinati = {elaboratore_dati.chiave_record(r): r for r in records}
+            return list(combinati.values())
+
+    def carica_record_manuali(self, filename="manual_data.jsonl", filename_json="manual_data.json"):
+        ''' Carica i record manuali dal giornale (leggendo solo le righe nuove dall'ultima lettura); al primo avvio migra il vecchio file JSON. Restituisce una copia della lista, che la sessione può modificare. '''
+        giornale = self.giornale(filename)
+        if not giornale.esiste() and os.path.exists(filename_json):
+            giornale.riscrivi(self.leggi_record_manuali(filename_json))
+        return giornale.leggi()
     
 ##### GENERATORE DATI STORICI #####
 class GeneratoreDatiStorici:
     ''' Genera dati storici simulati per i campioni di pesca. '''
-    def __init__(self, zone=None, species=None, historical_prices=None):
-        ''' Inizializza il GeneratoreDatiStorici con le zone, le specie e i prezzi storici predefiniti. '''
+    def __init__(self, zone=None, species=None, historical_prices=None, base_weights=None):
+        ''' Inizializza il GeneratoreDatiStorici con le zone, le specie, i prezzi storici e i pesi base predefiniti. '''
         # setto le costanti di configurazione
         self.zone = zone or ["Adriatico", "Tirreno", "Ionio", "Mediterraneo Centrale", "Mediterraneo Occidentale"]
         self.SPECIE = species or ["Acciuga", "Sardina", "Tonno rosso", "Pesce spada"]
@@ -121,6 +139,13 @@ class GeneratoreDatiStorici:
             "Tonno rosso": {"2018": 5.20, "2019": 5.43, "2020": 5.50, "2021": 5.91, "2022": 5.09},
             "Pesce spada": {"2018": 7.00, "2019": 7.25, "2020": 7.30, "2021": 7.35, "2022": 8.43}
         }
+        # peso base (Kg.) di un campione per specie
+        self.PESI_BASE = base_weights or {
+            "Acciuga": 1000,
+            "Sardina": 1500,
+            "Tonno rosso": 800,
+            "Pesce spada": 700
+        }
 
     def genera_indice_meteo(self):
         ''' Genera un indice meteo giornaliero casuale. '''
@@ -128,14 +153,8 @@ class GeneratoreDatiStorici:
 
     def genera_peso(self, species, meteo):
         ''' Simula il peso (Kg.) del campione in base alla specie e all'indice meteo. '''
-        peso_base = {
-            "Acciuga": 1000,
-            "Sardina": 1500,
-            "Tonno rosso": 800,
-            "Pesce spada": 700
-        }
         # Le condizioni meteo influenzano il peso: condizioni migliori (indice alto) portano a pesi maggiori
-        peso = peso_base[species] * (0.9 + meteo * 0.2)
+        peso = self.PESI_BASE[species] * (0.9 + meteo * 0.2)
         # Aggiungo una componente casuale per rendere la simulazione più realistica
         peso += random.uniform(-5, 5)
         return round(peso, 2)
@@ -217,16 +236,46 @@ class GeneratoreDatiStorici:
 
         return records
 
-    def salva_dati_storici(self, records, filename="historical_data.json"):
-        ''' Salva i dati storici generati in un file JSON. '''
-        with open(filename, "w") as f:
-            json.dump(records, f, indent=2)
+    def genera_archivio_storico(self, data_inizio, data_fine, seed=None):
+        ''' Genera il database storico in modalità vettoriale, con le stesse distribuzioni di genera_dati_storici, e lo restituisce come ArchivioColonnare; con un seed la generazione è riproducibile. '''
+        return self.generatore_vettoriale().genera(data_inizio, data_fine, seed)
+
+    def generatore_vettoriale(self):
+        ''' Restituisce il generatore vettoriale con la configurazione corrente (zone, specie, prezzi storici e pesi base). '''
+        return GeneratoreVettoriale(self.zone, self.SPECIE, self.PREZZI_STORICI, self.PESI_BASE)
+
+    def salva_dati_storici(self, records, filename="historical_data.bin"):
+        ''' Salva i dati storici generati (lista di record o ArchivioColonnare) nell'archivio binario colonnare, ordinati per data. '''
+        ArchivioColonnare.da_record(records).ordina_per_data().salva(filename)
+        # il file è stato riscritto: invalido la copia condivisa tra le sessioni
+        cache_caricamenti.invalida(filename)
 
-# Con main posso usarlo anche standalone per generare un archivio sotrico su 5 anni
+    def genera_archivio_su_file(self, data_inizio, data_fine, filename="historical_data.bin", seed=None, processi=None, giorni_per_blocco=None):
+        ''' Genera archivi storici anche molto grandi a blocchi di giorni in un pool di processi, scrivendoli direttamente nel file con memoria costante; restituisce il numero di campioni. '''
+        campioni = self.generatore_vettoriale().genera_su_file(filename, data_inizio, data_fine, seed, processi, giorni_per_blocco)
+        cache_caricamenti.invalida(filename)
+        return campioni
+
+# Con main posso usarlo anche standalone per generare un archivio storico (di default su 5 anni)
 if __name__ == "__main__":
-    generator = GeneratoreDatiStorici()
+    import argparse
+    import time
     today = date.today()
-    start_date = today.replace(year=today.year - 5)
-    historical_records = generator.genera_dati_storici(start_date, today)
-    generator.salva_dati_storici(historical_records)
-    print("Database storico generato e salvato in 'historical_data.json'.")
+    parser = argparse.ArgumentParser(description="Genera l'archivio storico simulato dei campioni di pesca.")
+    parser.add_argument("--inizio", type=date.fromisoformat, default=today.replace(year=today.year - 5), help="prima data (AAAA-MM-GG), di default 5 anni fa")
+    parser.add_argument("--fine", type=date.fromisoformat, default=today, help="ultima data (AAAA-MM-GG), di default oggi")
+    parser.add_argument("--seed", type=int, default=None, help="seed per una generazione riproducibile")
+    parser.add_argument("--processi", type=int, default=None, help="processi del pool, di default uno per core")
+    parser.add_argument("--giorni-per-blocco", type=int, default=None, help="giorni generati da ogni processo per volta")
+    parser.add_argument("--configurazione", default=None, help="file JSON con zone, species, historical_prices e base_weights personalizzati")
+    parser.add_argument("--file", default="historical_data.bin", help="archivio di destinazione")
+    args = parser.parse_args()
+
+    configurazione = {}
+    if args.configurazione:
+        with open(args.configurazione, "r") as f:
+            configurazione = json.load(f)
+    generator = GeneratoreDatiStorici(**configurazione)
+    start = time.perf_counter()
+    samples = generator.genera_archivio_su_file(args.inizio, args.fine, args.file, args.seed, args.processi, args.giorni_per_blocco)
+    print(f"Database storico generato e salvato in '{args.file}': {samples} campioni in {time.perf_counter() - start:.2f} s.")
@@ -1,7 +1,9 @@
 # Fi.Co? S.Vi.To.! A Fishing Company Simulation and Visualization Tool - Ver. 1.0"- main.py
 
 import streamlit as st
-from business_logic import ElaboratoreDati
+from business_logic import ElaboratoreDati, VistaUnita, VistaRollup
+from ottimizzatore_simulazione import OttimizzatoreSimulazione
+from monte_carlo import SimulazioneMonteCarlo
 from input import GestoreInputManuale, GeneratoreDatiStorici
 from crea_mappa_zone_pesca import GestoreMappa
 from datetime import date
@@ -14,16 +16,31 @@ from data_viz import (
     GestoreSidebar,
 )
 
+@st.cache_resource
+def carica_vista_unita():
+    """ Restituisce la vista persistente dell'unione tra storico e record manuali, condivisa da tutte le sessioni del processo. """
+    return VistaUnita(ElaboratoreDati())
+
+@st.cache_resource
+def carica_vista_rollup():
+    """ Restituisce i rollup persistenti (giorno, settimana, mese, anno) dei dati uniti, condivisi da tutte le sessioni del processo. """
+    return VistaRollup(ElaboratoreDati())
+
+@st.cache_resource
+def carica_monte_carlo():
+    """ Restituisce la simulazione Monte Carlo (con le storie già generate per intervallo), condivisa da tutte le sessioni del processo. """
+    return SimulazioneMonteCarlo(GeneratoreDatiStorici().generatore_vettoriale(), ElaboratoreDati())
+
 def main():
     # Inizializzo tutti gli oggetti necessari per l'applicazione
     generatore_storico = GeneratoreDatiStorici()
-    gestore_input_manuale = GestoreInputManuale()
-    elaboratore_dati = ElaboratoreDati()
     gestore_mappa = GestoreMappa("eez_boundaries_v12.gpkg")
+    gestore_input_manuale = GestoreInputManuale(gestore_mappa=gestore_mappa)
+    elaboratore_dati = ElaboratoreDati()
 
     # Creo le istanze delle varie classi per gestire le diverse funzionalità
     gestore_layout_pagina = GestoreLayoutPagina()
-    gestore_dati = GestoreDati(generatore_storico, gestore_input_manuale, elaboratore_dati)
+    gestore_dati = GestoreDati(generatore_storico, gestore_input_manuale, elaboratore_dati, vista_unita=carica_vista_unita(), gestore_mappa=gestore_mappa)
     gestore_sidebar = GestoreSidebar(generatore_storico, gestore_input_manuale, gestore_dati)
     gestore_filtro_dati = GestoreFiltroDati()
     gestore_simulazione = GestoreSimulazione(elaboratore_dati)
@@ -32,6 +49,10 @@ def main():
     # Configuro la pagina e la sidebar
     gestore_layout_pagina.visualizza_header()
     gestore_sidebar.visualizza_sidebar()
+    # Scelgo il motore dei grafici (interattivi o statici)
+    gestore_visualizzazione_dati.seleziona_motore_grafici()
+    # Imposto le eventuali bande di incertezza Monte Carlo del grafico temporale
+    gestore_visualizzazione_dati.seleziona_monte_carlo(carica_monte_carlo())
 
     # Carico i dati storici e manuali e aggiorno st.session_state
     record_storici = gestore_dati.carica_dati()
@@ -50,11 +71,12 @@ def main():
     else:
         record_finali = st.session_state["record_finali"]
 
-    # Filtro i record in base all'intervallo di date selezionato
-    record_finali = gestore_filtro_dati.filtra_record_per_data(record_finali, data_inizio, data_fine)
-
-    # Preparo i dati prima della simulazione (calcolo qualità, utile, prezzo finale, costo)
-    record_preparati = elaboratore_dati.prepara_dati_storici(record_finali)
+    # Creo l'indice per data (archivio colonnare ordinato; la vista unita è già ordinata) solo quando cambiano i dati, poi filtro per intervallo con una ricerca binaria
+    versione_dati = gestore_dati.versione_dati(st.session_state["manual_records"])
+    if st.session_state.get("versione_indice_date") != versione_dati:
+        st.session_state["indice_date"] = gestore_filtro_dati.crea_indice_date(record_finali)
+        st.session_state["versione_indice_date"] = versione_dati
+    record_finali = gestore_filtro_dati.filtra_record_per_data(st.session_state["indice_date"], data_inizio, data_fine)
 
     # Mostro il numero di campioni selezionati nel periodo
     st.info(f"Campioni inclusi nel periodo selezionato: {len(record_finali)}")
@@ -62,28 +84,29 @@ def main():
     # Creo la griglia per i grafici e i dataframe
     row1, row2 = gestore_layout_pagina.crea_griglia()
 
-    # Creo i due slider per la simulazione con step al 25%
+    # Creo i due slider per la simulazione con step all'1% (la simulazione in forma chiusa non dipende dai passi)
     with st.container():
         left, right = st.columns([2, 1])
         with left:
             # Slider per il riciclo degli scarti
-            scarto = st.slider("Riciclo Scarti (%) - se aumento il riciclo, diminiusco lo scarto ma alzo i costi di produzione", 0, 100, 0, step=25, key="scarto_sim")
+            scarto = st.slider("Riciclo Scarti (%) - se aumento il riciclo, diminiusco lo scarto ma alzo i costi di produzione", 0, 100, step=1, key="scarto_sim")
             # Slider per la lavorazione intensiva
-            lavorazione = st.slider("Lavorazione Intensiva (%) - se la lavorazione è più intensiva, aumento l'utile netto ma riduco la qualità", 0, 100, 0, step=25, key="lavorazione_sim")
+            lavorazione = st.slider("Lavorazione Intensiva (%) - se la lavorazione è più intensiva, aumento l'utile netto ma riduco la qualità", 0, 100, step=1, key="lavorazione_sim")
 
-            # Applico la simulazione ai record preparati
-            record_simulati = elaboratore_dati.applica_simulazione_ai_record(
-                record_preparati,
-                riciclo_scarti_pct=scarto,
-                lavorazione_intensiva_pct=lavorazione
-            )
+            # I riepiloghi storici si leggono dai rollup e quelli simulati ne derivano in forma chiusa: il costo non dipende né dall'intervallo né dai record
+            rollup = carica_vista_rollup().rollup_dati(st.session_state["indice_date"])
+            aggregati_base = elaboratore_dati.aggregati_da_rollup(rollup, data_inizio, data_fine)
+            aggregati_simulati = elaboratore_dati.simula_aggregati(aggregati_base, scarto, lavorazione)
 
-            # Visualizzo le metriche nel footer
-            record_simulati = gestore_simulazione.visualizza_metriche_footer(record_preparati, record_simulati, scarto, lavorazione)
+            # Visualizzo le metriche nel footer: tutti i grafici leggono i riepiloghi simulati, senza simulare i record
+            record_simulati = None
+            gestore_simulazione.visualizza_metriche_footer(None, record_simulati, scarto, lavorazione, aggregati_base, aggregati_simulati)
 
         with right:
             # Visualizzo gli indicatori di circolarità e Green Action Score
             gestore_simulazione.visualizza_indicatori_circolarita(scarto, lavorazione)
+            # Visualizzo l'ottimizzatore degli slider (tutte le combinazioni all'1%, in forma chiusa sugli aggregati storici)
+            gestore_simulazione.visualizza_ottimizzazione(OttimizzatoreSimulazione(elaboratore_dati), aggregati_base)
 
     # Visualizzo i grafici e le tabelle nelle celle della griglia
     with st.container():
@@ -94,27 +117,27 @@ def main():
 
         with row1[1]:
             gestore_layout_pagina.visualizza_contenitore_cella()
-            gestore_visualizzazione_dati.visualizza_grafico_torta(record_simulati)
+            gestore_visualizzazione_dati.visualizza_grafico_torta(record_simulati, aggregati_simulati.netto_scarto())
             gestore_layout_pagina.chiudi_contenitore_cella()
 
         with row1[2]:
             gestore_layout_pagina.visualizza_contenitore_cella()
-            gestore_visualizzazione_dati.visualizza_grafico_barre(record_simulati)
+            gestore_visualizzazione_dati.visualizza_grafico_barre(record_simulati, aggregati_simulati.netto_scarto())
             gestore_layout_pagina.chiudi_contenitore_cella()
 
         with row2[0]:
             gestore_layout_pagina.visualizza_contenitore_cella()
-            gestore_visualizzazione_dati.visualizza_grafico_costi(record_simulati)
+            gestore_visualizzazione_dati.visualizza_grafico_costi(record_simulati, aggregati_simulati.sommario_costi())
             gestore_layout_pagina.chiudi_contenitore_cella()
 
         with row2[1]:
             gestore_layout_pagina.visualizza_contenitore_cella()
-            gestore_visualizzazione_dati.visualizza_indicatore_qualita(record_simulati)
+            gestore_visualizzazione_dati.visualizza_indicatore_qualita(record_simulati, aggregati_simulati.indice_qualita())
             gestore_layout_pagina.chiudi_contenitore_cella()
 
         with row2[2]:
             gestore_layout_pagina.visualizza_contenitore_cella()
-            gestore_visualizzazione_dati.visualizza_grafico_temporale(record_simulati, data_inizio, data_fine)
+            gestore_visualizzazione_dati.visualizza_grafico_temporale(record_simulati, data_inizio, data_fine, aggregati_simulati.somme_giornaliere, aggregati_simulati, scarto, lavorazione)
             gestore_layout_pagina.chiudi_contenitore_cella()
     st.markdown('</div>', unsafe_allow_html=True)
 
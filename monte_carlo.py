@@ -0,0 +1,131 @@
+# Fi.Co? S.Vi.To.! A Fishing Company Simulation and Visualization Tool - Ver. 1.0"- monte_carlo.py
+
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from archivio_colonnare import arrotonda
+from rollup_campioni import inizio_periodo, periodi
+
+
+def somma_gruppi(matrice, gruppi, n_gruppi):
+    ''' Somma per gruppo ogni riga della matrice (una misura per riga) con un solo bincount, spostando i gruppi di ogni misura in un blocco separato; restituisce una matrice misure x gruppi. '''
+    n_misure = matrice.shape[0]
+    indice = (np.arange(n_misure)[:, None] * n_gruppi + gruppi[None, :]).ravel()
+    return np.bincount(indice, weights=matrice.ravel(), minlength=n_misure * n_gruppi).reshape(n_misure, n_gruppi)
+
+
+def riassumi_storie(generatore, elaboratore_dati, data_inizio, data_fine, livello, semi):
+    ''' Genera un gruppo di storie (una per seme) e le riassume: per ogni storia le somme dei valori di aggregazione per tipo e per periodo del livello. Funzione di modulo, così può essere inviata ai processi del pool. '''
+    etichette = periodi(data_inizio, data_fine, livello)
+    n_tipi = len(generatore.SPECIE)
+    misure, per_tipo, per_periodo = None, [], []
+    for seme in semi:
+        preparati = elaboratore_dati.prepara_dati_storici(generatore.genera(data_inizio, data_fine, seme))
+        valori = elaboratore_dati.valori_aggregazione(preparati)
+        valori["conteggio"] = np.ones(len(preparati))
+        misure = list(valori)
+        matrice = np.vstack(list(valori.values()))
+        periodo = np.searchsorted(etichette, inizio_periodo(preparati.colonna("data"), livello))
+        # il generatore usa sempre tutte le specie come categorie, quindi i codici del tipo sono gli stessi in ogni storia
+        per_tipo.append(somma_gruppi(matrice, preparati.colonna("tipo").astype(np.int64), n_tipi))
+        per_periodo.append(somma_gruppi(matrice, periodo, len(etichette)))
+    return misure, np.array(per_tipo), np.array(per_periodo)
+
+
+class SimulazioneMonteCarlo:
+    ''' Simulazione Monte Carlo degli indicatori: genera N storie indipendenti con il generatore vettoriale (seed derivati da un seed comune, eventualmente in un pool di processi), le riassume per tipo e per periodo e ne ricava medie e bande di percentili. Le somme delle storie vengono conservate per intervallo, livello, N e seed; gli slider si applicano dopo, in forma chiusa, senza rigenerare le storie. '''
+    # Percentili delle bande (inferiore, mediana, superiore)
+    PERCENTILI = (5, 50, 95)
+    # Storie per processo sotto le quali non conviene avviare un pool
+    MIN_STORIE_PER_PROCESSO = 100
+
+    def __init__(self, generatore, elaboratore_dati, processi=None, max_voci=8):
+        self.generatore = generatore
+        self.elaboratore_dati = elaboratore_dati
+        self.processi = processi
+        self.max_voci = max_voci
+        self.voci = OrderedDict()
+        self.lock = threading.Lock()
+
+    def campioni(self, data_inizio, data_fine, livello, n_storie, seed):
+        ''' Restituisce le somme per tipo e per periodo delle N storie (misure, array storie x misure x tipi, array storie x misure x periodi), generandole solo se mancano. '''
+        chiave = (data_inizio, data_fine, livello, n_storie, seed)
+        with self.lock:
+            if chiave in self.voci:
+                self.voci.move_to_end(chiave)
+                return self.voci[chiave]
+        voce = self.genera_campioni(data_inizio, data_fine, livello, n_storie, seed)
+        with self.lock:
+            self.voci[chiave] = voce
+            while len(self.voci) > self.max_voci:
+                self.voci.popitem(last=False)
+        return voce
+
+    def genera_campioni(self, data_inizio, data_fine, livello, n_storie, seed):
+        ''' Genera e riassume le N storie, divise in gruppi tra i processi del pool; a parità di seed il risultato non dipende dal numero di processi. '''
+        semi = np.random.SeedSequence(seed).spawn(n_storie)
+        processi = min(self.processi or os.cpu_count() or 1, max(n_storie // self.MIN_STORIE_PER_PROCESSO, 1))
+        if processi == 1:
+            return riassumi_storie(self.generatore, self.elaboratore_dati, data_inizio, data_fine, livello, semi)
+        gruppi = [gruppo.tolist() for gruppo in np.array_split(np.array(semi, dtype=object), processi)]
+        with ProcessPoolExecutor(processi) as pool:
+            risultati = list(pool.map(
+                riassumi_storie,
+                [self.generatore] * processi, [self.elaboratore_dati] * processi,
+                [data_inizio] * processi, [data_fine] * processi, [livello] * processi, gruppi
+            ))
+        return risultati[0][0], np.concatenate([r[1] for r in risultati]), np.concatenate([r[2] for r in risultati])
+
+    def simula(self, misure, somme, riciclo, lavorazione):
+        ''' Applica gli slider alle somme (array con le misure sul penultimo asse) con la simulazione in forma chiusa; con entrambi gli slider a zero restano i valori storici, come nella dashboard. '''
+        somme = {misura: somme[..., i, :] for i, misura in enumerate(misure)}
+        if riciclo == 0 and lavorazione == 0:
+            return somme
+        return self.elaboratore_dati.simula_somme(somme, riciclo, lavorazione)
+
+    def bande(self, data_inizio, data_fine, livello, n_storie=1000, seed=0, riciclo=0, lavorazione=0):
+        ''' Restituisce media e percentili sulle N storie degli indicatori del footer (netto e scarto totali, costo, utile e prezzo finale medi, indice di qualità globale) e, per ogni periodo del livello, di quantità, prezzo medio e qualità media. '''
+        misure, per_tipo, per_periodo = self.campioni(data_inizio, data_fine, livello, n_storie, seed)
+        somme = self.simula(misure, per_tipo, riciclo, lavorazione)
+        conteggi = somme["conteggio"]
+        presenti = conteggi > 0
+        n_presenti = np.maximum(presenti.sum(axis=1), 1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            def media_per_tipo(campo):
+                # come nel sommario costi: media per tipo, poi media delle medie sui tipi presenti nella storia
+                return np.where(presenti, somme[campo] / conteggi, 0).sum(axis=1) / n_presenti
+            indicatori = {
+                "netto": somme["netto"].sum(axis=1),
+                "scarto": somme["scarto"].sum(axis=1),
+                "costo_produzione": media_per_tipo("costo_produzione"),
+                "utile_lordo": media_per_tipo("utile_lordo"),
+                "prezzo_finale": media_per_tipo("prezzo_finale"),
+                "qualita": arrotonda(np.where(presenti, arrotonda(somme["qualita"] / conteggi), 0).sum(axis=1) / n_presenti)
+            }
+            somme_periodi = self.simula(misure, per_periodo, riciclo, lavorazione)
+            conteggi_periodi = somme_periodi["conteggio"]
+            metriche_periodi = {
+                "quantita": somme_periodi["kg"],
+                "prezzo_medio": np.where(conteggi_periodi > 0, somme_periodi["prezzo_medio"] / conteggi_periodi, 0),
+                "qualita_media": np.where(conteggi_periodi > 0, somme_periodi["qualita"] / conteggi_periodi, 0)
+            }
+        etichette = periodi(data_inizio, data_fine, livello)
+        if len(etichette):
+            # come in ricampiona_serie: il primo periodo è etichettato con la data di inizio
+            etichette[0] = max(etichette[0], np.datetime64(data_inizio, "D"))
+        serie = {"data": etichette.tolist()}
+        serie.update({nome: self.statistiche(valori) for nome, valori in metriche_periodi.items()})
+        return {
+            "storie": n_storie,
+            "indicatori": {nome: {chiave: float(v) for chiave, v in self.statistiche(valori).items()} for nome, valori in indicatori.items()},
+            "serie": serie
+        }
+
+    def statistiche(self, valori):
+        ''' Media e percentili lungo l'asse delle storie. '''
+        percentili = np.percentile(valori, self.PERCENTILI, axis=0)
+        statistiche = {"media": valori.mean(axis=0)}
+        statistiche.update({f"p{p}": percentile for p, percentile in zip(self.PERCENTILI, percentili)})
+        return statistiche
@@ -0,0 +1,91 @@
+# Fi.Co? S.Vi.To.! A Fishing Company Simulation and Visualization Tool - Ver. 1.0"- ottimizzatore_simulazione.py
+
+import numpy as np
+from archivio_colonnare import arrotonda
+
+
+class OttimizzatoreSimulazione:
+    ''' Esplora tutte le combinazioni degli slider "Riciclo Scarti" e "Lavorazione Intensiva" (0-100% al passo indicato) con la simulazione in forma chiusa di ElaboratoreDati, su una griglia di scenari calcolata in un colpo solo per broadcasting; restituisce la frontiera di Pareto tra utile lordo, qualità e scarto e la combinazione migliore entro i vincoli. '''
+    def __init__(self, elaboratore_dati, passo=1):
+        self.elaboratore_dati = elaboratore_dati
+        self.passo = passo
+
+    def valuta(self, aggregati):
+        ''' Calcola per ogni scenario le metriche del footer (scarto totale, costo e utile medi del sommario costi, indice di qualità globale) a partire dagli aggregati storici; restituisce array di forma (riciclo, lavorazione). Il risultato viene memorizzato negli aggregati. '''
+        return aggregati.riepilogo(("scenari", self.passo), lambda: self.calcola_scenari(aggregati))
+
+    def calcola_scenari(self, aggregati):
+        ''' Calcolo vettoriale degli scenari: le somme per tipo vengono simulate per tutta la griglia con un'unica chiamata a simula_somme (forma riciclo x lavorazione x tipo). '''
+        passi = np.arange(0, 101, self.passo)
+        riciclo = passi[:, None, None]
+        lavorazione = passi[None, :, None]
+        forma = (len(passi), len(passi))
+        somme = self.elaboratore_dati.simula_somme(aggregati.somme, riciclo, lavorazione)
+        conteggi = np.asarray(aggregati.conteggi, dtype=np.float64)
+        scenari = {
+            "riciclo": np.broadcast_to(passi[:, None], forma),
+            "lavorazione": np.broadcast_to(passi[None, :], forma),
+            "scarto": np.broadcast_to(np.sum(somme["scarto"], axis=-1), forma).copy()
+        }
+        if len(conteggi):
+            # come nel sommario costi e nell'indice di qualità: media per tipo, poi media delle medie
+            with np.errstate(divide="ignore", invalid="ignore"):
+                scenari["costo_produzione"] = np.broadcast_to(np.mean(somme["costo_produzione"] / conteggi, axis=-1), forma).copy()
+                scenari["utile_lordo"] = np.broadcast_to(np.mean(somme["utile_lordo"] / conteggi, axis=-1), forma).copy()
+                qualita_per_tipo = np.where(conteggi > 0, arrotonda(somme["qualita"] / conteggi), 0)
+            # arrotonda dà lo stesso risultato di round() usato da indice_qualita anche sui valori a metà
+            scenari["qualita"] = np.broadcast_to(arrotonda(np.mean(qualita_per_tipo, axis=-1)), forma).copy()
+        else:
+            for campo in ("costo_produzione", "utile_lordo", "qualita"):
+                scenari[campo] = np.zeros(forma)
+        # con entrambi gli slider a zero la dashboard mostra i dati storici, non la formula della simulazione
+        costi = aggregati.sommario_costi().get("Media", {})
+        scenari["scarto"][0, 0] = aggregati.netto_scarto().get("Totale", {}).get("scarto", 0)
+        scenari["costo_produzione"][0, 0] = costi.get("costo_produzione", 0)
+        scenari["utile_lordo"][0, 0] = costi.get("utile_lordo", 0)
+        scenari["qualita"][0, 0] = aggregati.indice_qualita().get("globale", 0)
+        return scenari
+
+    def frontiera_pareto(self, scenari, qualita_minima=None, scarto_massimo=None):
+        ''' Restituisce gli indici (riciclo, lavorazione) degli scenari ammessi dai vincoli e non dominati: nessun altro scenario ha utile e qualità non inferiori e scarto non superiore, con almeno un valore diverso. Gli indici sono ordinati per utile decrescente. '''
+        utile = scenari["utile_lordo"].ravel()
+        qualita = scenari["qualita"].ravel()
+        scarto = scenari["scarto"].ravel()
+        ammessi = np.ones(len(utile), dtype=bool)
+        if qualita_minima is not None:
+            ammessi &= qualita >= qualita_minima
+        if scarto_massimo is not None:
+            ammessi &= scarto <= scarto_massimo
+        candidati = np.flatnonzero(ammessi)
+        if not len(candidati):
+            return np.empty((0, 2), dtype=np.int64)
+        # ordino per utile decrescente, poi qualità decrescente e scarto crescente: chi domina uno scenario viene sempre prima
+        candidati = candidati[np.lexsort((scarto[candidati], -qualita[candidati], -utile[candidati]))]
+        livelli_qualita, rango = np.unique(-qualita[candidati], return_inverse=True)
+        # scarto minimo tra gli scenari già visti con qualità almeno pari a quella di ogni livello
+        scarto_minimo = np.full(len(livelli_qualita), np.inf)
+        frontiera = []
+        i = 0
+        while i < len(candidati):
+            # gli scenari con valori identici non si dominano tra loro: li controllo e li registro insieme
+            j = i + 1
+            while j < len(candidati) and utile[candidati[j]] == utile[candidati[i]] and qualita[candidati[j]] == qualita[candidati[i]] and scarto[candidati[j]] == scarto[candidati[i]]:
+                j += 1
+            livello = rango[i]
+            valore_scarto = scarto[candidati[i]]
+            if scarto_minimo[livello] > valore_scarto:
+                frontiera.extend(candidati[i:j].tolist())
+                np.minimum(scarto_minimo[livello:], valore_scarto, out=scarto_minimo[livello:])
+            i = j
+        return np.column_stack(np.unravel_index(np.array(frontiera, dtype=np.int64), scenari["utile_lordo"].shape))
+
+    def ottimizza(self, aggregati, qualita_minima=None, scarto_massimo=None):
+        ''' Valuta tutti gli scenari e restituisce (frontiera, migliore): la frontiera di Pareto come lista di dizionari (riciclo, lavorazione e metriche), ordinata per utile decrescente, e lo scenario con l'utile lordo più alto entro i vincoli (None se nessuno li rispetta). '''
+        scenari = self.valuta(aggregati)
+        indici = self.frontiera_pareto(scenari, qualita_minima, scarto_massimo)
+        frontiera = [
+            {campo: float(valori[r, l]) if campo not in ("riciclo", "lavorazione") else int(valori[r, l]) for campo, valori in scenari.items()}
+            for r, l in indici.tolist()
+        ]
+        # lo scenario migliore è sempre sulla frontiera: è il primo (utile più alto, poi qualità più alta e scarto più basso)
+        return frontiera, (frontiera[0] if frontiera else None)
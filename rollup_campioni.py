@@ -0,0 +1,233 @@
+# Fi.Co? S.Vi.To.! A Fishing Company Simulation and Visualization Tool - Ver. 1.0"- rollup_campioni.py
+
+import numpy as np
+from archivio_colonnare import MANCANTE
+
+# Livelli temporali dei rollup, dal più fine al più grossolano
+LIVELLI = ("giorno", "settimana", "mese", "anno")
+# La chiave numerica di una riga è (periodo << 32) + ((tipo + 1) << 16) + (zona + 1): ordinata per periodo, tipo e zona (MANCANTE diventa 0)
+BIT_PERIODO = 32
+BIT_TIPO = 16
+MASCHERA_CODICE = 0xFFFF
+
+
+def inizio_periodo(giorni, livello):
+    ''' Riporta ogni giorno all'inizio del suo periodo: il giorno stesso, il lunedì della settimana, il primo del mese o dell'anno. '''
+    giorni = np.asarray(giorni, dtype="datetime64[D]")
+    if livello == "giorno":
+        return giorni
+    if livello == "settimana":
+        # il 1970-01-01 era un giovedì
+        return giorni - ((giorni.astype(np.int64) + 3) % 7).astype("timedelta64[D]")
+    if livello == "mese":
+        return giorni.astype("datetime64[M]").astype("datetime64[D]")
+    if livello == "anno":
+        return giorni.astype("datetime64[Y]").astype("datetime64[D]")
+    raise ValueError(f"Livello non supportato: {livello}")
+
+
+def fine_periodo(inizi, livello):
+    ''' Restituisce l'ultimo giorno dei periodi che iniziano nei giorni indicati. '''
+    inizi = np.asarray(inizi, dtype="datetime64[D]")
+    if livello == "giorno":
+        return inizi
+    if livello == "settimana":
+        return inizi + 6
+    if livello == "mese":
+        return (inizi.astype("datetime64[M]") + 1).astype("datetime64[D]") - 1
+    if livello == "anno":
+        return (inizi.astype("datetime64[Y]") + 1).astype("datetime64[D]") - 1
+    raise ValueError(f"Livello non supportato: {livello}")
+
+
+def periodi(inizio, fine, livello):
+    ''' Restituisce gli inizi di tutti i periodi del livello che toccano l'intervallo [inizio, fine]. '''
+    primo = inizio_periodo(inizio, livello)
+    ultimo = inizio_periodo(fine, livello)
+    if livello == "settimana":
+        return np.arange(primo, ultimo + 1, 7)
+    if livello in ("mese", "anno"):
+        unita = "datetime64[M]" if livello == "mese" else "datetime64[Y]"
+        return np.arange(primo.astype(unita), ultimo.astype(unita) + 1).astype("datetime64[D]")
+    return np.arange(primo, ultimo + 1)
+
+
+def segmenti(inizio, fine, livelli=("anno", "mese", "giorno")):
+    ''' Scompone l'intervallo [inizio, fine] in tratti di periodi interi, ognuno al livello più grossolano possibile: (livello, inizio del primo periodo, inizio dell'ultimo). Al più un tratto di anni, due di mesi e due di giorni. '''
+    inizio = np.datetime64(inizio, "D")
+    fine = np.datetime64(fine, "D")
+    if inizio > fine:
+        return []
+    livello = livelli[0]
+    if len(livelli) == 1:
+        return [(livello, inizio, fine)]
+    # primo periodo che inizia da inizio in poi e ultimo periodo che finisce entro fine
+    primo = inizio_periodo(inizio, livello)[()]
+    if primo < inizio:
+        primo = fine_periodo(primo, livello)[()] + 1
+    ultimo = inizio_periodo(fine, livello)[()]
+    if fine_periodo(ultimo, livello)[()] > fine:
+        ultimo = inizio_periodo(ultimo - 1, livello)[()]
+    if primo > ultimo:
+        return segmenti(inizio, fine, livelli[1:])
+    return (
+        segmenti(inizio, primo - 1, livelli[1:])
+        + [(livello, primo, ultimo)]
+        + segmenti(fine_periodo(ultimo, livello)[()] + 1, fine, livelli[1:])
+    )
+
+
+class RollupCampioni:
+    ''' Tabelle di riepilogo (rollup) dei campioni per periodo, tipo e zona a quattro risoluzioni (giorno, settimana, mese, anno): per ogni combinazione presente, numero di campioni e somme delle misure. Le tabelle non vengono mai modificate: gli aggiornamenti restituiscono un nuovo rollup, così chi sta leggendo quello vecchio resta coerente. '''
+    def __init__(self, tipi, zone, tabelle):
+        self.tipi = list(tipi)
+        self.zone = list(zone)
+        self.tabelle = tabelle
+        self.misure = [campo for campo in tabelle["giorno"] if campo not in ("chiave", "conteggio")]
+
+    @classmethod
+    def da_archivio(cls, archivio, valori, tipi=None, zone=None, segno=1):
+        ''' Costruisce il rollup dai record di un archivio e dai loro valori (ElaboratoreDati.valori_aggregazione); tipi e zone fissano i codici delle categorie (i nomi nuovi vengono aggiunti in coda). Con segno=-1 il rollup sottrae i record (es. righe storiche sostituite). '''
+        tipi = list(tipi or [])
+        zone = list(zone or [])
+        codici_tipo = cls.ricodifica(archivio, "tipo", tipi)
+        codici_zona = cls.ricodifica(archivio, "zona", zone)
+        giorni = archivio.colonna("data")
+        # i record senza data non appartengono a nessun periodo
+        con_data = ~np.isnat(giorni)
+        if not con_data.all():
+            giorni, codici_tipo, codici_zona = giorni[con_data], codici_tipo[con_data], codici_zona[con_data]
+            valori = {misura: v[con_data] for misura, v in valori.items()}
+        tabelle = {}
+        for livello in LIVELLI:
+            chiavi = cls.chiave(inizio_periodo(giorni, livello), codici_tipo, codici_zona)
+            uniche, inverso = np.unique(chiavi, return_inverse=True)
+            tabella = {"chiave": uniche, "conteggio": segno * np.bincount(inverso, minlength=len(uniche))}
+            for misura, v in valori.items():
+                tabella[misura] = segno * np.bincount(inverso, weights=v, minlength=len(uniche))
+            tabelle[livello] = tabella
+        return cls(tipi, zone, tabelle)
+
+    @staticmethod
+    def ricodifica(archivio, campo, nomi):
+        ''' Riporta i codici di un campo categorico dell'archivio sulla lista di nomi indicata, aggiungendo in coda i nomi che mancano. '''
+        codici = archivio.colonna(campo)
+        if codici is None:
+            return np.full(len(archivio), MANCANTE, dtype=np.int64)
+        rimappa = []
+        for nome in archivio.categorie.get(campo, []):
+            if nome not in nomi:
+                nomi.append(nome)
+            rimappa.append(nomi.index(nome))
+        # il codice MANCANTE legge l'ultima cella
+        rimappa = np.array(rimappa + [MANCANTE], dtype=np.int64)
+        return rimappa[codici]
+
+    @staticmethod
+    def chiave(periodi_inizio, codici_tipo, codici_zona):
+        ''' Chiave numerica delle righe: periodo, poi tipo, poi zona. '''
+        return (
+            (periodi_inizio.astype(np.int64) << BIT_PERIODO)
+            + ((np.asarray(codici_tipo, dtype=np.int64) + 1) << BIT_TIPO)
+            + (np.asarray(codici_zona, dtype=np.int64) + 1)
+        )
+
+    def unisci(self, altro):
+        ''' Restituisce un nuovo rollup con le somme di questo e di altro (es. i giorni aggiunti allo storico, o un rollup di sottrazione); altro deve usare gli stessi codici, cioè essere costruito con tipi=self.tipi e zone=self.zone. Le righe rimaste senza campioni e con tutte le somme a zero vengono eliminate. '''
+        tabelle = {}
+        for livello in LIVELLI:
+            mia, sua = self.tabelle[livello], altro.tabelle[livello]
+            posizione = np.searchsorted(mia["chiave"], sua["chiave"])
+            presente = np.zeros(len(posizione), dtype=bool)
+            dentro = posizione < len(mia["chiave"])
+            presente[dentro] = mia["chiave"][posizione[dentro]] == sua["chiave"][dentro]
+            tabella = {}
+            for campo in mia:
+                colonna = mia[campo].copy()
+                if campo != "chiave":
+                    # le chiavi di altro sono uniche: ogni riga esistente riceve al più un contributo
+                    colonna[posizione[presente]] += sua[campo][presente]
+                tabella[campo] = np.insert(colonna, posizione[~presente], sua[campo][~presente])
+            # un campione manuale che sostituisce una riga storica della stessa zona lascia il conteggio a zero ma non le somme: la riga resta
+            vuote = tabella["conteggio"] == 0
+            for misura in self.misure:
+                vuote &= tabella[misura] == 0
+            if vuote.any():
+                tabella = {campo: colonna[~vuote] for campo, colonna in tabella.items()}
+            tabelle[livello] = tabella
+        return RollupCampioni(altro.tipi, altro.zone, tabelle)
+
+    def righe(self, livello, primo, ultimo):
+        ''' Restituisce l'intervallo [a, b) delle righe del livello con periodo tra primo e ultimo (inizi di periodo), con due ricerche binarie. '''
+        chiavi = self.tabelle[livello]["chiave"]
+        a = np.searchsorted(chiavi, np.int64(np.datetime64(primo, "D").astype(np.int64)) << BIT_PERIODO)
+        b = np.searchsorted(chiavi, np.int64(np.datetime64(ultimo, "D").astype(np.int64) + 1) << BIT_PERIODO)
+        return int(a), int(b)
+
+    def totali_per_tipo(self, inizio, fine):
+        ''' Numero di campioni e somme delle misure per tipo nell'intervallo [inizio, fine], come array indicizzati per codice del tipo + 1 (0 = tipo mancante). Il costo dipende dal numero di tratti dell'intervallo (al più cinque), non dai giorni né dai campioni. '''
+        n = len(self.tipi) + 1
+        conteggi = np.zeros(n)
+        somme = {misura: np.zeros(n) for misura in self.misure}
+        for livello, primo, ultimo in segmenti(inizio, fine):
+            a, b = self.righe(livello, primo, ultimo)
+            tabella = self.tabelle[livello]
+            indice = (tabella["chiave"][a:b] >> BIT_TIPO) & MASCHERA_CODICE
+            conteggi += np.bincount(indice, weights=tabella["conteggio"][a:b], minlength=n)
+            for misura in self.misure:
+                somme[misura] += np.bincount(indice, weights=tabella[misura][a:b], minlength=n)
+        return np.rint(conteggi).astype(np.int64), somme
+
+    def serie(self, inizio, fine, livello):
+        ''' Serie temporale al livello indicato su [inizio, fine], sommata su tipi e zone, nel formato delle somme giornaliere (il primo periodo è etichettato con inizio, come in ricampiona_serie). I periodi interi si leggono dalla tabella del livello, solo i due periodi di bordo parziali da totali_per_tipo. '''
+        etichette = periodi(inizio, fine, livello)
+        conteggi = np.zeros(len(etichette))
+        somme = {misura: np.zeros(len(etichette)) for misura in self.misure}
+        interi = (etichette >= np.datetime64(inizio, "D")) & (fine_periodo(etichette, livello) <= np.datetime64(fine, "D"))
+        if interi.any():
+            indici_interi = np.flatnonzero(interi)
+            a, b = self.righe(livello, etichette[indici_interi[0]], etichette[indici_interi[-1]])
+            tabella = self.tabelle[livello]
+            indice = np.searchsorted(etichette, (tabella["chiave"][a:b] >> BIT_PERIODO).astype("datetime64[D]"))
+            conteggi += np.bincount(indice, weights=tabella["conteggio"][a:b], minlength=len(etichette))
+            for misura in self.misure:
+                somme[misura] += np.bincount(indice, weights=tabella[misura][a:b], minlength=len(etichette))
+        for i in np.flatnonzero(~interi):
+            bordo_inizio = max(etichette[i], np.datetime64(inizio, "D"))
+            bordo_fine = min(fine_periodo(etichette[i], livello)[()], np.datetime64(fine, "D"))
+            conteggi_bordo, somme_bordo = self.totali_per_tipo(bordo_inizio, bordo_fine)
+            conteggi[i] += conteggi_bordo.sum()
+            for misura in self.misure:
+                somme[misura][i] += somme_bordo[misura].sum()
+        if len(etichette):
+            etichette[0] = max(etichette[0], np.datetime64(inizio, "D"))
+        return dict(somme, data=etichette, conteggio=np.rint(conteggi).astype(np.int64))
+
+
+class RollupUnione:
+    ''' Rollup dello storico più un rollup di sovrapposizione con le stesse categorie (eventualmente estese in coda): le interrogazioni sommano i due risultati, senza copiare le tabelle dello storico. '''
+    def __init__(self, base, sovrapposizione):
+        self.base = base
+        self.sovrapposizione = sovrapposizione
+        self.tipi = sovrapposizione.tipi
+        self.zone = sovrapposizione.zone
+        self.misure = base.misure
+
+    def totali_per_tipo(self, inizio, fine):
+        ''' Come RollupCampioni.totali_per_tipo, sui dati uniti. '''
+        conteggi, somme = self.base.totali_per_tipo(inizio, fine)
+        conteggi_sovrapposti, somme_sovrapposte = self.sovrapposizione.totali_per_tipo(inizio, fine)
+        # i tipi aggiunti dalla sovrapposizione sono in coda
+        estensione = len(conteggi_sovrapposti) - len(conteggi)
+        conteggi = np.pad(conteggi, (0, estensione)) + conteggi_sovrapposti
+        somme = {misura: np.pad(somme[misura], (0, estensione)) + somme_sovrapposte[misura] for misura in self.misure}
+        return conteggi, somme
+
+    def serie(self, inizio, fine, livello):
+        ''' Come RollupCampioni.serie, sui dati uniti. '''
+        serie = self.base.serie(inizio, fine, livello)
+        serie_sovrapposta = self.sovrapposizione.serie(inizio, fine, livello)
+        for campo in serie:
+            if campo != "data":
+                serie[campo] = serie[campo] + serie_sovrapposta[campo]
+        return serie
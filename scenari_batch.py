@@ -0,0 +1,254 @@
+# Fi.Co? S.Vi.To.! A Fishing Company Simulation and Visualization Tool - Ver. 1.0"- scenari_batch.py
+
+import os
+import sys
+import csv
+import json
+import time
+import shutil
+import tempfile
+import itertools
+from datetime import date
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+from archivio_colonnare import ArchivioColonnare
+from business_logic import ElaboratoreDati, VistaUnita
+from giornale_campioni import GiornaleCampioni
+
+# Esecuzione di scenari di simulazione senza interfaccia: nessun import di streamlit, folium o geopandas (niente data_viz, input o crea_mappa_zone_pesca)
+
+# Colonne dei risultati, nell'ordine in cui vengono scritte
+CAMPI_RISULTATO = (
+    "indice", "nome", "data_inizio", "data_fine", "riciclo", "lavorazione", "prezzi", "campioni",
+    "netto", "scarto", "costo_produzione", "utile_lordo", "prezzo_finale", "qualita",
+    "delta_scarto_pct", "delta_costo_pct", "delta_utile_pct", "delta_qualita_pct", "secondi"
+)
+
+# Archivio condiviso dal processo (caricato una volta da inizializza_processo, mappato in memoria)
+archivio_processo = None
+
+
+def inizializza_processo(percorso_archivio):
+    ''' Carica l'archivio condiviso in un processo del pool: con la mappatura in memoria tutti i processi leggono le stesse pagine del file, senza copie. '''
+    global archivio_processo
+    archivio_processo = ArchivioColonnare.carica(percorso_archivio)
+
+
+def esegui_scenario(indice, scenario):
+    ''' Esegue uno scenario nel processo corrente (funzione di modulo, così può essere inviata ai processi). '''
+    return EsecutoreScenari.calcola(archivio_processo, indice, scenario)
+
+
+class EsecutoreScenari:
+    ''' Esegue in batch scenari di simulazione (intervallo di date, riciclo, lavorazione, tabella prezzi) su un unico archivio condiviso, in un pool di processi, e scrive i risultati man mano che arrivano. '''
+    def __init__(self, percorso_archivio="historical_data.bin", percorso_manuali=None, processi=None):
+        self.percorso_archivio = percorso_archivio
+        self.percorso_manuali = percorso_manuali
+        self.processi = processi
+
+    @staticmethod
+    def leggi_scenari(percorso):
+        ''' Legge il file degli scenari: JSON lines (uno scenario per riga), lista JSON di scenari, oppure oggetto JSON con "scenari", "griglia" (prodotto di intervalli, riciclo, lavorazione e prezzi) e "tabelle_prezzi" (tabelle richiamabili per nome). '''
+        with open(percorso, "r") as f:
+            if percorso.endswith(".jsonl"):
+                return [json.loads(riga) for riga in f if riga.strip()]
+            contenuto = json.load(f)
+        if isinstance(contenuto, list):
+            return contenuto
+        tabelle = contenuto.get("tabelle_prezzi", {})
+        scenari = list(contenuto.get("scenari", []))
+        griglia = contenuto.get("griglia")
+        if griglia:
+            for (inizio, fine), riciclo, lavorazione, prezzi in itertools.product(
+                griglia.get("intervalli", [[None, None]]),
+                griglia.get("riciclo", [0]),
+                griglia.get("lavorazione", [0]),
+                griglia.get("prezzi", [None])
+            ):
+                nome = f"{inizio or 'inizio'}/{fine or 'fine'} riciclo {riciclo}% lavorazione {lavorazione}% prezzi {prezzi if isinstance(prezzi, str) else 'storici' if not prezzi else 'personalizzati'}"
+                scenari.append({"nome": nome, "data_inizio": inizio, "data_fine": fine, "riciclo": riciclo, "lavorazione": lavorazione, "prezzi": prezzi})
+        # le tabelle prezzi indicate per nome vengono risolte qui, così ogni scenario è autosufficiente
+        for scenario in scenari:
+            if isinstance(scenario.get("prezzi"), str):
+                nome_tabella = scenario["prezzi"]
+                if nome_tabella not in tabelle:
+                    raise ValueError(f"Tabella prezzi non definita: {nome_tabella}")
+                scenario["nome_prezzi"] = nome_tabella
+                scenario["prezzi"] = tabelle[nome_tabella]
+        return scenari
+
+    @staticmethod
+    def applica_prezzi(archivio, prezzi):
+        ''' Sostituisce il prezzo medio dei campioni con quello della tabella: {specie: prezzo} oppure {specie: {anno: prezzo}}; le specie e gli anni non indicati restano invariati, una specie che non esiste nell'archivio è un errore. '''
+        nomi = archivio.categorie.get("tipo", [])
+        EsecutoreScenari.verifica_specie(prezzi, nomi)
+        prezzo_medio = archivio.colonna("prezzo_medio")
+        prezzo_medio = np.full(len(archivio), np.nan) if prezzo_medio is None else prezzo_medio.copy()
+        codici = archivio.colonna("tipo")
+        anni = archivio.colonna("data").astype("datetime64[Y]").astype(np.int64) + 1970
+        for specie, valore in prezzi.items():
+            della_specie = codici == nomi.index(specie)
+            if isinstance(valore, dict):
+                for anno, prezzo in valore.items():
+                    prezzo_medio[della_specie & (anni == int(anno))] = prezzo
+            else:
+                prezzo_medio[della_specie] = valore
+        return archivio.con_colonne(prezzo_medio=prezzo_medio)
+
+    @staticmethod
+    def verifica_specie(prezzi, nomi, nome_scenario=None):
+        ''' Solleva ValueError se la tabella prezzi indica specie che non esistono nell'archivio (ad esempio "Tonno" invece di "Tonno rosso"): altrimenti lo scenario darebbe gli stessi risultati dei prezzi storici. '''
+        sconosciute = [specie for specie in prezzi if specie not in nomi]
+        if sconosciute:
+            origine = f" nello scenario '{nome_scenario}'" if nome_scenario else ""
+            raise ValueError(f"Specie non presenti nell'archivio{origine}: {', '.join(sconosciute)} (disponibili: {', '.join(nomi)})")
+
+    @classmethod
+    def calcola(cls, archivio, indice, scenario):
+        ''' Calcola uno scenario: seleziona l'intervallo di date, applica la tabella prezzi, prepara i record, ne calcola gli aggregati e li simula in forma chiusa (simula_aggregati, come la dashboard) e ne restituisce le metriche del footer con le variazioni rispetto allo storico. '''
+        inizio = time.perf_counter()
+        elaboratore_dati = ElaboratoreDati()
+        data_inizio = scenario.get("data_inizio")
+        data_fine = scenario.get("data_fine")
+        riciclo = scenario.get("riciclo", 0)
+        lavorazione = scenario.get("lavorazione", 0)
+        # senza date uso tutto l'archivio
+        data_inizio = date.fromisoformat(data_inizio) if data_inizio else archivio.ordina_per_data().colonna("data")[0].item()
+        data_fine = date.fromisoformat(data_fine) if data_fine else archivio.ultima_data()
+        record = archivio.intervallo_date(data_inizio, data_fine)
+        if scenario.get("prezzi"):
+            record = cls.applica_prezzi(record, scenario["prezzi"])
+        aggregati_base = elaboratore_dati.calcola_aggregati(elaboratore_dati.prepara_dati_storici(record))
+        # stessa simulazione della dashboard: uno scenario dà gli stessi valori mostrati dagli slider
+        aggregati_simulati = elaboratore_dati.simula_aggregati(aggregati_base, riciclo, lavorazione)
+        costi_base = aggregati_base.sommario_costi()["Media"]
+        costi_simulati = aggregati_simulati.sommario_costi()["Media"]
+        totale = aggregati_simulati.netto_scarto()["Totale"]
+        qualita = aggregati_simulati.indice_qualita()["globale"]
+        delta = elaboratore_dati.calcola_delta_footer(
+            {
+                "scarto": aggregati_base.netto_scarto()["Totale"]["scarto"],
+                "costo": costi_base["costo_produzione"],
+                "utile": costi_base["utile_lordo"],
+                "qualita": aggregati_base.indice_qualita()["globale"]
+            },
+            {"scarto": totale["scarto"], "costo": costi_simulati["costo_produzione"], "utile": costi_simulati["utile_lordo"], "qualita": qualita}
+        )
+        return {
+            "indice": indice,
+            "nome": scenario.get("nome", f"scenario_{indice}"),
+            "data_inizio": data_inizio.isoformat() if data_inizio else None,
+            "data_fine": data_fine.isoformat() if data_fine else None,
+            "riciclo": riciclo,
+            "lavorazione": lavorazione,
+            "prezzi": scenario.get("nome_prezzi", "personalizzati" if scenario.get("prezzi") else "storici"),
+            "campioni": len(record),
+            "netto": round(totale["netto"], 2),
+            "scarto": round(totale["scarto"], 2),
+            "costo_produzione": round(costi_simulati["costo_produzione"], 4),
+            "utile_lordo": round(costi_simulati["utile_lordo"], 4),
+            "prezzo_finale": round(costi_simulati["prezzo_finale"], 4),
+            "qualita": qualita,
+            "delta_scarto_pct": delta["scarto_pct"],
+            "delta_costo_pct": delta["costo_produzione"],
+            "delta_utile_pct": delta["utile_lordo"],
+            "delta_qualita_pct": delta["qualita"],
+            "secondi": round(time.perf_counter() - inizio, 4)
+        }
+
+    def leggi_manuali(self):
+        ''' Legge i record manuali: dal giornale JSON lines oppure dal vecchio file JSON. '''
+        if self.percorso_manuali.endswith(".jsonl"):
+            return GiornaleCampioni(self.percorso_manuali, ElaboratoreDati().chiave_record).leggi()
+        with open(self.percorso_manuali, "r") as f:
+            return json.load(f)
+
+    def prepara_archivio(self, cartella):
+        ''' Restituisce il percorso dell'archivio binario da condividere con i processi: quello indicato se è già un archivio binario senza record manuali da unire, altrimenti un file temporaneo nella cartella con lo storico (anche da JSON) unito ai record manuali. '''
+        if self.percorso_archivio.endswith(".json"):
+            with open(self.percorso_archivio, "r") as f:
+                archivio = ArchivioColonnare.da_record(json.load(f))
+        else:
+            if not self.percorso_manuali:
+                return self.percorso_archivio
+            archivio = ArchivioColonnare.carica(self.percorso_archivio)
+        if self.percorso_manuali:
+            archivio = VistaUnita(ElaboratoreDati()).unisci(archivio, self.leggi_manuali()).archivio()
+        percorso = os.path.join(cartella, "archivio_scenari.bin")
+        archivio.ordina_per_data().salva(percorso)
+        return percorso
+
+    def esegui(self, scenari):
+        ''' Esegue gli scenari e restituisce i risultati man mano che vengono completati (non necessariamente nell'ordine del file: ogni risultato riporta il suo indice). '''
+        cartella = tempfile.mkdtemp(prefix="scenari_")
+        try:
+            percorso = self.prepara_archivio(cartella)
+            # controllo le tabelle prezzi di tutti gli scenari prima di avviarli, così un errore non interrompe il batch a metà
+            nomi = ArchivioColonnare.carica(percorso).categorie.get("tipo", [])
+            for indice, scenario in enumerate(scenari):
+                if scenario.get("prezzi"):
+                    self.verifica_specie(scenario["prezzi"], nomi, scenario.get("nome", f"scenario_{indice}"))
+            processi = min(self.processi or os.cpu_count() or 1, max(len(scenari), 1))
+            if processi == 1:
+                archivio = ArchivioColonnare.carica(percorso)
+                for indice, scenario in enumerate(scenari):
+                    yield self.calcola(archivio, indice, scenario)
+            else:
+                with ProcessPoolExecutor(processi, initializer=inizializza_processo, initargs=(percorso,)) as pool:
+                    futuri = [pool.submit(esegui_scenario, indice, scenario) for indice, scenario in enumerate(scenari)]
+                    for futuro in as_completed(futuri):
+                        yield futuro.result()
+        finally:
+            shutil.rmtree(cartella, ignore_errors=True)
+
+
+class ScrittoreRisultati:
+    ''' Scrive i risultati degli scenari in CSV o in JSON lines, una riga alla volta e subito su disco, così un batch interrotto conserva i risultati già calcolati. '''
+    def __init__(self, file, formato="csv"):
+        self.file = file
+        self.formato = formato
+        self.csv = csv.DictWriter(file, fieldnames=CAMPI_RISULTATO) if formato == "csv" else None
+        if self.csv:
+            self.csv.writeheader()
+
+    def scrivi(self, risultato):
+        ''' Scrive un risultato. '''
+        if self.csv:
+            self.csv.writerow(risultato)
+        else:
+            self.file.write(json.dumps(risultato) + "\n")
+        self.file.flush()
+
+
+# Con main eseguo un file di scenari da riga di comando
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Esegue in batch scenari di simulazione (date, riciclo, lavorazione, prezzi) senza interfaccia.")
+    parser.add_argument("scenari", help="file degli scenari (.json o .jsonl)")
+    parser.add_argument("--archivio", default="historical_data.bin", help="archivio storico (.bin, oppure il vecchio .json)")
+    parser.add_argument("--manuali", default=None, help="record manuali da unire allo storico (manual_data.jsonl o manual_data.json)")
+    parser.add_argument("--output", default=None, help="file dei risultati, di default lo standard output")
+    parser.add_argument("--formato", choices=("csv", "jsonl"), default=None, help="formato dei risultati, di default dall'estensione di --output (altrimenti jsonl)")
+    parser.add_argument("--processi", type=int, default=None, help="processi del pool, di default uno per core")
+    args = parser.parse_args()
+
+    try:
+        scenari = EsecutoreScenari.leggi_scenari(args.scenari)
+    except ValueError as errore:
+        parser.error(str(errore))
+    formato = args.formato or ("csv" if args.output and args.output.endswith(".csv") else "jsonl")
+    uscita = open(args.output, "w", newline="") if args.output else sys.stdout
+    scrittore = ScrittoreRisultati(uscita, formato)
+    esecutore = EsecutoreScenari(args.archivio, args.manuali, args.processi)
+    inizio = time.perf_counter()
+    try:
+        for completati, risultato in enumerate(esecutore.esegui(scenari), 1):
+            scrittore.scrivi(risultato)
+            # avanzamento e tempo di ogni scenario sullo standard error, per non mescolarli ai risultati
+            print(f"[{completati}/{len(scenari)}] {risultato['nome']}: {risultato['secondi']:.3f} s", file=sys.stderr)
+    except ValueError as errore:
+        parser.error(str(errore))
+    finally:
+        if args.output:
+            uscita.close()
+    print(f"{len(scenari)} scenari eseguiti in {time.perf_counter() - inizio:.2f} s.", file=sys.stderr)
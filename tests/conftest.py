@@ -0,0 +1,48 @@
+# Fi.Co? S.Vi.To.! A Fishing Company Simulation and Visualization Tool - Ver. 1.0"- tests/conftest.py
+
+import os
+import sys
+import random
+from datetime import date
+import pytest
+
+# I moduli del progetto sono nella cartella principale, non in un pacchetto
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from archivio_colonnare import ArchivioColonnare
+from input import GeneratoreDatiStorici
+from generatore_vettoriale import GeneratoreVettoriale
+
+ZONE = ["Adriatico", "Tirreno", "Ionio"]
+SPECIE = ["Acciuga", "Sardina", "Tonno rosso"]
+PREZZI_STORICI = {
+    "Acciuga": {"2019": 2.72, "2020": 2.88},
+    "Sardina": {"2019": 0.96, "2020": 0.98},
+    "Tonno rosso": {"2019": 5.43, "2020": 5.50}
+}
+PESI_BASE = {"Acciuga": 1000, "Sardina": 1500, "Tonno rosso": 800}
+
+
+@pytest.fixture(scope="session")
+def generatore():
+    ''' Generatore vettoriale con le stesse zone e specie dello storico. '''
+    return GeneratoreVettoriale(ZONE, SPECIE, PREZZI_STORICI, PESI_BASE)
+
+
+@pytest.fixture(scope="session")
+def archivio_storico():
+    ''' Due anni di storico generato con un seed fisso, con poche zone e specie. '''
+    random.seed(7)
+    record = GeneratoreDatiStorici(ZONE, SPECIE, PREZZI_STORICI).genera_dati_storici(date(2019, 1, 1), date(2020, 12, 31))
+    return ArchivioColonnare.da_record(record)
+
+
+@pytest.fixture
+def record_manuali():
+    ''' Campioni inseriti a mano: campi facoltativi mancanti, utile e prezzo finale come totali, una specie nuova e un prezzo a zero. '''
+    return [
+        {"data": "2019-03-05", "tipo": "Acciuga", "zona": "Adriatico", "kg": 100, "netto": 80, "scarto": 20, "prezzo_medio": 5, "omogeneita": 3, "stress": 0, "utile": 0},
+        {"data": "2019-07-09", "tipo": "Pesce Nuovo", "kg": 50, "netto": 40, "scarto": 10, "prezzo_medio": 0, "stress": 3},
+        {"data": "2020-02-29", "tipo": "Sardina", "zona": "Ionio", "kg": 300, "netto": 270, "scarto": 30, "prezzo_medio": 1.1, "omogeneita": 1, "stress": 1, "utile": 450, "prezzo_finale": 650},
+        {"data": "2020-11-30", "tipo": "Tonno rosso", "zona": "Tirreno", "kg": 75.5, "netto": 70.25, "scarto": 5.25, "prezzo_medio": 6.2, "omogeneita": 2, "stress": 4, "utile": 1.35, "lat": 41.2, "lon": 12.1}
+    ]
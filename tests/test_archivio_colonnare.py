@@ -0,0 +1,201 @@
+# Fi.Co? S.Vi.To.! A Fishing Company Simulation and Visualization Tool - Ver. 1.0"- tests/test_archivio_colonnare.py
+
+import os
+from datetime import date, timedelta
+import numpy as np
+import pytest
+from archivio_colonnare import ArchivioColonnare, ScrittoreArchivio, ORDINE_CAMPI
+from business_logic import ElaboratoreDati
+
+
+def record_misti(archivio_storico, record_manuali):
+    ''' Un mese di storico seguito dai campioni manuali, come lista di dizionari. '''
+    return [r for r in archivio_storico.a_record() if r["data"] < "2019-02-01"] + record_manuali
+
+
+def confronta_record(attesi, ottenuti):
+    ''' Confronta due liste di record sui campi dell'archivio (i valori numerici a meno dell'errore di virgola mobile). '''
+    assert len(attesi) == len(ottenuti)
+    for atteso, ottenuto in zip(attesi, ottenuti):
+        atteso = {campo: valore for campo, valore in atteso.items() if campo in ORDINE_CAMPI}
+        assert set(atteso) == set(ottenuto)
+        for campo, valore in atteso.items():
+            if isinstance(valore, float):
+                assert ottenuto[campo] == pytest.approx(valore, abs=1e-9), campo
+            else:
+                assert ottenuto[campo] == valore, campo
+
+
+def test_da_record_a_record_conserva_i_record(record_manuali):
+    confronta_record(record_manuali, ArchivioColonnare.da_record(record_manuali).a_record())
+
+
+def test_archivio_vuoto():
+    archivio = ArchivioColonnare.da_record([])
+    assert len(archivio) == 0
+    assert archivio.a_record() == []
+    assert archivio.ultima_data() is None
+
+
+def test_preparazione_colonnare_uguale_ai_dizionari(archivio_storico, record_manuali):
+    elaboratore = ElaboratoreDati()
+    records = record_misti(archivio_storico, record_manuali)
+    attesi = elaboratore.prepara_dati_storici(records)
+    ottenuti = elaboratore.prepara_dati_storici(ArchivioColonnare.da_record(records)).a_record()
+    confronta_record(attesi, ottenuti)
+
+
+def test_riepiloghi_uguali_alla_somma_dei_record(archivio_storico, record_manuali):
+    elaboratore = ElaboratoreDati()
+    preparati = elaboratore.prepara_dati_storici(record_misti(archivio_storico, record_manuali))
+    # riferimento: un ciclo sui record, come le vecchie versioni a dizionari
+    netto, scarto, qualita, conteggi = {}, {}, {}, {}
+    for r in preparati:
+        tipo = r.get("tipo", "Altro")
+        netto[tipo] = netto.get(tipo, 0) + r["netto"]
+        scarto[tipo] = scarto.get(tipo, 0) + r["scarto"]
+        qualita[tipo] = qualita.get(tipo, 0) + r["qualita"]
+        conteggi[tipo] = conteggi.get(tipo, 0) + 1
+    netto_scarto = elaboratore.calcola_netto_scarto(ArchivioColonnare.da_record(preparati))
+    indice_qualita = elaboratore.calcola_indice_qualita(ArchivioColonnare.da_record(preparati))
+    assert list(netto_scarto) == list(netto) + ["Totale"]
+    for tipo in netto:
+        assert netto_scarto[tipo]["netto"] == pytest.approx(netto[tipo], abs=1e-9)
+        assert netto_scarto[tipo]["scarto"] == pytest.approx(scarto[tipo], abs=1e-9)
+        assert indice_qualita[tipo] == round(qualita[tipo] / conteggi[tipo], 2)
+    assert netto_scarto["Totale"]["netto"] == pytest.approx(sum(netto.values()), abs=1e-6)
+
+
+def test_metriche_giornaliere_colonnari_uguali_ai_dizionari(archivio_storico, record_manuali):
+    elaboratore = ElaboratoreDati()
+    preparati = elaboratore.prepara_dati_storici(record_misti(archivio_storico, record_manuali))
+    assert elaboratore.calcola_metriche_giornaliere(ArchivioColonnare.da_record(preparati)) == elaboratore.calcola_metriche_giornaliere(preparati)
+
+
+@pytest.mark.parametrize("frequenza", ["giorno", "settimana", "mese"])
+def test_serie_temporale_uguale_ai_gruppi_di_record(archivio_storico, frequenza):
+    elaboratore = ElaboratoreDati()
+    inizio, fine = date(2019, 1, 17), date(2019, 6, 30)
+    preparati = elaboratore.prepara_dati_storici([r for r in archivio_storico.a_record() if inizio.isoformat() <= r["data"] <= fine.isoformat()])
+    serie = elaboratore.calcola_serie_temporale(ArchivioColonnare.da_record(preparati), inizio, fine, frequenza)
+    # riferimento: i record raggruppati per periodo con un dizionario, ogni gruppo riassunto come un giorno del vecchio grafico
+    gruppi = {}
+    for r in preparati:
+        giorno = date.fromisoformat(r["data"])
+        if frequenza == "settimana":
+            giorno -= timedelta(days=giorno.weekday())
+        elif frequenza == "mese":
+            giorno = giorno.replace(day=1)
+        gruppi.setdefault(max(giorno, inizio), []).append(r)
+    for punto in serie:
+        if punto["data"] not in gruppi:
+            assert punto == {"data": punto["data"], "quantita": 0, "prezzo_medio": 0, "qualita_media": 0}
+            continue
+        atteso = elaboratore.calcola_metriche_giornaliere(gruppi[punto["data"]])
+        if frequenza == "giorno":
+            assert {k: v for k, v in punto.items() if k != "data"} == atteso
+        else:
+            assert {k: v for k, v in punto.items() if k != "data"} == pytest.approx(atteso, abs=0.0100001)
+    assert {punto["data"] for punto in serie} >= set(gruppi)
+
+
+@pytest.mark.parametrize("inizio, fine", [
+    (date(2019, 1, 1), date(2020, 12, 31)), (date(2019, 3, 5), date(2019, 3, 5)), (date(2020, 2, 28), date(2020, 3, 1)),
+    (date(2018, 1, 1), date(2019, 1, 10)), (date(2020, 12, 20), date(2021, 6, 1)), (date(2021, 1, 1), date(2021, 12, 31))
+])
+def test_intervallo_date_uguale_al_filtro(archivio_storico, record_manuali, inizio, fine):
+    # storico in ordine inverso e record manuali in coda: l'indice deve riordinare per data
+    record = archivio_storico.a_record()[::-1] + record_manuali
+    attesi = sorted((r for r in record if inizio.isoformat() <= r["data"] <= fine.isoformat()), key=lambda r: r["data"])
+    confronta_record(attesi, ArchivioColonnare.da_record(record).intervallo_date(inizio, fine).a_record())
+
+
+def confronta_archivi(atteso, ottenuto):
+    ''' Verifica che due archivi abbiano le stesse colonne (con gli stessi tipi), le stesse categorie e gli stessi valori. '''
+    assert len(ottenuto) == len(atteso)
+    assert ottenuto.categorie == atteso.categorie
+    assert set(ottenuto.colonne) == set(atteso.colonne)
+    for campo, colonna in atteso.colonne.items():
+        assert ottenuto.colonne[campo].dtype == colonna.dtype, campo
+        assert np.array_equal(ottenuto.colonne[campo], colonna, equal_nan=colonna.dtype.kind == "f"), campo
+
+
+@pytest.mark.parametrize("mappa_memoria", [True, False])
+def test_salva_carica_conserva_l_archivio(tmp_path, archivio_storico, record_manuali, mappa_memoria):
+    archivio = ArchivioColonnare.concatena([archivio_storico, ArchivioColonnare.da_record(record_manuali)])
+    percorso = str(tmp_path / "storico.bin")
+    archivio.salva(percorso)
+    caricato = ArchivioColonnare.carica(percorso, mappa_memoria=mappa_memoria)
+    confronta_archivi(archivio, caricato)
+    assert caricato.ordinato_per_data == archivio.ordinato_per_data
+
+
+def test_salva_carica_archivio_vuoto(tmp_path):
+    percorso = str(tmp_path / "vuoto.bin")
+    ArchivioColonnare.vuoto().salva(percorso)
+    caricato = ArchivioColonnare.carica(percorso)
+    assert len(caricato) == 0
+    assert caricato.a_record() == []
+
+
+def test_carica_rifiuta_un_file_non_valido(tmp_path):
+    percorso = tmp_path / "storico.bin"
+    percorso.write_text("[]")
+    with pytest.raises(ValueError):
+        ArchivioColonnare.carica(str(percorso))
+
+
+def test_scrittore_a_blocchi_uguale_alla_concatenazione(tmp_path, archivio_storico):
+    percorso = str(tmp_path / "storico.bin")
+    # blocchi mensili consecutivi (ordinati per data): l'archivio scritto resta ordinato
+    mesi = np.arange(np.datetime64("2019-01"), np.datetime64("2021-01"))
+    blocchi = [archivio_storico.intervallo_date(mese.astype("datetime64[D]"), (mese + 1).astype("datetime64[D]") - 1) for mese in mesi]
+    with ScrittoreArchivio(percorso, archivio_storico.categorie) as scrittore:
+        for blocco in blocchi:
+            scrittore.aggiungi(blocco)
+    caricato = ArchivioColonnare.carica(percorso)
+    confronta_archivi(archivio_storico, caricato)
+    assert caricato.ordinato_per_data
+
+
+def test_scrittore_con_soli_blocchi_vuoti_conserva_le_colonne(tmp_path, archivio_storico):
+    percorso = str(tmp_path / "vuoto.bin")
+    vuoto = archivio_storico.seleziona(slice(0, 0))
+    with ScrittoreArchivio(percorso, archivio_storico.categorie) as scrittore:
+        scrittore.aggiungi(vuoto)
+        scrittore.aggiungi(vuoto)
+    caricato = ArchivioColonnare.carica(percorso)
+    assert len(caricato) == 0
+    confronta_archivi(vuoto, caricato)
+
+
+def test_scrittore_annullato_lascia_intatto_l_archivio(tmp_path, archivio_storico):
+    percorso = str(tmp_path / "storico.bin")
+    archivio_storico.salva(percorso)
+    with pytest.raises(RuntimeError):
+        with ScrittoreArchivio(percorso, archivio_storico.categorie) as scrittore:
+            scrittore.aggiungi(archivio_storico.seleziona(slice(0, 10)))
+            raise RuntimeError("interrotto")
+    confronta_archivi(archivio_storico, ArchivioColonnare.carica(percorso))
+    assert os.listdir(tmp_path) == ["storico.bin"]
+
+
+def test_aggregati_uguali_per_archivio_e_lista(archivio_storico, record_manuali):
+    elaboratore = ElaboratoreDati()
+    preparati = elaboratore.prepara_dati_storici(record_misti(archivio_storico, record_manuali))
+    da_archivio = elaboratore.calcola_aggregati(ArchivioColonnare.da_record(preparati))
+    da_lista = elaboratore.calcola_aggregati(preparati)
+    assert da_archivio.netto_scarto() == da_lista.netto_scarto() == elaboratore.calcola_netto_scarto(preparati)
+    assert da_archivio.sommario_costi() == da_lista.sommario_costi() == elaboratore.calcola_sommario_costi(preparati)
+    assert da_archivio.indice_qualita() == da_lista.indice_qualita() == elaboratore.calcola_indice_qualita(preparati)
+    # i riepiloghi sono calcolati una volta sola e poi condivisi
+    assert da_archivio.netto_scarto() is da_archivio.netto_scarto()
+
+
+def test_ultima_data_ignora_le_date_mancanti(record_manuali):
+    senza_data = {k: v for k, v in record_manuali[0].items() if k != "data"}
+    assert ArchivioColonnare.da_record(record_manuali + [senza_data]).ultima_data() == date(2020, 11, 30)
+    # solo date mancanti, oppure nessuna colonna data: non c'è un'ultima data
+    assert ArchivioColonnare.da_record([senza_data]).ultima_data() is None
+    archivio = ArchivioColonnare.da_record(record_manuali)
+    assert ArchivioColonnare({campo: colonna for campo, colonna in archivio.colonne.items() if campo != "data"}, archivio.categorie).ultima_data() is None
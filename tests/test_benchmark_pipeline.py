@@ -0,0 +1,50 @@
+# Fi.Co? S.Vi.To.! A Fishing Company Simulation and Visualization Tool - Ver. 1.0"- tests/test_benchmark_pipeline.py
+
+import pytest
+from benchmark_pipeline import BenchmarkPipeline
+
+BASELINE = {"risultati": [
+    {"righe": 10000, "fase": "filtra_record_per_data", "secondi": 0.1, "picco_mb": 10.0},
+    {"righe": 10000, "fase": "rollup_dati", "secondi": 0.001, "picco_mb": None}
+]}
+
+
+@pytest.mark.parametrize("secondi, picco_mb, attese", [
+    (0.11, 10.5, []),                       # entro la soglia del 20%
+    (0.13, 10.0, ["secondi"]),
+    (0.1, 12.5, ["picco_mb"]),
+    (0.2, 20.0, ["secondi", "picco_mb"])
+])
+def test_regressioni_oltre_la_soglia(secondi, picco_mb, attese):
+    risultato = {"righe": 10000, "fase": "filtra_record_per_data", "secondi": secondi, "picco_mb": picco_mb}
+    assert [r["misura"] for r in BenchmarkPipeline.regressioni(risultato, BASELINE)] == attese
+
+
+def test_regressioni_ignorate_sotto_i_minimi_assoluti():
+    # tre volte più lenta, ma di pochi millisecondi: non è una regressione
+    assert BenchmarkPipeline.regressioni({"righe": 10000, "fase": "rollup_dati", "secondi": 0.003, "picco_mb": 5.0}, BASELINE) == []
+    assert BenchmarkPipeline.regressioni({"righe": 10000, "fase": "rollup_dati", "secondi": 0.01}, BASELINE)[0]["variazione_pct"] == 900.0
+    # dimensione o fase senza misura nella baseline
+    assert BenchmarkPipeline.regressioni({"righe": 99, "fase": "filtra_record_per_data", "secondi": 9.0}, BASELINE) == []
+
+
+def test_baseline_salvata_e_riletta(tmp_path):
+    percorso = str(tmp_path / "baseline.json")
+    assert BenchmarkPipeline.leggi_baseline(percorso) is None
+    BenchmarkPipeline.salva_baseline(percorso, BASELINE["risultati"])
+    baseline = BenchmarkPipeline.leggi_baseline(percorso)
+    assert baseline["risultati"] == BASELINE["risultati"]
+    assert baseline["ambiente"] == BenchmarkPipeline.ambiente()
+
+
+def test_fasi_non_valide():
+    with pytest.raises(ValueError, match="inesistente"):
+        BenchmarkPipeline(fasi=["inesistente"])
+
+
+def test_esegue_solo_le_fasi_scelte():
+    benchmark = BenchmarkPipeline(ripetizioni=1, memoria=False, fasi=["filtra_record_per_data", "aggregati_da_rollup"])
+    risultati = list(benchmark.esegui([2000]))
+    # le fasi da cui dipendono vengono eseguite ma non misurate
+    assert [r["fase"] for r in risultati] == ["filtra_record_per_data", "aggregati_da_rollup"]
+    assert all(r["righe"] == 2000 and r["secondi"] >= 0 and r["picco_mb"] is None for r in risultati)
@@ -0,0 +1,147 @@
+# Fi.Co? S.Vi.To.! A Fishing Company Simulation and Visualization Tool - Ver. 1.0"- tests/test_cache_caricamenti.py
+
+import os
+import threading
+import pytest
+from cache_caricamenti import CacheCaricamenti
+
+
+@pytest.fixture
+def percorso(tmp_path):
+    percorso = tmp_path / "dati.txt"
+    percorso.write_text("primo")
+    return str(percorso)
+
+
+class Lettore:
+    ''' Legge il file e conta le letture. '''
+    def __init__(self):
+        self.letture = 0
+
+    def __call__(self, percorso):
+        self.letture += 1
+        with open(percorso) as f:
+            return f.read()
+
+
+def test_contatori_hit_e_miss(percorso):
+    cache, lettore = CacheCaricamenti(), Lettore()
+    assert cache.carica(percorso, lettore) == "primo"
+    assert cache.carica(percorso, lettore) == "primo"
+    assert lettore.letture == 1
+    assert cache.statistiche() == {"hit": 1, "miss": 1, "invalidazioni": 0, "file": 1}
+
+
+def test_invalidazione_dopo_la_riscrittura(percorso):
+    cache, lettore = CacheCaricamenti(), Lettore()
+    cache.carica(percorso, lettore)
+    stato = os.stat(percorso)
+    # stessa dimensione e stessa data di modifica: senza invalidazione la firma non cambia
+    with open(percorso, "w") as f:
+        f.write("altro")
+    os.utime(percorso, ns=(stato.st_atime_ns, stato.st_mtime_ns))
+    assert cache.carica(percorso, lettore) == "primo"
+    cache.invalida(percorso)
+    assert cache.carica(percorso, lettore) == "altro"
+    assert lettore.letture == 2
+    assert cache.statistiche() == {"hit": 1, "miss": 2, "invalidazioni": 1, "file": 1}
+
+
+def test_invalida_tutti_i_file(tmp_path, percorso):
+    cache, lettore = CacheCaricamenti(), Lettore()
+    secondo = tmp_path / "secondo.txt"
+    secondo.write_text("secondo")
+    cache.carica(percorso, lettore)
+    cache.carica(str(secondo), lettore)
+    cache.invalida()
+    assert cache.statistiche()["file"] == 0
+    cache.carica(percorso, lettore)
+    assert lettore.letture == 3
+
+
+@pytest.mark.parametrize("modifica", ["dimensione", "data"])
+def test_firma_cambiata_rilegge_il_file(percorso, modifica):
+    cache, lettore = CacheCaricamenti(), Lettore()
+    cache.carica(percorso, lettore)
+    stato = os.stat(percorso)
+    if modifica == "dimensione":
+        with open(percorso, "w") as f:
+            f.write("secondo, più lungo")
+        os.utime(percorso, ns=(stato.st_atime_ns, stato.st_mtime_ns))
+    else:
+        with open(percorso, "w") as f:
+            f.write("altro")
+        os.utime(percorso, ns=(stato.st_atime_ns, stato.st_mtime_ns + 1_000_000))
+    assert cache.carica(percorso, lettore) != "primo"
+    assert lettore.letture == 2
+    assert cache.statistiche()["miss"] == 2
+
+
+def test_file_mancante(tmp_path):
+    cache = CacheCaricamenti()
+    assert cache.firma(str(tmp_path / "assente.txt")) is None
+
+
+def test_lettura_lenta_non_blocca_gli_altri_file(tmp_path, percorso):
+    cache = CacheCaricamenti()
+    secondo = tmp_path / "secondo.txt"
+    secondo.write_text("secondo")
+    iniziata, libera = threading.Event(), threading.Event()
+
+    def lettore_lento(percorso):
+        iniziata.set()
+        libera.wait(5)
+        return "lento"
+
+    risultati = []
+    lettura = threading.Thread(target=cache.carica, args=(percorso, lettore_lento))
+    lettura.start()
+    try:
+        assert iniziata.wait(5)
+        # mentre il primo file è in lettura, il secondo si carica senza aspettare
+        altra_lettura = threading.Thread(target=lambda: risultati.append(cache.carica(str(secondo), Lettore())), daemon=True)
+        altra_lettura.start()
+        altra_lettura.join(5)
+        assert risultati == ["secondo"]
+        assert lettura.is_alive()
+    finally:
+        libera.set()
+        lettura.join()
+    assert cache.carica(percorso, Lettore()) == "lento"
+
+
+def test_letture_concorrenti_dello_stesso_file(percorso):
+    cache = CacheCaricamenti()
+    letture, libera = [], threading.Event()
+
+    def lettore_lento(percorso):
+        letture.append(percorso)
+        libera.wait(5)
+        return "primo"
+
+    risultati = []
+    sessioni = [threading.Thread(target=lambda: risultati.append(cache.carica(percorso, lettore_lento))) for _ in range(4)]
+    for sessione in sessioni:
+        sessione.start()
+    libera.set()
+    for sessione in sessioni:
+        sessione.join()
+    assert risultati == ["primo"] * 4
+    assert len(letture) == 1
+    assert cache.statistiche()["miss"] == 1 and cache.statistiche()["hit"] == 3
+
+
+def test_invalidazione_durante_la_lettura(percorso):
+    cache = CacheCaricamenti()
+
+    def lettore_invalidato(percorso):
+        cache.invalida(percorso)
+        return "vecchio"
+
+    risultati = []
+    lettura = threading.Thread(target=lambda: risultati.append(cache.carica(percorso, lettore_invalidato)), daemon=True)
+    lettura.start()
+    lettura.join(5)
+    assert risultati == ["vecchio"]
+    # il valore letto prima dell'invalidazione non resta in cache
+    assert cache.carica(percorso, Lettore()) == "primo"
@@ -0,0 +1,84 @@
+# Fi.Co? S.Vi.To.! A Fishing Company Simulation and Visualization Tool - Ver. 1.0"- tests/test_cache_grafici.py
+
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+import pytest
+from cache_grafici import CacheGrafici
+
+
+class Disegno:
+    ''' Disegna un grafico a barre dei dati e conta le figure disegnate. '''
+    def __init__(self):
+        self.figure = 0
+
+    def __call__(self, dati):
+        self.figure += 1
+        fig, ax = plt.subplots()
+        ax.bar(range(len(dati)), dati)
+        return fig
+
+
+@pytest.fixture(autouse=True)
+def chiudi_figure():
+    plt.close("all")
+    yield
+    plt.close("all")
+
+
+def test_hit_non_ridisegna():
+    cache, disegna = CacheGrafici(), Disegno()
+    prima = cache.immagine("barre", [1, 2, 3], disegna)
+    seconda = cache.immagine("barre", [1, 2, 3], disegna)
+    assert disegna.figure == 1
+    assert seconda is prima
+    assert cache.statistiche()["hit"] == 1 and cache.statistiche()["miss"] == 1
+    # dati, nome o formato diversi sono un altro grafico
+    cache.immagine("barre", [1, 2, 4], disegna)
+    cache.immagine("torta", [1, 2, 3], disegna)
+    cache.immagine("barre", [1, 2, 3], disegna, formato="svg")
+    assert disegna.figure == 4
+
+
+@pytest.mark.parametrize("formato", ["png", "svg"])
+def test_figura_chiusa_dopo_il_salvataggio(formato):
+    cache = CacheGrafici()
+    immagine = cache.immagine("barre", [1, 2, 3], Disegno(), formato)
+    assert plt.get_fignums() == []
+    assert isinstance(immagine, str if formato == "svg" else bytes)
+
+
+def test_figura_chiusa_anche_se_il_salvataggio_fallisce():
+    cache = CacheGrafici()
+    with pytest.raises(ValueError):
+        cache.immagine("barre", [1, 2, 3], Disegno(), formato="formato_inesistente")
+    assert plt.get_fignums() == []
+    assert cache.statistiche()["immagini"] == 0
+
+
+def test_scarta_le_meno_usate_oltre_max_byte():
+    dati = {"a": [1, 2, 3], "b": [3, 2, 1], "c": [2, 2, 2]}
+    dimensioni = {nome: len(CacheGrafici().immagine(nome, valori, Disegno())) for nome, valori in dati.items()}
+    # c'è posto per due immagini qualsiasi, non per tre
+    cache = CacheGrafici(max_byte=sum(dimensioni.values()) - min(dimensioni.values()) // 2)
+    disegna = Disegno()
+    cache.immagine("a", dati["a"], disegna)
+    cache.immagine("b", dati["b"], disegna)
+    # rileggo "a": la meno usata di recente diventa "b"
+    cache.immagine("a", dati["a"], disegna)
+    cache.immagine("c", dati["c"], disegna)
+    statistiche = cache.statistiche()
+    assert statistiche["scartate"] == 1 and statistiche["immagini"] == 2
+    assert statistiche["byte"] == dimensioni["a"] + dimensioni["c"] <= cache.max_byte
+    cache.immagine("a", dati["a"], disegna)
+    assert disegna.figure == 3
+    cache.immagine("b", dati["b"], disegna)
+    assert disegna.figure == 4
+
+
+def test_immagine_piu_grande_di_max_byte_resta_in_cache():
+    cache, disegna = CacheGrafici(max_byte=1), Disegno()
+    cache.immagine("barre", [1, 2, 3], disegna)
+    cache.immagine("barre", [1, 2, 3], disegna)
+    assert disegna.figure == 1
+    assert cache.statistiche()["immagini"] == 1
@@ -0,0 +1,227 @@
+# Fi.Co? S.Vi.To.! A Fishing Company Simulation and Visualization Tool - Ver. 1.0"- tests/test_crea_mappa_zone_pesca.py
+
+import os
+import numpy as np
+import pytest
+import shapely
+from shapely.geometry import Polygon, box
+from archivio_colonnare import ArchivioColonnare, MANCANTE
+from crea_mappa_zone_pesca import GestoreMappa, IndiceZone, COLORE_UNIFORME
+
+
+@pytest.fixture
+def gestore_mappa(tmp_path):
+    # legenda e colori non leggono il GeoPackage
+    return GestoreMappa(str(tmp_path / "eez.gpkg"))
+
+
+@pytest.fixture
+def percorso_gpkg(tmp_path):
+    ''' Piccolo GeoPackage con una EEZ italiana, una condivisa e una straniera. '''
+    geopandas = pytest.importorskip("geopandas")
+    percorso = str(tmp_path / "eez.gpkg")
+    geopandas.GeoDataFrame(
+        {"EEZ1": ["Italian Exclusive Economic Zone", "Maltese Exclusive Economic Zone", "Greek Exclusive Economic Zone"],
+         "EEZ2": [None, "Italian Exclusive Economic Zone", None]},
+        geometry=[Polygon([(8, 37), (12, 37), (12.005, 40), (12, 44), (8, 44)]), box(13, 34, 15, 36), box(20, 34, 25, 38)],
+        crs="EPSG:4326"
+    ).to_file(percorso, layer="eez", driver="GPKG")
+    return percorso
+
+
+def test_cache_eez_senza_geopackage(percorso_gpkg, monkeypatch):
+    gestore_mappa = GestoreMappa(percorso_gpkg)
+    eez = gestore_mappa.carica_eez_ita()
+    assert [e["EEZ1"] for e in eez] == ["Italian Exclusive Economic Zone", "Maltese Exclusive Economic Zone"]
+    # semplificata con la tolleranza: il vertice a 0.005 gradi dalla linea sparisce
+    assert len(eez[0]["geometria"].exterior.coords) == 5
+    os.remove(percorso_gpkg)
+    monkeypatch.setattr(GestoreMappa, "crea_cache_eez", lambda self, nome_livello=None: pytest.fail("cache non usata"))
+    assert [e["geometria"] for e in GestoreMappa(percorso_gpkg).carica_eez_ita()] == [e["geometria"] for e in eez]
+
+
+def test_cache_eez_file_toccato_ma_identico(percorso_gpkg, monkeypatch):
+    gestore_mappa = GestoreMappa(percorso_gpkg)
+    gestore_mappa.carica_eez_ita()
+    stato = os.stat(percorso_gpkg)
+    os.utime(percorso_gpkg, ns=(stato.st_atime_ns, stato.st_mtime_ns + 1_000_000_000))
+    monkeypatch.setattr(GestoreMappa, "crea_cache_eez", lambda self, nome_livello=None: pytest.fail("cache non usata"))
+    assert gestore_mappa.leggi_cache_eez() is not None
+    # la nuova firma è salvata: la volta dopo non serve ricalcolare il checksum
+    monkeypatch.setattr(GestoreMappa, "checksum_gpkg", lambda self: pytest.fail("checksum ricalcolato"))
+    assert gestore_mappa.leggi_cache_eez() is not None
+
+
+def test_cache_eez_checksum_diverso(percorso_gpkg):
+    gestore_mappa = GestoreMappa(percorso_gpkg)
+    gestore_mappa.carica_eez_ita()
+    with open(percorso_gpkg, "ab") as f:
+        f.write(b"\0")
+    assert gestore_mappa.leggi_cache_eez() is None
+
+
+def test_cache_eez_tolleranza_diversa(percorso_gpkg):
+    GestoreMappa(percorso_gpkg).carica_eez_ita()
+    assert GestoreMappa(percorso_gpkg, tolleranza=0.001).leggi_cache_eez() is None
+    # ricreata con la nuova tolleranza, il vertice resta
+    eez = GestoreMappa(percorso_gpkg, tolleranza=0.001).carica_eez_ita()
+    assert len(eez[0]["geometria"].exterior.coords) == 6
+    assert GestoreMappa(percorso_gpkg).leggi_cache_eez() is None
+
+
+def test_cache_eez_livello_diverso(percorso_gpkg):
+    gestore_mappa = GestoreMappa(percorso_gpkg)
+    gestore_mappa.carica_eez_ita()
+    assert gestore_mappa.leggi_cache_eez("eez") is None
+    gestore_mappa.carica_eez_ita("eez")
+    assert gestore_mappa.leggi_cache_eez("eez") is not None
+    assert gestore_mappa.leggi_cache_eez() is None
+
+
+def zone_pesca():
+    zone = GestoreMappa("eez.gpkg").zone_eez_ita(None)
+    return [z["nome_zona"] for z in zone], [z["geometria"] for z in zone]
+
+
+def assegna_forza_bruta(geometrie, lat, lon):
+    ''' Prima zona che contiene il punto, bordo compreso, verificando ogni punto su ogni poligono. '''
+    codici = np.full(len(lat), MANCANTE, dtype=np.int16)
+    for codice in reversed(range(len(geometrie))):
+        codici[shapely.intersects_xy(geometrie[codice], lon, lat)] = codice
+    return codici
+
+
+@pytest.mark.parametrize("passo", [0.25, 1, 3.3])
+def test_indice_uguale_alla_forza_bruta(passo):
+    nomi, geometrie = zone_pesca()
+    indice = IndiceZone(nomi, geometrie, passo=passo)
+    generatore = np.random.default_rng(4)
+    # punti casuali anche fuori dai limiti, punti sugli spigoli delle celle e sui vertici dei poligoni
+    lon = generatore.uniform(-2, 32, 20000)
+    lat = generatore.uniform(32, 48, 20000)
+    spigoli_lon = indice.minx + generatore.integers(-2, indice.nx + 3, 5000) * passo
+    spigoli_lat = indice.miny + generatore.integers(-2, indice.ny + 3, 5000) * passo
+    vertici = np.vstack([np.asarray(g.exterior.coords) for g in geometrie])
+    lon = np.concatenate([lon, spigoli_lon, spigoli_lon, generatore.uniform(-2, 32, 5000), vertici[:, 0]])
+    lat = np.concatenate([lat, spigoli_lat, generatore.uniform(32, 48, 5000), spigoli_lat, vertici[:, 1]])
+    np.testing.assert_array_equal(indice.assegna(lat, lon), assegna_forza_bruta(geometrie, lat, lon))
+
+
+def test_confine_condiviso_alla_prima_zona():
+    nomi, geometrie = zone_pesca()
+    indice = IndiceZone(nomi, geometrie)
+    punti = {
+        (40, 15): "Adriatico",      # Adriatico / Ionio
+        (41, 12): "Adriatico",      # Adriatico / Tirreno / Mediterraneo Occidentale
+        (40, 8): "Tirreno",         # Tirreno / Mediterraneo Occidentale
+        (40, 20): "Ionio",          # Ionio / Mediterraneo Centrale
+        (46.5, 19): "Adriatico"     # spigolo in alto a destra dell'Adriatico
+    }
+    codici = indice.assegna([lat for lat, _ in punti], [lon for _, lon in punti])
+    assert [nomi[codice] for codice in codici] == list(punti.values())
+
+
+def test_punti_fuori_dalle_zone_e_nan():
+    nomi, geometrie = zone_pesca()
+    indice = IndiceZone(nomi, geometrie)
+    lat = [30, 50, 40, 40, np.nan, 40, np.nan, 46.5, 34]
+    lon = [10, 10, -5, 35, 10, np.nan, np.nan, 30, 0]
+    codici = indice.assegna(lat, lon)
+    assert codici.tolist()[:7] == [MANCANTE] * 7
+    # i bordi massimo e minimo delle zone sono ancora dentro
+    assert [nomi[codice] for codice in codici[7:]] == ["Mediterraneo Centrale", "Mediterraneo Occidentale"]
+    assert indice.assegna([], []).tolist() == []
+
+
+def test_assegna_zone_archivio_rimappa_le_categorie(monkeypatch):
+    nomi, geometrie = zone_pesca()
+    gestore_mappa = GestoreMappa("eez.gpkg")
+    monkeypatch.setattr(gestore_mappa, "indice_zone", lambda: IndiceZone(nomi, geometrie))
+    archivio = ArchivioColonnare.da_record([
+        {"data": "2020-01-01", "tipo": "Acciuga", "zona": "Ionio", "kg": 1, "lat": 43, "lon": 14},
+        {"data": "2020-01-02", "tipo": "Acciuga", "zona": "Zona Sconosciuta", "kg": 1},
+        {"data": "2020-01-03", "tipo": "Acciuga", "zona": "Ionio", "kg": 1, "lat": 30, "lon": 10},
+        {"data": "2020-01-04", "tipo": "Sardina", "kg": 1, "lat": 36, "lon": 25},
+        {"data": "2020-01-05", "tipo": "Sardina", "zona": "Zona Sconosciuta", "kg": 1, "lat": 36, "lon": 15}
+    ])
+    categorie = list(archivio.categorie["zona"])
+    risultato = gestore_mappa.assegna_zone_archivio(archivio)
+    assert list(risultato.decodifica("zona")) == ["Adriatico", "Zona Sconosciuta", "Ionio", "Mediterraneo Centrale", "Ionio"]
+    # le categorie dell'archivio restano con gli stessi codici, quelle nuove vanno in coda
+    assert risultato.categorie["zona"][:len(categorie)] == categorie
+    assert sorted(risultato.categorie["zona"][len(categorie):]) == sorted(set(nomi) - set(categorie))
+    assert archivio.categorie["zona"] == categorie
+
+
+def test_assegna_zone_archivio_senza_coordinate(monkeypatch):
+    gestore_mappa = GestoreMappa("eez.gpkg")
+    monkeypatch.setattr(gestore_mappa, "indice_zone", lambda: pytest.fail("indice usato"))
+    archivio = ArchivioColonnare.da_record([{"data": "2020-01-01", "tipo": "Acciuga", "zona": "Ionio", "kg": 1}])
+    assert gestore_mappa.assegna_zone_archivio(archivio) is archivio
+
+
+def test_riepilogo_zone_uguale_al_conteggio_per_record(archivio_storico, record_manuali):
+    prodotti = archivio_storico.a_record() + record_manuali + [{"data": "2020-12-01", "tipo": "Acciuga", "kg": 3, "netto": 2}]
+    attesi = {}
+    for prodotto in prodotti:
+        if prodotto.get("zona"):
+            totali = attesi.setdefault(prodotto["zona"], {"campioni": 0, "kg": 0, "netto": 0})
+            totali["campioni"] += 1
+            totali["kg"] += prodotto["kg"]
+            totali["netto"] += prodotto["netto"]
+    gestore_mappa = GestoreMappa("eez.gpkg")
+    riepilogo = gestore_mappa.riepilogo_zone(prodotti)
+    assert riepilogo.keys() == attesi.keys()
+    for zona, totali in attesi.items():
+        assert riepilogo[zona]["campioni"] == totali["campioni"]
+        assert riepilogo[zona]["kg"] == pytest.approx(totali["kg"], abs=0.01)
+        assert riepilogo[zona]["netto"] == pytest.approx(totali["netto"], abs=0.01)
+    assert gestore_mappa.conta_campioni_zone(prodotti) == {zona: totali["campioni"] for zona, totali in attesi.items()}
+    assert gestore_mappa.riepilogo_zone([]) == {}
+
+
+SCHEMA_COLORI = ["blue", "red"]
+CONTEGGI = [3, 10, 40, 200, 5000, 0, 7]
+
+
+def valore(testo):
+    return float(testo.replace("Min. ", "").replace("Max. ", "").replace(",", ""))
+
+
+def rgb(colore):
+    return [int(colore[i:i + 2], 16) for i in (1, 3, 5)]
+
+
+@pytest.mark.parametrize("scala", ["lineare", "log"])
+def test_legenda_continua_coerente_con_i_colori(gestore_mappa, scala):
+    legenda = gestore_mappa.legenda_colori(CONTEGGI, SCHEMA_COLORI, scala)
+    assert legenda["etichette"][0] == (0.0, "Min. 0") and legenda["etichette"][-1] == (1.0, "Max. 5000")
+    colori_tappe = dict(legenda["tappe"])
+    for posizione, testo in legenda["etichette"]:
+        # una zona con il valore dell'etichetta (arrotondato) avrebbe il colore della barra in quel punto
+        colore = gestore_mappa.colori_zone(CONTEGGI + [valore(testo)], SCHEMA_COLORI, scala)[-1]
+        assert rgb(colore) == pytest.approx(rgb(colori_tappe[posizione]), abs=2), testo
+
+
+def test_legenda_quantili_a_classi(gestore_mappa):
+    legenda = gestore_mappa.legenda_colori(CONTEGGI, SCHEMA_COLORI, "quantili", classi=5)
+    colori_classi = [colore for _, colore in legenda["tappe"][::2]]
+    assert len(set(colori_classi)) == 5
+    # barra a gradini: ogni classe inizia dove finisce la precedente
+    assert [posizione for posizione, _ in legenda["tappe"]] == pytest.approx(np.repeat(np.linspace(0, 1, 6), 2)[1:-1])
+    soglie = np.quantile(CONTEGGI, np.linspace(0, 1, 6)[1:-1])
+    assert [valore(testo) for _, testo in legenda["etichette"][1:-1]] == np.round(soglie).tolist()
+    # ogni zona ha il colore della classe in cui cade il suo conteggio
+    for conteggio, colore in zip(CONTEGGI, gestore_mappa.colori_zone(CONTEGGI, SCHEMA_COLORI, "quantili", classi=5)):
+        assert colore == colori_classi[np.searchsorted(soglie, conteggio, side="right")], conteggio
+
+
+def test_legenda_conteggi_uguali(gestore_mappa):
+    legenda = gestore_mappa.legenda_colori([4, 4, 4], SCHEMA_COLORI, "log")
+    assert {colore for _, colore in legenda["tappe"]} == {COLORE_UNIFORME}
+    assert [testo for _, testo in legenda["etichette"]] == ["Min. 4", "Max. 4"]
+
+
+def test_legenda_scala_non_valida(gestore_mappa):
+    with pytest.raises(ValueError):
+        gestore_mappa.legenda_colori(CONTEGGI, SCHEMA_COLORI, "radice")
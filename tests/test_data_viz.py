@@ -0,0 +1,109 @@
+# Fi.Co? S.Vi.To.! A Fishing Company Simulation and Visualization Tool - Ver. 1.0"- tests/test_data_viz.py
+
+import json
+from datetime import date, timedelta
+import numpy as np
+import pytest
+from archivio_colonnare import ArchivioColonnare
+from business_logic import ElaboratoreDati
+from data_viz import GestoreDati, GestoreVisualizzazioneDati
+
+OGGI = date(2024, 6, 15)
+
+
+def giorni(inizio, fine):
+    return [inizio + timedelta(days=i) for i in range((fine - inizio).days + 1)]
+
+
+def record_giorni(inizio, fine, kg):
+    ''' Un campione al giorno, con il peso che distingue i giorni conservati da quelli generati. '''
+    return [
+        {"data": giorno.isoformat(), "tipo": "Acciuga", "zona": "Adriatico", "kg": kg, "netto": kg, "scarto": 0, "prezzo_medio": 2}
+        for giorno in giorni(inizio, fine)
+    ]
+
+
+def archivio_giorni(inizio, fine, kg):
+    return ArchivioColonnare.da_record(record_giorni(inizio, fine, kg))
+
+
+class GeneratoreFinto:
+    ''' Al posto di GeneratoreDatiStorici: registra gli intervalli generati e salva l'archivio come il generatore vero. '''
+    def __init__(self):
+        self.intervalli = []
+
+    def genera_archivio_storico(self, data_inizio, data_fine):
+        self.intervalli.append((data_inizio, data_fine))
+        return archivio_giorni(data_inizio, data_fine, kg=2)
+
+    def salva_dati_storici(self, records, filename):
+        ArchivioColonnare.da_record(records).ordina_per_data().salva(filename)
+
+
+@pytest.fixture
+def gestore_dati(tmp_path):
+    return GestoreDati(GeneratoreFinto(), None, ElaboratoreDati(), percorso_archivio=str(tmp_path / "storico.bin"))
+
+
+def date_archivio(archivio):
+    return [giorno.item() for giorno in archivio.colonna("data")]
+
+
+def test_genera_solo_i_giorni_mancanti(gestore_dati):
+    storico = archivio_giorni(date(2024, 5, 1), date(2024, 6, 10), kg=1)
+    aggiornato = gestore_dati.aggiungi_giorni_mancanti(storico, date(2024, 6, 10), OGGI)
+    assert gestore_dati.generatore_storico.intervalli == [(date(2024, 6, 11), OGGI)]
+    assert date_archivio(aggiornato) == giorni(date(2024, 5, 1), OGGI)
+    np.testing.assert_array_equal(aggiornato.valori("kg"), [1] * len(storico) + [2] * 5)
+    # l'archivio aggiornato è salvato: ricaricarlo dà gli stessi record
+    assert gestore_dati.carica_dati().a_record() == aggiornato.a_record()
+
+
+def test_scarta_i_giorni_fuori_dalla_finestra(gestore_dati):
+    storico = archivio_giorni(date(2019, 6, 1), date(2024, 6, 10), kg=1)
+    aggiornato = gestore_dati.aggiungi_giorni_mancanti(storico, date(2024, 6, 10), OGGI)
+    assert gestore_dati.generatore_storico.intervalli == [(date(2024, 6, 11), OGGI)]
+    # restano solo gli ultimi 5 anni, fino a oggi compreso
+    assert date_archivio(aggiornato) == giorni(date(2019, 6, 15), OGGI)
+
+
+def test_storico_piu_vecchio_della_finestra(gestore_dati):
+    storico = archivio_giorni(date(2018, 1, 1), date(2018, 12, 31), kg=1)
+    aggiornato = gestore_dati.aggiungi_giorni_mancanti(storico, date(2018, 12, 31), OGGI)
+    # niente da conservare: si genera solo la finestra di 5 anni, non i giorni precedenti
+    assert gestore_dati.generatore_storico.intervalli == [(date(2019, 6, 15), OGGI)]
+    assert date_archivio(aggiornato) == giorni(date(2019, 6, 15), OGGI)
+    assert set(aggiornato.valori("kg")) == {2}
+
+
+def test_storico_senza_date_rigenerato(gestore_dati):
+    storico = ArchivioColonnare.da_record([{"tipo": "Acciuga", "zona": "Adriatico", "kg": 1}])
+    oggi = date.today()
+    aggiornato = gestore_dati.aggiorna_dati_storici(storico)
+    # nessuna ultima data: si rigenera l'intera finestra di 5 anni, come per uno storico vuoto
+    assert gestore_dati.generatore_storico.intervalli == [(oggi.replace(year=oggi.year - 5), oggi)]
+    assert date_archivio(aggiornato)[-1] == oggi
+
+
+def test_specifiche_vega_con_i_dati_aggregati():
+    gestore_visualizzazione = GestoreVisualizzazioneDati(ElaboratoreDati(), None)
+    dati_barre = {"tipi": ["Acciuga", "Sardina"], "netto": [10.5, 4.0], "scarto": [1.5, 0.25]}
+    dati_costi = {"tipi": ["Acciuga", "Sardina"], "produzione": [2.0, 1.5], "utile": [0.5, 0.4]}
+    dati_serie = {"date": ["2024-06-14", "2024-06-15"], "quantita": [1.0, 0.5], "prezzo": [0.2, 0.3], "qualita": [0.7, 0.8]}
+    specifiche = [
+        gestore_visualizzazione.specifica_grafico_torta({"scarto": 3.0, "netto": 7.0}),
+        gestore_visualizzazione.specifica_grafico_barre(dati_barre),
+        gestore_visualizzazione.specifica_grafico_costi(dati_costi),
+        gestore_visualizzazione.specifica_grafico_temporale(dati_serie)
+    ]
+    # al browser arrivano solo i valori aggregati, serializzabili in JSON: una riga per categoria, tipo o giorno e serie
+    assert [len(specifica["data"]["values"]) for specifica in specifiche] == [2, 2, 2, 6]
+    assert all(json.loads(json.dumps(specifica)) == specifica for specifica in specifiche)
+    assert specifiche[1]["data"]["values"][0] == {"Tipo": "Acciuga", "netto": 10.5, "scarto": 1.5}
+    assert [riga["Data"] for riga in specifiche[3]["data"]["values"]] == dati_serie["date"] * 3
+    # con le bande Monte Carlo ogni riga porta i suoi limiti e si aggiunge il livello delle aree
+    for nome in ("quantita", "prezzo", "qualita"):
+        dati_serie[nome + "_min"], dati_serie[nome + "_max"] = [0.1, 0.2], [0.8, 0.9]
+    specifica = gestore_visualizzazione.specifica_grafico_temporale(dati_serie)
+    assert [(riga["Minimo"], riga["Massimo"]) for riga in specifica["data"]["values"]] == [(0.1, 0.8), (0.2, 0.9)] * 3
+    assert [livello["mark"]["type"] for livello in specifica["layer"]] == ["area", "line"]
@@ -0,0 +1,46 @@
+# Fi.Co? S.Vi.To.! A Fishing Company Simulation and Visualization Tool - Ver. 1.0"- tests/test_generatore_vettoriale.py
+
+from datetime import date
+import numpy as np
+import pytest
+from archivio_colonnare import ArchivioColonnare
+
+
+def test_stesso_seed_stesso_archivio(generatore):
+    primo = generatore.genera(date(2019, 1, 1), date(2019, 6, 30), seed=11)
+    secondo = generatore.genera(date(2019, 1, 1), date(2019, 6, 30), seed=11)
+    assert primo.a_record() == secondo.a_record()
+
+
+def test_stesse_distribuzioni_del_generatore_a_record(generatore, archivio_storico):
+    archivio = generatore.genera(date(2019, 1, 1), date(2020, 12, 31), seed=3)
+    assert sorted(archivio.colonne) == sorted(archivio_storico.colonne)
+    assert len(archivio) == pytest.approx(len(archivio_storico), rel=0.05)
+    for campo in ("kg", "scarto", "meteo", "prezzo_medio"):
+        assert archivio.valori(campo).mean() == pytest.approx(archivio_storico.valori(campo).mean(), rel=0.05), campo
+    np.testing.assert_allclose(archivio.valori("netto") + archivio.valori("scarto"), archivio.valori("kg"), atol=0.02)
+
+
+@pytest.mark.parametrize("processi", [1, 2])
+def test_genera_su_file_non_dipende_dai_processi(tmp_path, generatore, processi):
+    # i seed dei blocchi derivano dal seed comune: il file è lo stesso con qualsiasi numero di processi
+    riferimento = str(tmp_path / "riferimento.bin")
+    percorso = str(tmp_path / "storico.bin")
+    generatore.genera_su_file(riferimento, date(2019, 1, 1), date(2019, 12, 31), seed=5, processi=1, giorni_per_blocco=30)
+    scritti = generatore.genera_su_file(percorso, date(2019, 1, 1), date(2019, 12, 31), seed=5, processi=processi, giorni_per_blocco=30)
+    atteso = ArchivioColonnare.carica(riferimento)
+    ottenuto = ArchivioColonnare.carica(percorso)
+    assert scritti == len(ottenuto) > 0
+    assert ottenuto.ordinato_per_data
+    assert ottenuto.a_record() == atteso.a_record()
+
+
+def test_genera_su_file_intervallo_vuoto(tmp_path, generatore):
+    percorso = str(tmp_path / "vuoto.bin")
+    assert generatore.genera_su_file(percorso, date(2019, 1, 2), date(2019, 1, 1), seed=5, processi=1) == 0
+    caricato = ArchivioColonnare.carica(percorso)
+    assert len(caricato) == 0
+    # le colonne ci sono comunque, vuote e con il loro tipo
+    assert set(caricato.colonne) == set(generatore.genera(date(2019, 1, 1), date(2019, 1, 1), seed=5).colonne)
+    assert caricato.colonna("data").dtype == np.dtype("datetime64[D]")
+    assert caricato.categorie == generatore.categorie()
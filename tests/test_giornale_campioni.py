@@ -0,0 +1,100 @@
+# Fi.Co? S.Vi.To.! A Fishing Company Simulation and Visualization Tool - Ver. 1.0"- tests/test_giornale_campioni.py
+
+import pytest
+from business_logic import ElaboratoreDati
+from giornale_campioni import GiornaleCampioni
+
+
+def campione(data, tipo, kg):
+    return {"data": data, "tipo": tipo, "kg": kg}
+
+
+@pytest.fixture
+def percorso(tmp_path):
+    return str(tmp_path / "manual_data.jsonl")
+
+
+def apri(percorso):
+    return GiornaleCampioni(percorso, ElaboratoreDati().chiave_record)
+
+
+def righe(percorso):
+    with open(percorso) as f:
+        return f.read().splitlines()
+
+
+def test_giornale_assente_vuoto(percorso):
+    giornale = apri(percorso)
+    assert not giornale.esiste()
+    assert giornale.leggi() == []
+
+
+def test_a_parita_di_chiave_vince_l_ultimo(percorso):
+    giornale = apri(percorso)
+    giornale.aggiungi(campione("2024-01-01", "Acciuga", 10))
+    giornale.aggiungi(campione("2024-01-01", "Sardina", 20))
+    giornale.aggiungi(campione("2024-01-01", "Acciuga", 30))
+    # l'ultimo campione sostituisce il primo e ne prende il posto
+    assert giornale.leggi() == [campione("2024-01-01", "Acciuga", 30), campione("2024-01-01", "Sardina", 20)]
+    # un'altra sessione che legge da capo ottiene lo stesso risultato
+    assert apri(percorso).leggi() == giornale.leggi()
+
+
+def test_lettura_incrementale(percorso):
+    giornale = apri(percorso)
+    giornale.aggiungi(campione("2024-01-01", "Acciuga", 10))
+    assert len(giornale.leggi()) == 1
+    altra_sessione = apri(percorso)
+    altra_sessione.aggiungi(campione("2024-01-02", "Acciuga", 15))
+    assert giornale.leggi() == [campione("2024-01-01", "Acciuga", 10), campione("2024-01-02", "Acciuga", 15)]
+    assert giornale.righe == 2
+
+
+def test_riga_interrotta_non_rovina_le_successive(percorso):
+    giornale = apri(percorso)
+    giornale.aggiungi(campione("2024-01-01", "Acciuga", 10))
+    # scrittura interrotta a metà riga: finché non è completa non viene letta
+    with open(percorso, "a") as f:
+        f.write('{"data": "2024-01-02", "ti')
+    assert giornale.leggi() == [campione("2024-01-01", "Acciuga", 10)]
+    giornale.aggiungi(campione("2024-01-03", "Sardina", 5))
+    assert giornale.leggi() == [campione("2024-01-01", "Acciuga", 10), campione("2024-01-03", "Sardina", 5)]
+
+
+def test_compattazione(percorso):
+    giornale = apri(percorso)
+    giornale.SOGLIA_COMPATTAZIONE = 10
+    for kg in range(12):
+        giornale.aggiungi(campione("2024-01-01", "Acciuga", kg))
+    giornale.aggiungi(campione("2024-01-02", "Sardina", 1))
+    attesi = [campione("2024-01-01", "Acciuga", 11), campione("2024-01-02", "Sardina", 1)]
+    assert giornale.leggi() == attesi
+    # il file riscritto ha un solo campione per chiave e le letture successive non cambiano
+    assert len(righe(percorso)) == 2
+    assert giornale.righe == 2
+    assert giornale.leggi() == attesi
+    giornale.aggiungi(campione("2024-01-02", "Sardina", 2))
+    assert giornale.leggi() == [campione("2024-01-01", "Acciuga", 11), campione("2024-01-02", "Sardina", 2)]
+
+
+def test_sessione_vede_la_compattazione_di_un_altra(percorso):
+    giornale = apri(percorso)
+    for kg in range(5):
+        giornale.aggiungi(campione("2024-01-01", "Acciuga", kg))
+    assert giornale.leggi() == [campione("2024-01-01", "Acciuga", 4)]
+    altra_sessione = apri(percorso)
+    altra_sessione.SOGLIA_COMPATTAZIONE = 1
+    assert altra_sessione.leggi() == [campione("2024-01-01", "Acciuga", 4)]
+    assert len(righe(percorso)) == 1
+    # il file è stato sostituito: la prima sessione rilegge da capo invece di continuare dalla vecchia posizione
+    giornale.aggiungi(campione("2024-01-05", "Sardina", 7))
+    assert giornale.leggi() == [campione("2024-01-01", "Acciuga", 4), campione("2024-01-05", "Sardina", 7)]
+
+
+def test_riscrivi_sostituisce_il_contenuto(percorso):
+    giornale = apri(percorso)
+    giornale.aggiungi(campione("2024-01-01", "Acciuga", 10))
+    giornale.riscrivi([])
+    assert giornale.leggi() == []
+    assert apri(percorso).leggi() == []
+    assert righe(percorso) == []
@@ -0,0 +1,62 @@
+# Fi.Co? S.Vi.To.! A Fishing Company Simulation and Visualization Tool - Ver. 1.0"- tests/test_monte_carlo.py
+
+from datetime import date
+import numpy as np
+import pytest
+from business_logic import ElaboratoreDati
+from monte_carlo import SimulazioneMonteCarlo
+
+INIZIO, FINE = date(2019, 11, 13), date(2020, 2, 11)
+STORIE = 200
+
+
+@pytest.fixture(scope="module")
+def simulazione(generatore):
+    return SimulazioneMonteCarlo(generatore, ElaboratoreDati(), processi=1)
+
+
+def test_campioni_non_dipendono_dai_processi(generatore, simulazione):
+    misure, per_tipo, per_periodo = simulazione.campioni(INIZIO, FINE, "mese", STORIE, seed=3)
+    in_parallelo = SimulazioneMonteCarlo(generatore, ElaboratoreDati(), processi=2)
+    misure_2, per_tipo_2, per_periodo_2 = in_parallelo.genera_campioni(INIZIO, FINE, "mese", STORIE, seed=3)
+    assert misure_2 == misure
+    np.testing.assert_array_equal(per_tipo_2, per_tipo)
+    np.testing.assert_array_equal(per_periodo_2, per_periodo)
+
+
+@pytest.mark.parametrize("riciclo, lavorazione", [(0, 0), (40, 0), (0, 60), (100, 100)])
+def test_media_tra_i_percentili(simulazione, riciclo, lavorazione):
+    bande = simulazione.bande(INIZIO, FINE, "mese", STORIE, seed=3, riciclo=riciclo, lavorazione=lavorazione)
+    assert bande["storie"] == STORIE
+    for nome, statistiche in bande["indicatori"].items():
+        assert statistiche["p5"] <= statistiche["media"] <= statistiche["p95"], nome
+        assert statistiche["p5"] <= statistiche["p50"] <= statistiche["p95"], nome
+
+
+def test_slider_a_zero_restituiscono_le_somme_storiche(generatore, simulazione):
+    elaboratore_dati = ElaboratoreDati()
+    misure, per_tipo, _ = simulazione.campioni(INIZIO, FINE, "mese", STORIE, seed=3)
+    somme = simulazione.simula(misure, per_tipo, 0, 0)
+    for i, misura in enumerate(misure):
+        np.testing.assert_array_equal(somme[misura], per_tipo[:, i, :])
+    # la prima storia, rigenerata con il suo seme e sommata per tipo
+    seme = np.random.SeedSequence(3).spawn(STORIE)[0]
+    preparati = elaboratore_dati.prepara_dati_storici(generatore.genera(INIZIO, FINE, seme))
+    valori = elaboratore_dati.valori_aggregazione(preparati)
+    tipi = preparati.colonna("tipo").astype(np.int64)
+    for misura in ("kg", "netto", "scarto", "costo_produzione", "qualita"):
+        attese = np.bincount(tipi, weights=valori[misura], minlength=len(generatore.SPECIE))
+        np.testing.assert_allclose(somme[misura][0], attese)
+    np.testing.assert_array_equal(somme["conteggio"][0], np.bincount(tipi, minlength=len(generatore.SPECIE)))
+
+
+@pytest.mark.parametrize("livello", ["giorno", "settimana", "mese", "anno"])
+def test_serie_con_gli_stessi_periodi_di_ricampiona_serie(generatore, simulazione, livello):
+    elaboratore_dati = ElaboratoreDati()
+    bande = simulazione.bande(INIZIO, FINE, livello, 20, seed=5)
+    preparati = elaboratore_dati.prepara_dati_storici(generatore.genera(INIZIO, FINE, seed=5))
+    serie = elaboratore_dati.ricampiona_serie(elaboratore_dati.calcola_somme_giornaliere(preparati, INIZIO, FINE), livello)
+    assert len(bande["serie"]["data"]) == len(serie)
+    assert bande["serie"]["data"] == [punto["data"] for punto in serie]
+    for nome in ("quantita", "prezzo_medio", "qualita_media"):
+        assert len(bande["serie"][nome]["media"]) == len(serie)
@@ -0,0 +1,60 @@
+# Fi.Co? S.Vi.To.! A Fishing Company Simulation and Visualization Tool - Ver. 1.0"- tests/test_ottimizzatore_simulazione.py
+
+import numpy as np
+import pytest
+from business_logic import ElaboratoreDati
+from ottimizzatore_simulazione import OttimizzatoreSimulazione
+
+
+def frontiera_forza_bruta(scenari, qualita_minima=None, scarto_massimo=None):
+    ''' Riferimento: confronta ogni scenario ammesso con tutti gli altri. '''
+    utile, qualita, scarto = (scenari[campo].ravel() for campo in ("utile_lordo", "qualita", "scarto"))
+    ammessi = [
+        i for i in range(len(utile))
+        if (qualita_minima is None or qualita[i] >= qualita_minima) and (scarto_massimo is None or scarto[i] <= scarto_massimo)
+    ]
+    def domina(j, i):
+        return utile[j] >= utile[i] and qualita[j] >= qualita[i] and scarto[j] <= scarto[i] and (utile[j], qualita[j], scarto[j]) != (utile[i], qualita[i], scarto[i])
+    return {i for i in ammessi if not any(domina(j, i) for j in ammessi)}
+
+
+def scenari_casuali(seme, forma=(6, 7)):
+    # pochi valori distinti, così ci sono molti pareggi
+    rng = np.random.default_rng(seme)
+    return {campo: rng.integers(0, 4, forma).astype(np.float64) for campo in ("utile_lordo", "qualita", "scarto")}
+
+
+@pytest.mark.parametrize("seme", range(20))
+@pytest.mark.parametrize("qualita_minima, scarto_massimo", [(None, None), (1, None), (None, 2), (2, 1), (4, None)])
+def test_frontiera_uguale_alla_forza_bruta(seme, qualita_minima, scarto_massimo):
+    scenari = scenari_casuali(seme)
+    ottimizzatore = OttimizzatoreSimulazione(ElaboratoreDati())
+    indici = ottimizzatore.frontiera_pareto(scenari, qualita_minima, scarto_massimo)
+    piatti = np.ravel_multi_index(tuple(indici.T), scenari["utile_lordo"].shape).tolist() if len(indici) else []
+    assert len(piatti) == len(set(piatti))
+    assert set(piatti) == frontiera_forza_bruta(scenari, qualita_minima, scarto_massimo)
+    utile = scenari["utile_lordo"].ravel()[piatti]
+    assert (np.diff(utile) <= 0).all()
+
+
+def test_ottimizza_sceglie_l_utile_massimo_entro_i_vincoli(archivio_storico):
+    elaboratore = ElaboratoreDati()
+    aggregati = elaboratore.calcola_aggregati(elaboratore.prepara_dati_storici(archivio_storico))
+    ottimizzatore = OttimizzatoreSimulazione(elaboratore, passo=10)
+    frontiera, migliore = ottimizzatore.ottimizza(aggregati, qualita_minima=3)
+    # controllo con la simulazione di ogni combinazione della griglia, una per volta
+    candidati = []
+    for riciclo in range(0, 101, 10):
+        for lavorazione in range(0, 101, 10):
+            simulati = elaboratore.simula_aggregati(aggregati, riciclo, lavorazione)
+            if simulati.indice_qualita()["globale"] >= 3:
+                candidati.append((simulati.sommario_costi()["Media"]["utile_lordo"], riciclo, lavorazione))
+    assert migliore is not None and migliore in frontiera
+    assert migliore["utile_lordo"] == pytest.approx(max(candidati)[0])
+    assert (migliore["riciclo"], migliore["lavorazione"]) in [(r, l) for u, r, l in candidati if u == pytest.approx(max(candidati)[0])]
+
+
+def test_ottimizza_senza_scenari_ammessi(archivio_storico):
+    elaboratore = ElaboratoreDati()
+    aggregati = elaboratore.calcola_aggregati(elaboratore.prepara_dati_storici(archivio_storico))
+    assert OttimizzatoreSimulazione(elaboratore, passo=25).ottimizza(aggregati, qualita_minima=6) == ([], None)
@@ -0,0 +1,108 @@
+# Fi.Co? S.Vi.To.! A Fishing Company Simulation and Visualization Tool - Ver. 1.0"- tests/test_rollup_campioni.py
+
+import random
+from datetime import date, timedelta
+import numpy as np
+import pytest
+from archivio_colonnare import ArchivioColonnare
+from business_logic import ElaboratoreDati, VistaUnita, VistaRollup
+from rollup_campioni import segmenti, fine_periodo
+
+INTERVALLI = [
+    (date(2019, 1, 1), date(2020, 12, 31)),
+    (date(2019, 1, 1), date(2019, 1, 1)),
+    (date(2019, 2, 28), date(2019, 3, 1)),
+    (date(2019, 1, 31), date(2020, 3, 1)),
+    (date(2020, 2, 1), date(2020, 2, 29)),
+    (date(2018, 6, 1), date(2019, 2, 15))
+]
+
+
+def intervalli_casuali(n, seme=1):
+    rng = random.Random(seme)
+    intervalli = []
+    for _ in range(n):
+        inizio = date(2019, 1, 1) + timedelta(rng.randrange(730))
+        intervalli.append((inizio, inizio + timedelta(rng.choice([0, 1, 6, 30, 45, 200, 500]))))
+    return intervalli
+
+
+@pytest.mark.parametrize("inizio, fine", INTERVALLI + intervalli_casuali(30))
+def test_segmenti_coprono_ogni_giorno_una_volta(inizio, fine):
+    tratti = segmenti(inizio, fine)
+    giorni = []
+    for livello, primo, ultimo in tratti:
+        # ogni tratto è fatto di periodi interi del suo livello
+        assert fine_periodo(primo, livello) >= primo
+        giorni.extend(np.arange(primo, fine_periodo(ultimo, livello)[()] + 1).tolist())
+    assert giorni == np.arange(np.datetime64(inizio, "D"), np.datetime64(fine, "D") + 1).tolist()
+    assert len(tratti) <= 5
+
+
+def test_segmenti_intervallo_vuoto():
+    assert segmenti(date(2020, 1, 2), date(2020, 1, 1)) == []
+
+
+def confronta_aggregati(atteso, ottenuto):
+    ''' Stessi tipi, conteggi e riepiloghi a meno dell'ordine delle somme. '''
+    assert sorted(ottenuto.tipi) == sorted(atteso.tipi)
+    for tipo, valori in atteso.sommario_costi().items():
+        assert ottenuto.sommario_costi()[tipo] == pytest.approx(valori, rel=1e-9, abs=1e-9), tipo
+    for tipo, valori in atteso.netto_scarto().items():
+        assert ottenuto.netto_scarto()[tipo] == pytest.approx(valori, rel=1e-9, abs=1e-6), tipo
+    for tipo, valore in atteso.indice_qualita().items():
+        assert ottenuto.indice_qualita()[tipo] == pytest.approx(valore, abs=0.0100001), tipo
+
+
+@pytest.mark.parametrize("inizio, fine", INTERVALLI + intervalli_casuali(10, seme=2))
+def test_aggregati_da_rollup_uguali_ai_record(archivio_storico, record_manuali, inizio, fine):
+    elaboratore = ElaboratoreDati()
+    unione = VistaUnita(elaboratore).unisci(archivio_storico, record_manuali)
+    rollup = VistaRollup(elaboratore).rollup_dati(unione)
+    atteso = elaboratore.calcola_aggregati(elaboratore.prepara_dati_storici(unione.intervallo_date(inizio, fine)))
+    confronta_aggregati(atteso, elaboratore.aggregati_da_rollup(rollup, inizio, fine))
+
+
+@pytest.mark.parametrize("livello", ["settimana", "mese", "anno"])
+def test_serie_da_rollup_uguale_ai_record(archivio_storico, record_manuali, livello):
+    elaboratore = ElaboratoreDati()
+    unione = VistaUnita(elaboratore).unisci(archivio_storico, record_manuali)
+    rollup = VistaRollup(elaboratore).rollup_dati(unione)
+    inizio, fine = date(2019, 1, 17), date(2020, 11, 30)
+    preparati = elaboratore.prepara_dati_storici(unione.intervallo_date(inizio, fine))
+    attesa = elaboratore.calcola_serie_temporale(preparati, inizio, fine, livello)
+    ottenuta = elaboratore.ricampiona_serie(rollup.serie(inizio, fine, livello), "giorno")
+    assert [p["data"] for p in ottenuta] == [p["data"] for p in attesa]
+    for atteso, ottenuto in zip(attesa, ottenuta):
+        assert ottenuto == pytest.approx(atteso, abs=0.0100001)
+
+
+def test_estensione_incrementale_uguale_alla_ricostruzione(generatore, archivio_storico):
+    elaboratore = ElaboratoreDati()
+    vista = VistaRollup(elaboratore)
+    vista.rollup_dati(archivio_storico)
+    # giorni aggiunti in coda, come fa aggiungi_giorni_mancanti
+    esteso = ArchivioColonnare.concatena([archivio_storico, generatore.genera(date(2021, 1, 1), date(2021, 3, 31), seed=8)])
+    rollup = vista.rollup_dati(esteso)
+    assert vista.estensioni == 1 and vista.costruzioni == 1
+    ricostruito = VistaRollup(elaboratore).rollup_dati(esteso)
+    for inizio, fine in [(date(2019, 1, 1), date(2021, 3, 31)), (date(2020, 12, 15), date(2021, 2, 3))]:
+        confronta_aggregati(elaboratore.aggregati_da_rollup(ricostruito, inizio, fine), elaboratore.aggregati_da_rollup(rollup, inizio, fine))
+
+
+def test_rollup_rifiuta_le_liste_di_record(archivio_storico):
+    with pytest.raises(TypeError, match="list"):
+        VistaRollup(ElaboratoreDati()).rollup_dati(archivio_storico.a_record())
+
+
+def test_sostituzione_nella_stessa_zona(archivio_storico):
+    # un campione manuale con stessa data, tipo e zona di una riga storica: il conteggio della riga non cambia, le somme sì
+    elaboratore = ElaboratoreDati()
+    storico = archivio_storico.a_record()[100]
+    manuale = dict(storico, kg=storico["kg"] / 2, netto=storico["netto"] / 2, scarto=storico["scarto"] / 2, prezzo_medio=storico["prezzo_medio"] + 1, utile=1.5)
+    unione = VistaUnita(elaboratore).unisci(archivio_storico, [manuale])
+    rollup = VistaRollup(elaboratore).rollup_dati(unione)
+    giorno = date.fromisoformat(storico["data"])
+    for inizio, fine in [(giorno, giorno), (date(2019, 1, 1), date(2020, 12, 31))]:
+        atteso = elaboratore.calcola_aggregati(elaboratore.prepara_dati_storici(unione.intervallo_date(inizio, fine)))
+        confronta_aggregati(atteso, elaboratore.aggregati_da_rollup(rollup, inizio, fine))
@@ -0,0 +1,78 @@
+# Fi.Co? S.Vi.To.! A Fishing Company Simulation and Visualization Tool - Ver. 1.0"- tests/test_scenari_batch.py
+
+from datetime import date
+import json
+import pytest
+from business_logic import ElaboratoreDati, VistaRollup
+from scenari_batch import EsecutoreScenari
+
+
+@pytest.mark.parametrize("riciclo, lavorazione", [(0, 0), (25, 50), (100, 100), (12.5, 87.5)])
+def test_scenario_uguale_alla_dashboard(archivio_storico, riciclo, lavorazione):
+    # la dashboard legge gli aggregati dai rollup e li simula in forma chiusa: lo scenario deve dare gli stessi valori
+    elaboratore = ElaboratoreDati()
+    inizio, fine = date(2019, 2, 10), date(2020, 7, 20)
+    scenario = {"data_inizio": inizio.isoformat(), "data_fine": fine.isoformat(), "riciclo": riciclo, "lavorazione": lavorazione}
+    risultato = EsecutoreScenari.calcola(archivio_storico, 0, scenario)
+    rollup = VistaRollup(elaboratore).rollup_dati(archivio_storico)
+    aggregati = elaboratore.simula_aggregati(elaboratore.aggregati_da_rollup(rollup, inizio, fine), riciclo, lavorazione)
+    media = aggregati.sommario_costi()["Media"]
+    assert risultato["costo_produzione"] == round(media["costo_produzione"], 4)
+    assert risultato["utile_lordo"] == round(media["utile_lordo"], 4)
+    assert risultato["prezzo_finale"] == round(media["prezzo_finale"], 4)
+    assert risultato["scarto"] == round(aggregati.netto_scarto()["Totale"]["scarto"], 2)
+    assert risultato["qualita"] == aggregati.indice_qualita()["globale"]
+
+
+def test_griglia_con_tabelle_prezzi_per_nome(tmp_path):
+    percorso = tmp_path / "scenari.json"
+    percorso.write_text(json.dumps({
+        "tabelle_prezzi": {"alti": {"Acciuga": 4}},
+        "griglia": {"intervalli": [["2019-01-01", "2019-06-30"], ["2020-01-01", "2020-12-31"]], "riciclo": [0, 50], "prezzi": [None, "alti"]}
+    }))
+    scenari = EsecutoreScenari.leggi_scenari(str(percorso))
+    assert len(scenari) == 2 * 2 * 1 * 2
+    assert [s["riciclo"] for s in scenari[:4]] == [0, 0, 50, 50]
+    # le tabelle indicate per nome vengono risolte: ogni scenario è autosufficiente
+    assert {s.get("nome_prezzi") for s in scenari} == {None, "alti"}
+    assert all(s["prezzi"] == {"Acciuga": 4} for s in scenari if s.get("nome_prezzi"))
+    percorso.write_text(json.dumps({"scenari": [{"prezzi": "bassi"}]}))
+    with pytest.raises(ValueError, match="bassi"):
+        EsecutoreScenari.leggi_scenari(str(percorso))
+
+
+def test_prezzi_di_specie_sconosciute(archivio_storico):
+    with pytest.raises(ValueError, match="Tonno"):
+        EsecutoreScenari.applica_prezzi(archivio_storico, {"Acciuga": 3.1, "Tonno": 20})
+
+
+def test_scenari_con_specie_sconosciute_rifiutati_prima_di_iniziare(tmp_path, archivio_storico):
+    percorso = str(tmp_path / "storico.bin")
+    archivio_storico.salva(percorso)
+    scenari = [{"nome": "ok", "prezzi": {"Acciuga": 3.1}}, {"nome": "errato", "prezzi": {"Tonno": 20}}]
+    risultati = []
+    with pytest.raises(ValueError, match="errato"):
+        risultati.extend(EsecutoreScenari(percorso, processi=1).esegui(scenari))
+    # nessuno scenario viene eseguito, nemmeno quelli validi che precedono l'errore
+    assert risultati == []
+
+
+def test_risultati_non_dipendono_dai_processi(tmp_path, archivio_storico, record_manuali):
+    percorso = str(tmp_path / "storico.bin")
+    manuali = tmp_path / "manuali.json"
+    archivio_storico.salva(percorso)
+    manuali.write_text(json.dumps(record_manuali))
+    scenari = [
+        {"nome": "storico"},
+        {"data_inizio": "2020-11-01", "data_fine": "2020-12-31", "riciclo": 50, "lavorazione": 25},
+        {"data_inizio": "2019-03-01", "data_fine": "2019-03-31", "prezzi": {"Acciuga": {"2019": 9}}}
+    ]
+    risultati = {}
+    for processi in (1, 2):
+        ottenuti = list(EsecutoreScenari(percorso, str(manuali), processi=processi).esegui(scenari))
+        risultati[processi] = sorted(({k: v for k, v in r.items() if k != "secondi"} for r in ottenuti), key=lambda r: r["indice"])
+    assert risultati[1] == risultati[2]
+    assert [r["indice"] for r in risultati[1]] == [0, 1, 2]
+    # senza date lo scenario copre tutto lo storico, record manuali compresi
+    assert risultati[1][0]["campioni"] == len(archivio_storico) + len({(r["data"], r["tipo"]) for r in record_manuali} - {(r["data"], r["tipo"]) for r in archivio_storico.a_record()})
+    assert risultati[1][2]["prezzi"] == "personalizzati"
@@ -0,0 +1,69 @@
+# Fi.Co? S.Vi.To.! A Fishing Company Simulation and Visualization Tool - Ver. 1.0"- tests/test_simulazione.py
+
+from datetime import date
+import numpy as np
+import pytest
+from archivio_colonnare import ArchivioColonnare, arrotonda
+from business_logic import ElaboratoreDati
+
+
+def test_arrotonda_uguale_a_round():
+    # valori a metà tra due centesimi (esatti o solo in apparenza) più valori casuali
+    meta = [0.125, 0.375, 2.675, 1.005, 1.015, 1.025, 0.285, 5.555, -2.675, -0.125, 1e6 + 0.005]
+    casuali = np.random.default_rng(3).uniform(-1000, 1000, 20000)
+    valori = np.concatenate([meta, casuali, np.round(casuali, 3)])
+    assert arrotonda(valori).tolist() == [round(v, 2) for v in valori.tolist()]
+    assert arrotonda(valori, 1).tolist() == [round(v, 1) for v in valori.tolist()]
+
+
+def test_arrotonda_conserva_la_forma():
+    valori = np.array([[0.125, 2.675, 1.005], [0.375, -2.675, 3.14159]])
+    risultato = arrotonda(valori)
+    assert risultato.shape == valori.shape
+    assert risultato.tolist() == [[round(v, 2) for v in riga] for riga in valori.tolist()]
+
+
+@pytest.mark.parametrize("riciclo, lavorazione", [(0, 0), (25, 0), (0, 75), (50, 50), (100, 100), (33.3, 66.7)])
+def test_simulazione_colonnare_uguale_ai_dizionari(archivio_storico, record_manuali, riciclo, lavorazione):
+    elaboratore = ElaboratoreDati()
+    records = elaboratore.prepara_dati_storici([r for r in archivio_storico.a_record() if "2020-01-01" <= r["data"] <= "2020-03-31"] + record_manuali)
+    attesi = elaboratore.applica_simulazione_ai_record(records, riciclo, lavorazione)
+    ottenuti = elaboratore.applica_simulazione_ai_record(ArchivioColonnare.da_record(records), riciclo, lavorazione).a_record()
+    assert len(attesi) == len(ottenuti)
+    for atteso, ottenuto in zip(attesi, ottenuti):
+        for campo in ("scarto", "netto", "costo", "utile", "prezzo_finale", "qualita"):
+            if campo in atteso:
+                # stessi valori arrotondati al centesimo, quindi uguali esattamente
+                assert ottenuto[campo] == atteso[campo], campo
+
+
+# Scostamento massimo della forma chiusa dalla simulazione record per record (vedi simula_somme), più l'errore di virgola mobile
+TOLLERANZE_MEDIE = {"costo_produzione": 0.005, "utile_lordo": 0.005, "prezzo_finale": 0.01}
+EPSILON = 1e-9
+
+
+@pytest.mark.parametrize("riciclo, lavorazione", [(25, 0), (0, 75), (50, 50), (100, 100), (12.5, 87.5), (33.3, 66.7)])
+@pytest.mark.parametrize("inizio, fine", [(date(2019, 1, 1), date(2020, 12, 31)), (date(2019, 3, 5), date(2019, 3, 5)), (date(2020, 2, 1), date(2020, 4, 30))])
+def test_forma_chiusa_entro_la_tolleranza(archivio_storico, record_manuali, riciclo, lavorazione, inizio, fine):
+    elaboratore = ElaboratoreDati()
+    preparati = elaboratore.prepara_dati_storici(ArchivioColonnare.concatena([
+        archivio_storico.intervallo_date(inizio, fine),
+        ArchivioColonnare.da_record([r for r in record_manuali if inizio.isoformat() <= r["data"] <= fine.isoformat()])
+    ]))
+    aggregati = elaboratore.calcola_aggregati(preparati)
+    record_per_record = elaboratore.calcola_aggregati(elaboratore.applica_simulazione_ai_record(preparati, riciclo, lavorazione))
+    forma_chiusa = elaboratore.simula_aggregati(aggregati, riciclo, lavorazione)
+    for tipo, attesi in record_per_record.sommario_costi().items():
+        for campo, tolleranza in TOLLERANZE_MEDIE.items():
+            assert forma_chiusa.sommario_costi()[tipo][campo] == pytest.approx(attesi[campo], abs=tolleranza + EPSILON), (tipo, campo)
+    for tipo, attesi in record_per_record.netto_scarto().items():
+        for campo in ("netto", "scarto"):
+            assert forma_chiusa.netto_scarto()[tipo][campo] == pytest.approx(attesi[campo], abs=0.005 * len(preparati) + EPSILON), (tipo, campo)
+    for tipo, attesa in record_per_record.indice_qualita().items():
+        assert forma_chiusa.indice_qualita()[tipo] == pytest.approx(attesa, abs=0.01 + EPSILON), tipo
+
+
+def test_forma_chiusa_slider_a_zero_restituisce_lo_storico(archivio_storico):
+    elaboratore = ElaboratoreDati()
+    aggregati = elaboratore.calcola_aggregati(elaboratore.prepara_dati_storici(archivio_storico))
+    assert elaboratore.simula_aggregati(aggregati, 0, 0) is aggregati
@@ -0,0 +1,54 @@
+# Fi.Co? S.Vi.To.! A Fishing Company Simulation and Visualization Tool - Ver. 1.0"- tests/test_vista_unita.py
+
+import pytest
+from archivio_colonnare import ORDINE_CAMPI
+from business_logic import ElaboratoreDati, VistaUnita
+from data_viz import GestoreDati
+
+
+def unione_dizionari(archivio_storico, record_manuali):
+    ''' Unione di riferimento: il dizionario di unisci_dati, ordinato per data come la vista (ordinamento stabile). '''
+    gestore_dati = GestoreDati(None, None, ElaboratoreDati())
+    return sorted(gestore_dati.unisci_dati(archivio_storico.a_record(), record_manuali), key=lambda r: r["data"])
+
+
+def confronta_unione(attesi, unito):
+    ottenuti = list(unito)
+    assert len(unito) == len(attesi) == len(ottenuti)
+    for atteso, ottenuto in zip(attesi, ottenuti):
+        for campo, valore in atteso.items():
+            if campo in ORDINE_CAMPI:
+                assert ottenuto[campo] == (pytest.approx(valore) if isinstance(valore, float) else valore), campo
+
+
+def test_unione_uguale_al_dizionario(archivio_storico, record_manuali):
+    vista = VistaUnita(ElaboratoreDati())
+    chiavi_storico = {(r["data"], r["tipo"]) for r in archivio_storico.a_record()}
+    assert {(r["data"], r["tipo"]) for r in record_manuali} & chiavi_storico
+    # chiave nuova con un tipo già noto, in un giorno fuori dallo storico
+    record_manuali = record_manuali + [{"data": "2021-01-05", "tipo": "Acciuga", "zona": "Ionio", "kg": 10, "netto": 9, "scarto": 1, "prezzo_medio": 3}]
+    confronta_unione(unione_dizionari(archivio_storico, record_manuali), vista.unisci(archivio_storico, record_manuali))
+    # sostituzione di un record manuale già presente
+    record_manuali[0] = dict(record_manuali[0], kg=120, netto=100)
+    confronta_unione(unione_dizionari(archivio_storico, record_manuali), vista.unisci(archivio_storico, record_manuali))
+    # un'altra chiave nuova, con un tipo nuovo, nello stesso giorno di un record storico
+    giorno = archivio_storico.a_record()[10]["data"]
+    record_manuali.append({"data": giorno, "tipo": "Pesce Azzurro", "zona": "Tirreno", "kg": 5, "netto": 4, "scarto": 1, "prezzo_medio": 2})
+    confronta_unione(unione_dizionari(archivio_storico, record_manuali), vista.unisci(archivio_storico, record_manuali))
+    # azzeramento dei record manuali: resta lo storico
+    confronta_unione(unione_dizionari(archivio_storico, []), vista.unisci(archivio_storico, []))
+
+
+def test_nessuna_ricostruzione_se_i_manuali_non_cambiano(archivio_storico, record_manuali):
+    vista = VistaUnita(ElaboratoreDati())
+    unito = vista.unisci(archivio_storico, record_manuali)
+    assert vista.ricostruzioni == 1
+    # stessa lista, oppure una copia con gli stessi record: l'unione non viene ricreata
+    assert vista.unisci(archivio_storico, record_manuali) is unito
+    assert vista.unisci(archivio_storico, [dict(r) for r in record_manuali]) is unito
+    assert vista.ricostruzioni == 1
+    # un record modificato ricrea l'unione una volta sola
+    modificati = [dict(record_manuali[0], kg=1)] + record_manuali[1:]
+    vista.unisci(archivio_storico, modificati)
+    vista.unisci(archivio_storico, modificati)
+    assert vista.ricostruzioni == 2